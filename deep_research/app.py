@@ -4,13 +4,18 @@ import os
 from dotenv import load_dotenv
 from datetime import datetime
 import time
+import uuid
 from termcolor import cprint
 
 # Load environment
 load_dotenv(".env", override=True)
 
 # Import orchestrator
-from orchestrator import orchestrator_app
+from orchestrator import load_run, new_run_id, orchestrator_app, record_progress
+from research_agent.config import METRICS_PORT
+from research_agent.http_transport import prewarm_connections
+from research_agent.metrics import start_metrics_server
+from research_agent.scheduling import set_session
 
 # ============================================================================
 # BLOOMBERG TERMINAL AESTHETIC - CSS STYLING
@@ -145,6 +150,16 @@ def apply_bloomberg_theme():
     </style>
     """, unsafe_allow_html=True)
 
+@st.cache_resource
+def warm_http_pool():
+    """Open pooled LLM connections once per server process, not on every rerun."""
+    return prewarm_connections()
+
+@st.cache_resource
+def metrics_server():
+    """Serve /metrics once per server process; Streamlit reruns would otherwise rebind the port."""
+    return start_metrics_server(METRICS_PORT) if METRICS_PORT else None
+
 # ============================================================================
 # SESSION STATE INITIALIZATION
 # ============================================================================
@@ -152,9 +167,18 @@ def apply_bloomberg_theme():
 def init_session_state():
     """Initialize session state variables."""
     cprint("\n[DEBUG] Initializing session state...", "cyan")
+    if 'session_id' not in st.session_state:
+        st.session_state.session_id = uuid.uuid4().hex
+        cprint("[DEBUG] - session_id initialized", "cyan")
+    if 'run_id' not in st.session_state:
+        st.session_state.run_id = ""
+        cprint("[DEBUG] - run_id initialized", "cyan")
     if 'research_plan' not in st.session_state:
         st.session_state.research_plan = []
         cprint("[DEBUG] - research_plan initialized", "cyan")
+    if 'plan_dependencies' not in st.session_state:
+        st.session_state.plan_dependencies = {}
+        cprint("[DEBUG] - plan_dependencies initialized", "cyan")
     if 'plan_approved' not in st.session_state:
         st.session_state.plan_approved = False
         cprint("[DEBUG] - plan_approved initialized", "cyan")
@@ -182,6 +206,29 @@ def init_session_state():
         cprint("[DEBUG] - execution_state initialized", "cyan")
     cprint(f"[DEBUG] Session state keys: {list(st.session_state.keys())}", "cyan")
 
+def resume_run(run_id):
+    """Load a checkpointed run into the session; execution then continues from its unfinished steps."""
+    cprint(f"\n[DEBUG] Resuming run {run_id}", "yellow")
+    saved, remaining = load_run(run_id)
+    if not saved:
+        st.sidebar.error(f"No checkpointed run '{run_id}'")
+        return
+    if not saved.get("plan"):
+        st.sidebar.warning("That run stopped before planning finished - please run the query again.")
+        return
+    cprint(f"[DEBUG] Run {run_id}: {len(saved['step_results'])}/{len(saved['plan'])} steps done, next {remaining}", "yellow")
+    st.session_state.run_id = run_id
+    st.session_state.research_plan = saved["plan"]
+    st.session_state.plan_dependencies = saved.get("plan_dependencies", {})
+    st.session_state.background_research = saved.get("background_research", "")
+    st.session_state.step_results = saved["step_results"]
+    st.session_state.final_report = saved.get("final_report", "")
+    st.session_state.execution_state = saved
+    st.session_state.execution_step = len(saved["step_results"])
+    st.session_state.executing_plan = not st.session_state.final_report
+    st.session_state.research_in_progress = st.session_state.executing_plan
+    st.rerun()
+
 # ============================================================================
 # MAIN APP
 # ============================================================================
@@ -192,6 +239,9 @@ def main():
     
     # Initialize state
     init_session_state()
+    set_session(st.session_state.session_id)  # LLM calls of this run share models fairly with other users
+    warm_http_pool()
+    metrics_server()
     
     # Terminal-style header
     st.markdown("""
@@ -226,6 +276,14 @@ def main():
         ```
         """)
         
+        st.divider()
+        st.markdown("### ⏯️ RESUME RUN")
+        resume_id = st.text_input("Run ID", placeholder="Run ID of an interrupted run", label_visibility="collapsed")
+        if st.button("⏯️ RESUME", use_container_width=True) and resume_id.strip():
+            resume_run(resume_id.strip())
+        if st.session_state.run_id:
+            st.markdown(f"**RUN ID**: `{st.session_state.run_id}`")
+        
         st.divider()
         st.markdown("### 📚 AVAILABLE SKILLS")
         with st.expander("GLOBAL SKILLS"):
@@ -268,7 +326,9 @@ def main():
     
     if clear_btn:
         cprint("\n[DEBUG] CLEAR button pressed - resetting all state", "yellow")
+        st.session_state.run_id = ""
         st.session_state.research_plan = []
+        st.session_state.plan_dependencies = {}
         st.session_state.plan_approved = False
         st.session_state.final_report = ""
         st.session_state.background_research = ""
@@ -300,7 +360,9 @@ def main():
             try:
                 # Create initial state
                 cprint("\n[DEBUG] Creating initial orchestrator state", "magenta")
+                st.session_state.run_id = new_run_id()
                 initial_state = {
+                    "run_id": st.session_state.run_id,
                     "task": query,
                     "companies": [],
                     "background_research": "",
@@ -321,6 +383,7 @@ def main():
                 bg_result = research_background_node(state)
                 cprint(f"[DEBUG] Background research returned keys: {bg_result.keys()}", "blue")
                 state.update(bg_result)
+                record_progress(state, "background_research")
                 st.session_state.background_research = state.get("background_research", "")
                 cprint(f"[DEBUG] Background research length: {len(st.session_state.background_research)} chars", "blue")
                 
@@ -334,7 +397,9 @@ def main():
                 plan_result = planner_node(state)
                 cprint(f"[DEBUG] Planner returned keys: {plan_result.keys()}", "blue")
                 state.update(plan_result)
+                record_progress(state, "planner")
                 st.session_state.research_plan = state.get("plan", [])
+                st.session_state.plan_dependencies = state.get("plan_dependencies", {})
                 cprint(f"[DEBUG] Plan has {len(st.session_state.research_plan)} steps:", "blue")
                 for i, step in enumerate(st.session_state.research_plan):
                     cprint(f"[DEBUG]   Step {i+1}: {step}", "blue")
@@ -373,14 +438,17 @@ def main():
                         st.session_state.executing_plan = True
                         st.session_state.execution_step = 0
                         st.session_state.execution_state = {
+                            "run_id": st.session_state.run_id,
                             "task": query,
                             "companies": state.get("companies", []),
                             "background_research": st.session_state.background_research,
                             "plan": st.session_state.research_plan,
+                            "plan_dependencies": st.session_state.plan_dependencies,
                             "current_step_index": 0,
                             "step_results": {},
                             "final_report": ""
                         }
+                        record_progress(st.session_state.execution_state, "approval")
                         cprint("[DEBUG] Execution mode activated, triggering rerun", "green")
                         st.rerun()
                 
@@ -460,34 +528,33 @@ def main():
             st.progress(progress_pct)
             
             if current_step < total_steps:
-                # Execute current step
-                step_num = current_step + 1
-                st.markdown(f"<p class='info-text'>⚙️ Executing step {step_num}/{total_steps}: {st.session_state.research_plan[current_step][:80]}...</p>", unsafe_allow_html=True)
+                # Execute the plan: independent steps run in parallel, progress shown as each finishes
+                status = st.empty()
+                status.markdown(f"<p class='info-text'>⚙️ Executing {total_steps} steps (independent steps in parallel)...</p>", unsafe_allow_html=True)
+                step_progress = st.progress(progress_pct)
                 
                 try:
-                    from orchestrator import executor_node
+                    from orchestrator import iter_plan
                     
-                    cprint(f"\n[DEBUG] === EXECUTING STEP {step_num}/{total_steps} ===", "yellow")
-                    cprint(f"[DEBUG] Step description: {exec_state['plan'][current_step]}", "yellow")
+                    cprint(f"\n[DEBUG] === EXECUTING PLAN OF {total_steps} STEPS ===", "yellow")
                     cprint(f"[DEBUG] Current state keys: {exec_state.keys()}", "yellow")
                     
-                    # Execute the step
-                    exec_result = executor_node(exec_state)
-                    cprint(f"[DEBUG] Executor returned keys: {exec_result.keys()}", "yellow")
+                    for step_index, step, _ in iter_plan(exec_state):
+                        st.session_state.execution_step += 1
+                        step_num = st.session_state.execution_step
+                        cprint(f"[DEBUG] Step {step_index + 1} complete ({step_num}/{total_steps} done)", "yellow")
+                        status.markdown(f"<p class='info-text'>⚙️ {step_num}/{total_steps} steps done. Finished: {step[:80]}...</p>", unsafe_allow_html=True)
+                        step_progress.progress(int((step_num / (total_steps + 1)) * 100))
                     
                     # Update state
-                    exec_state.update(exec_result)
                     st.session_state.execution_state = exec_state
                     
-                    # Move to next step
-                    st.session_state.execution_step += 1
-                    cprint(f"[DEBUG] Step {step_num} complete. Moving to step {st.session_state.execution_step + 1}", "yellow")
-                    
-                    # Trigger next step
+                    # Trigger report generation
                     time.sleep(0.5)  # Brief pause for UI update
                     st.rerun()
                     
                 except Exception as step_error:
+                    step_num = st.session_state.execution_step + 1
                     cprint(f"\n[ERROR] Step {step_num} failed: {str(step_error)}", "red")
                     import traceback
                     cprint(f"[ERROR] Traceback:\n{traceback.format_exc()}", "red")
@@ -503,14 +570,15 @@ def main():
                 st.markdown("<p class='info-text'>📝 Synthesizing final report...</p>", unsafe_allow_html=True)
                 
                 try:
-                    from orchestrator import reporter_node
+                    from orchestrator import stream_report
                     
-                    cprint("\n[DEBUG] All steps executed, synthesizing final report...", "magenta")
-                    report_result = reporter_node(exec_state)
-                    cprint(f"[DEBUG] Reporter returned keys: {report_result.keys()}", "magenta")
+                    cprint("\n[DEBUG] All steps executed, streaming final report...", "magenta")
+                    # Render tokens as they arrive; write_stream returns the full text
+                    report_text = st.write_stream(stream_report(exec_state))
                     
                     # Save results
-                    exec_state.update(report_result)
+                    exec_state.update({"final_report": report_text})
+                    record_progress(exec_state, "reporter")
                     st.session_state.final_report = exec_state.get("final_report", "")
                     st.session_state.step_results = exec_state.get("step_results", {})
                     
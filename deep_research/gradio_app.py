@@ -13,9 +13,16 @@ load_dotenv(".env", override=True)
 from orchestrator import (
     research_background_node, 
     planner_node, 
-    executor_node, 
-    reporter_node
+    iter_plan, 
+    stream_report,
+    load_run,
+    new_run_id,
+    record_progress
 )
+from research_agent.config import METRICS_PORT
+from research_agent.http_transport import prewarm_connections
+from research_agent.metrics import start_metrics_server
+from research_agent.scheduling import iterate_in_session, session_scope
 
 # ============================================================================
 # CSS STYLING (Bloomberg Terminal Theme)
@@ -81,10 +88,12 @@ table {
 
 def init_state():
     return {
+        "run_id": "",
         "task": "",
         "companies": [],
         "background_research": "",
         "plan": [],
+        "plan_dependencies": {},
         "current_step_index": 0,
         "step_results": {},
         "final_report": "",
@@ -97,28 +106,41 @@ def log_message(state, message):
     state["logs"].append(entry)
     return "\n".join(state["logs"])
 
-def start_research_and_plan(query, state):
-    """Phase 1: Background Research & Planning"""
+def session_id(request):
+    """Per-browser-session id so the rate limiter shares contended models fairly between users."""
+    return getattr(request, "session_hash", None) or "gradio"
+
+def start_research_and_plan(query, state, request: gr.Request = None, resume=False):
+    """Phase 1: Background Research & Planning (resume=True keeps the run and its background research)"""
     if not query.strip():
         yield state, "Please enter a research query.", gr.update(visible=False), gr.update(visible=False), ""
         return
 
     # Reset specific fields but keep logs if any
+    if not resume:
+        state["run_id"] = new_run_id()
+        state["background_research"] = ""
     state["task"] = query
     state["plan"] = []
+    state["plan_dependencies"] = {}
     state["current_step_index"] = 0
     state["step_results"] = {}
     state["final_report"] = ""
-    logs = log_message(state, f"Starting research for: {query}")
+    logs = log_message(state, f"Starting research for: {query} (run {state['run_id']})")
     
     yield state, "Status: Running Background Research...", gr.update(visible=False), gr.update(visible=False), logs
 
     # 1. Background Research
     try:
-        log_message(state, "Running background research node...")
-        bg_result = research_background_node(state)
-        state.update(bg_result)
-        logs = log_message(state, f"Background research complete. Length: {len(state['background_research'])} chars")
+        if state["background_research"]:
+            logs = log_message(state, "Background research restored from checkpoint.")
+        else:
+            log_message(state, "Running background research node...")
+            with session_scope(session_id(request)):
+                bg_result = research_background_node(state)
+            state.update(bg_result)
+            record_progress(state, "background_research")
+            logs = log_message(state, f"Background research complete. Length: {len(state['background_research'])} chars")
         yield state, "Status: Planning...", gr.update(visible=False), gr.update(visible=False), logs
     except Exception as e:
         logs = log_message(state, f"Error in background research: {str(e)}")
@@ -128,8 +150,10 @@ def start_research_and_plan(query, state):
     # 2. Planning
     try:
         log_message(state, "Running planner node...")
-        item = planner_node(state)
+        with session_scope(session_id(request)):
+            item = planner_node(state)
         state.update(item)
+        record_progress(state, "planner")
         logs = log_message(state, f"Plan generated with {len(state['plan'])} steps.")
         
         # Format plan for display
@@ -141,44 +165,44 @@ def start_research_and_plan(query, state):
         logs = log_message(state, f"Error in planning: {str(e)}")
         yield state, f"Error: {str(e)}", gr.update(visible=False), gr.update(visible=False), logs
 
-def execute_research_plan(state, plan_text):
+def execute_research_plan(state, plan_text, request: gr.Request = None):
     """Phase 2: Execution & Reporting"""
     
     # Update plan from text area (in case user edited it)
     state["plan"] = [line.strip() for line in plan_text.split("\n") if line.strip()]
+    record_progress(state, "approval")
     logs = log_message(state, "Plan approved. Starting execution...")
     
     yield state, "Status: Executing Plan...", gr.update(visible=False), logs, ""
 
     total_steps = len(state["plan"])
     
-    # 3. Execution Loop
-    for i in range(total_steps):
-        step_idx = i
-        state["current_step_index"] = step_idx
-        current_step = state["plan"][step_idx]
-        
-        logs = log_message(state, f"Executing Step {step_idx + 1}/{total_steps}: {current_step}")
-        yield state, f"Status: Executing Step {step_idx + 1}/{total_steps}...", gr.update(visible=False), logs, ""
-        
-        try:
-            # Execute step
-            item = executor_node(state)
-            state.update(item)
-            logs = log_message(state, f"Step {step_idx + 1} complete.")
-            
-        except Exception as e:
-            logs = log_message(state, f"Error executing step {step_idx + 1}: {str(e)}")
-            yield state, f"Error in Step {step_idx + 1}: {str(e)}", gr.update(visible=False), logs, ""
-            return
+    # 3. Execution: independent steps run in parallel, reported as each one finishes.
+    # Steps this run already finished (before a crash or restart) come back from the checkpointer.
+    state["step_results"] = {}
+    completed = 0
+    try:
+        for step_idx, current_step, _ in iterate_in_session(session_id(request), iter_plan(state)):
+            completed += 1
+            logs = log_message(state, f"Step {step_idx + 1} complete: {current_step}")
+            yield state, f"Status: Executed {completed}/{total_steps} steps...", gr.update(visible=False), logs, ""
+    except Exception as e:
+        logs = log_message(state, f"Error executing plan: {str(e)}")
+        yield state, f"Error in execution: {str(e)}", gr.update(visible=False), logs, ""
+        return
 
     # 4. Reporting
     logs = log_message(state, "All steps complete. Synthesizing final report...")
     yield state, "Status: Synthesizing Report...", gr.update(visible=False), logs, ""
     
     try:
-        item = reporter_node(state)
-        state.update(item)
+        # Stream the report into the UI token by token
+        report_tokens = []
+        for token in iterate_in_session(session_id(request), stream_report(state)):
+            report_tokens.append(token)
+            yield state, "Status: Writing Report...", gr.update(visible=False), logs, "".join(report_tokens)
+        state["final_report"] = "".join(report_tokens)
+        record_progress(state, "reporter")
         logs = log_message(state, "Report generated successfully.")
         
         yield state, "Status: Complete", gr.update(visible=False), logs, state["final_report"]
@@ -188,6 +212,25 @@ def execute_research_plan(state, plan_text):
         yield state, f"Error in reporting: {str(e)}", gr.update(visible=False), logs, ""
 
 
+def resume_run(run_id, state, request: gr.Request = None):
+    """Reloads a checkpointed run: shows its report if finished, else continues where it stopped."""
+    saved, _ = load_run(run_id.strip())
+    if not saved:
+        yield state, f"No checkpointed run '{run_id}'.", gr.update(), gr.update(), "\n".join(state["logs"]), ""
+        return
+
+    state = {**init_state(), **saved, "logs": state["logs"]}
+    logs = log_message(state, f"Resumed run {state['run_id']}: {len(state['step_results'])}/{len(state['plan'])} steps done.")
+    if state["final_report"]:
+        yield state, "Status: Complete (resumed)", gr.update(visible=False), gr.update(visible=False), logs, state["final_report"]
+    elif state["plan"]:
+        # Approving runs only the steps that have not finished yet
+        yield (state, "Status: Plan restored. Approve to run the remaining steps.",
+               gr.update(visible=True, value="\n".join(state["plan"])), gr.update(visible=True), logs, "")
+    else:
+        for update in start_research_and_plan(state["task"], state, request, resume=True):
+            yield (*update, "")
+
 def cancel_process(state):
     state = init_state()
     return state, "Status: Canceled", gr.update(visible=False), gr.update(visible=False), "", ""
@@ -225,6 +268,10 @@ with gr.Blocks(theme=gr.themes.Monochrome(), css=BLOOMBERG_CSS, title="Deep Fina
                 execute_btn = gr.Button("⚡ EXECUTE RESEARCH", variant="primary")
                 clear_btn = gr.Button("🗑️ CLEAR/CANCEL")
             
+            with gr.Row():
+                resume_input = gr.Textbox(label="RUN ID", placeholder="Run ID of an interrupted run", scale=3)
+                resume_btn = gr.Button("⏯️ RESUME RUN", scale=1)
+            
             status_text = gr.Markdown("Status: Ready")
             
             # Plan Approval Section
@@ -255,7 +302,14 @@ with gr.Blocks(theme=gr.themes.Monochrome(), css=BLOOMBERG_CSS, title="Deep Fina
         outputs=[state, status_text, plan_group, logs_box, report_box]
     )
     
-    # 3. Clear/Cancel
+    # 3. Resume an interrupted run
+    resume_btn.click(
+        fn=resume_run,
+        inputs=[resume_input, state],
+        outputs=[state, status_text, plan_editor, plan_group, logs_box, report_box]
+    )
+    
+    # 4. Clear/Cancel
     clear_btn.click(
         fn=cancel_process,
         inputs=[state],
@@ -263,4 +317,7 @@ with gr.Blocks(theme=gr.themes.Monochrome(), css=BLOOMBERG_CSS, title="Deep Fina
     )
 
 if __name__ == "__main__":
+    prewarm_connections()
+    if METRICS_PORT:
+        start_metrics_server(METRICS_PORT)
     demo.queue().launch(server_name="0.0.0.0", server_port=7860, share=False)
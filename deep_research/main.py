@@ -8,7 +8,11 @@ from termcolor import colored
 load_dotenv(".env", override=True)
 
 # Import New Orchestrator
-from orchestrator import orchestrator_app
+from orchestrator import load_run, new_run_id, orchestrator_app, run_config
+from research_agent.checkpoints import GLOBAL_CHECKPOINTER
+from research_agent.config import METRICS_PORT
+from research_agent.http_transport import prewarm_connections
+from research_agent.metrics import start_metrics_server
 
 def main():
     print(colored("🚀 Starting ENSEMBLE Financial Agent (Multi-Model + Meta-Judge)", "cyan", attrs=["bold"]))
@@ -16,8 +20,27 @@ def main():
     print(colored("   🧠 Planner: Llama 3.1 405B (Planning + Meta-Judge)", "green"))
     print(colored("   🔄 Executors: 3-Model Ensemble (Llama 70B + Qwen 72B + Mixtral 8x22B)", "blue"))
     print(colored("   ✍️  Writer: Llama 3.1 405B (Final Synthesis)", "green"))
+
+    # Open pooled connections while the user types the first query
+    prewarm_connections()
+    if METRICS_PORT:
+        start_metrics_server(METRICS_PORT)
     
-    if len(sys.argv) > 1:
+    # `python main.py --resume RUN_ID` continues an interrupted run; `--resume` alone lists recent runs
+    resume_id = None
+    if sys.argv[1:2] == ["--resume"]:
+        if len(sys.argv) < 3:
+            for run_id, updated in (GLOBAL_CHECKPOINTER.runs() if GLOBAL_CHECKPOINTER else []):
+                print(f"   {run_id}  last checkpoint {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(updated))}")
+            return
+        resume_id = sys.argv[2]
+        saved, remaining = load_run(resume_id)
+        if not saved:
+            print(colored(f"❌ No checkpointed run '{resume_id}'", "red"))
+            return
+        print(colored(f"\n⏯️  RESUMING RUN {resume_id}: {len(saved['step_results'])}/{len(saved.get('plan', []))} plan steps done, next: {', '.join(remaining) or 'nothing'}", "cyan"))
+        queries = [saved["task"]]
+    elif len(sys.argv) > 1:
         queries = [" ".join(sys.argv[1:])]
     else:
         print("\n💡 Enter a complex financial research query.")
@@ -38,23 +61,41 @@ def main():
         print(colored(f"\n🔎 STARTING RESEARCH: '{current_query}'", "white", attrs=["bold"]))
         
         try:
-            # Prepare Initial State
+            # Prepare Initial State (a resumed run continues from its last checkpoint instead)
+            run_id = resume_id or new_run_id()
+            print(colored(f"   🧾 Run ID: {run_id} (resume with: python main.py --resume {run_id})", "white"))
             initial_state = {
+                "run_id": run_id,
                 "task": current_query,
                 "companies": [],
                 "background_research": "",
                 "plan": [],
+                "plan_dependencies": {},
                 "current_step_index": 0,
                 "step_results": {},
                 "final_report": ""
             }
             
-            # Run Graph
-            final_state = orchestrator_app.invoke(initial_state)
+            # Run Graph, printing the report as the writer streams it
+            final_state = saved if resume_id else initial_state
+            report_started = False
+            graph_input = None if resume_id else initial_state
+            for mode, chunk in orchestrator_app.stream(graph_input, run_config(run_id), stream_mode=["custom", "values"]):
+                if mode == "values":
+                    final_state = chunk
+                elif "report_token" in chunk:
+                    if not report_started:
+                        print(colored("\n✅ FINAL REPORT (streaming):", "green", attrs=["bold"]))
+                        print("-" * 80)
+                        report_started = True
+                    print(chunk["report_token"], end="", flush=True)
             
-            print(colored("\n✅ FINAL REPORT GENERATED:", "green", attrs=["bold"]))
-            print("-" * 80)
-            print(final_state.get("final_report", "No report generated."))
+            if report_started:
+                print()
+            else:
+                print(colored("\n✅ FINAL REPORT GENERATED:", "green", attrs=["bold"]))
+                print("-" * 80)
+                print(final_state.get("final_report", "No report generated."))
             print("-" * 80)
             
             # Save to file
@@ -72,6 +113,7 @@ def main():
 
         if len(sys.argv) > 1:
             break
+        resume_id = None
 
 if __name__ == "__main__":
     main()
@@ -3,29 +3,57 @@ orchestrator.py
 """
 from typing import List, TypedDict, Dict
 from langgraph.graph import StateGraph, END
+from langgraph.config import get_stream_writer
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+import contextvars
 import json
+import queue
 import re
+import threading
+import uuid
 from termcolor import cprint
 
 # --- IMPORTS ---
 # We keep OpenRouter for Executor/Reporter, but add Gemini Tool for Planner
-from research_agent.clients import call_openrouter
+from research_agent.clients import (
+    call_openrouter,
+    call_site_max_tokens,
+    pack_sections,
+    prompt_budget,
+    stream_openrouter,
+    truncate_to_tokens,
+)
+from research_agent.checkpoints import GLOBAL_CHECKPOINTER
+from research_agent.context_index import ContextIndex
+from research_agent.config import (
+    BACKGROUND_BRANCH_TIMEOUT,
+    EXECUTOR_CONTEXT_TOKENS,
+    PLAN_MAX_PARALLEL_STEPS,
+    PLANNER_BACKGROUND_TOKENS,
+    SECTION_TOKEN_CAPS,
+)
+from research_agent.metrics import instrument_node, is_error_result, node_scope, record_step_dispatch
+from research_agent.resilience import LLMCallError
 from research_agent.gemini_cli_tool import ask_gemini_cli_tool# <--- NEW IMPORT
 from research_agent.new_config import PLANNER_MODEL_ID, ENSEMBLE_MODELS
 from research_agent.tools import tavily_search
 from research_agent.financial_tools import get_company_fundamentals, get_historical_performance
 from research_agent.ensemble import ensemble_query
 from research_agent.skills import load_skill, SKILL_LIBRARY
+from research_agent.step_parser import parse_step
+from research_agent.tool_registry import GLOBAL_TOOL_REGISTRY
 
 # --- CONFIGURATION ---
 EXECUTOR_MODEL_ID = "meta-llama/llama-3.3-70b-instruct" 
 
 # --- STATE DEFINITION ---
 class ResearchState(TypedDict):
+    run_id: str
     task: str
     companies: List[str]
     background_research: str
     plan: List[str]
+    plan_dependencies: Dict[str, List[str]]
     current_step_index: int
     step_results: Dict[str, str]
     final_report: str
@@ -55,9 +83,15 @@ AVAILABLE TOOLS:
 - tavily_search(query), ensemble_query(query)
 
 OUTPUT FORMAT:
-Return ONLY a valid JSON array of sequential steps strings. Do not add markdown blocks like ```json.
+Return ONLY a valid JSON array of step objects, in execution order. Do not add markdown blocks like ```json.
+Each step has an "id", the "step" text and "depends_on": the ids of the earlier steps whose results it needs.
+Steps that do not need each other's results MUST NOT depend on each other, so they can run in parallel.
 Example:
-["analyze_sec_filing_structure TCS.NS", "get_company_fundamentals TCS.NS", "assess_competitive_forces TCS", "Synthesize report"]
+[{{"id": 1, "step": "get_company_fundamentals TCS.NS", "depends_on": []}},
+ {{"id": 2, "step": "get_company_fundamentals INFY.NS", "depends_on": []}},
+ {{"id": 3, "step": "tavily_search TCS vs Infosys deal wins 2024", "depends_on": []}},
+ {{"id": 4, "step": "perform_ratio_analysis TCS.NS vs INFY.NS", "depends_on": [1, 2]}},
+ {{"id": 5, "step": "Synthesize report", "depends_on": [3, 4]}}]
 """
 
 EXECUTOR_PROMPT = """You are a Senior Financial Analyst executing ONE STEP of a deep research plan.
@@ -70,7 +104,8 @@ If a specific tool is required, output EXACTLY: TOOL: <tool_name> ARGS: <json_ar
 If analysis/reasoning is required, output: TOOL: ensemble_query ARGS: {{"query": "your analytical question"}}
 If synthesis is required, just write the synthesis text directly.
 
-Tools available: tavily_search, get_company_fundamentals, get_historical_performance, load_skill, ensemble_query.
+Tools available (arguments marked ? are optional):
+{tools}
 """
 
 # --- HELPER: Extract Company Tickers ---
@@ -85,16 +120,67 @@ def extract_companies(task: str) -> List[str]:
             elif "Gold" in pattern: companies.append("COMMODITY: GOLD")
     return list(set(companies))
 
+# --- HELPER: Plan Graph ---
+def parse_plan(raw_plan: list):
+    """
+    Splits the planner's JSON into step texts and {step: [steps it depends on]}.
+    Accepts step objects with ids and depends_on, or bare strings (which run in sequence).
+    Dependencies on unknown or later steps are dropped, so the graph is always acyclic.
+    """
+    steps, dependencies, text_by_id = [], {}, {}
+    for position, item in enumerate(raw_plan, 1):
+        if not isinstance(item, dict):
+            steps.append(str(item))
+            continue
+        step = str(item.get("step") or item.get("task") or "").strip()
+        if not step:
+            continue
+        depends_on = item.get("depends_on") or []
+        if not isinstance(depends_on, list):
+            depends_on = [depends_on]
+        dependencies[step] = [text_by_id[str(d)] for d in depends_on if str(d) in text_by_id]
+        text_by_id[str(item.get("id", position))] = step
+        steps.append(step)
+    return steps, dependencies
+
+def plan_dependencies(state: ResearchState) -> List[List[int]]:
+    """
+    For each plan step, the indices of the earlier steps it waits for. Steps without declared
+    dependencies (bare-string plans, steps added or reworded while editing the plan) wait for the
+    step before them, as the old one-at-a-time loop did.
+    """
+    plan = state["plan"]
+    declared = state.get("plan_dependencies") or {}
+    first_index = {}
+    graph = []
+    for i, step in enumerate(plan):
+        needs = declared.get(step)
+        if needs is not None and all(n in first_index for n in needs):
+            graph.append(sorted({first_index[n] for n in needs}))
+        else:
+            graph.append([i - 1] if i else [])
+        first_index.setdefault(step, i)
+    return graph
+
+def _ancestors(graph: List[List[int]]) -> List[List[int]]:
+    closure = []
+    for deps in graph:
+        seen = set(deps)
+        for d in deps:
+            seen.update(closure[d])
+        closure.append(sorted(seen))
+    return closure
+
+def _critical_path(graph: List[List[int]]) -> int:
+    depth = []
+    for deps in graph:
+        depth.append(1 + max((depth[d] for d in deps), default=0))
+    return max(depth, default=0)
+
 # --- NODES ---
 
-def research_background_node(state: ResearchState):
-    cprint("\n[DEBUG] === BACKGROUND RESEARCH NODE STARTED ===", "cyan")
-    task = state["task"]
-    companies = extract_companies(task)
-    
-    background_results = []
-    
-    # STEP 0: ANALYZE QUERY (Using GEMINI CLI TOOL)
+def _core_research(task: str) -> str:
+    """Background branch: analyze the query via the Gemini CLI, then search for its core entity."""
     print(f"\n   🎯 STEP 0: Query Analysis & Core Entity Research")
     try:
         analysis_prompt = f"""
@@ -123,34 +209,67 @@ def research_background_node(state: ResearchState):
         print(f"      [0] Generic Search: {generic_search[:60]}...")
         
         generic_result = tavily_search.invoke({"query": generic_search})
-        background_results.append(f"## CORE ENTITY RESEARCH: {core_entity}\n\n{generic_result[:1000]}...")
+        core_section = truncate_to_tokens(generic_result, SECTION_TOKEN_CAPS["background_core"])
+        return f"## CORE ENTITY RESEARCH: {core_entity}\n\n{core_section}"
         
     except Exception as e:
         cprint(f"[DEBUG] Analysis failed ({e}), using fallback search.", "yellow")
         basic_search = tavily_search.invoke({"query": task})
-        background_results.append(f"## BASIC SEARCH\n\n{basic_search[:1000]}...")
+        basic_section = truncate_to_tokens(basic_search, SECTION_TOKEN_CAPS["background_core"])
+        return f"## BASIC SEARCH\n\n{basic_section}"
 
-    # Continue with targeted searches
-    if companies:
-        for company in companies[:2]:
-            try:
-                print(f"      Researching {company}...")
-                news = tavily_search.invoke({"query": f"{company} latest news financial analysis"})
-                background_results.append(f"## {company} NEWS\n{news[:600]}...")
-            except: pass
+def _company_news(company: str) -> str:
+    """Background branch: latest news for one company (independent of the query analysis)."""
+    print(f"      Researching {company}...")
+    news = tavily_search.invoke({"query": f"{company} latest news financial analysis"})
+    news_section = truncate_to_tokens(news, SECTION_TOKEN_CAPS["background_news"])
+    return f"## {company} NEWS\n{news_section}"
+
+@instrument_node("background_research")
+def research_background_node(state: ResearchState):
+    """
+    Fan-out/fan-in: the query analysis and every company's news search run at once. Branches
+    still running after BACKGROUND_BRANCH_TIMEOUT seconds are dropped, failed ones are skipped.
+    Sections are merged in branch order (core research first), whatever order they finished in.
+    """
+    cprint("\n[DEBUG] === BACKGROUND RESEARCH NODE STARTED ===", "cyan")
+    task = state["task"]
+    companies = extract_companies(task)
+    timeout = BACKGROUND_BRANCH_TIMEOUT
+    
+    branches = [("core research", _core_research, task)] + [(company, _company_news, company) for company in companies]
+    print(f"   🔀 Background research: {len(branches)} branches in parallel, {timeout:.0f}s timeout each")
+    
+    # One thread per branch, so every company costs no more wall-clock time than the slowest branch
+    pool = ThreadPoolExecutor(max_workers=len(branches), thread_name_prefix="background")
+    futures = {pool.submit(contextvars.copy_context().run, fn, arg): name for name, fn, arg in branches}
+    try:
+        _, pending = wait(futures, timeout=timeout)
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+    
+    background_results = []
+    for future, name in futures.items():
+        if future in pending:
+            print(f"      ⏱️ {name}: no result after {timeout:.0f}s, left out")
+            continue
+        try:
+            background_results.append(future.result())
+        except Exception as e:
+            cprint(f"[DEBUG] Background branch '{name}' failed: {e}", "yellow")
 
     background = "\n\n".join(background_results) if background_results else "No background info."
     return {"companies": companies, "background_research": background}
 
 
+@instrument_node("planner")
 def planner_node(state: ResearchState):
     cprint("\n[DEBUG] === PLANNER NODE STARTED ===", "blue")
     task = state["task"]
     background = state.get("background_research", "")
     
     # Truncate background if massive
-    if len(background) > 20000: 
-        background = background[:20000] + "...(truncated)"
+    background = truncate_to_tokens(background, PLANNER_BACKGROUND_TOKENS)
 
     prompt = PLANNER_PROMPT.format(task=task, background=background)
     
@@ -158,6 +277,7 @@ def planner_node(state: ResearchState):
 
     max_retries = 3
     plan = []
+    dependencies = {}
     
     for attempt in range(max_retries):
         try:
@@ -173,7 +293,7 @@ def planner_node(state: ResearchState):
             if start_idx != -1 and end_idx != -1:
                 cleaned = cleaned[start_idx:end_idx]
 
-            plan = json.loads(cleaned)
+            plan, dependencies = parse_plan(json.loads(cleaned))
             cprint(f"[DEBUG] Successfully parsed plan with {len(plan)} steps", "blue")
             break
         except Exception as e:
@@ -182,15 +302,31 @@ def planner_node(state: ResearchState):
                 print("[ERROR] Fallback to simple plan.")
                 plan = [f"Research {task} thoroughly", "Synthesize findings"]
 
-    print(f"📋 PLAN GENERATED: {len(plan)} steps.")
+    graph = plan_dependencies({"plan": plan, "plan_dependencies": dependencies})
+    print(f"📋 PLAN GENERATED: {len(plan)} steps, critical path of {_critical_path(graph)}.")
     for i, step in enumerate(plan):
-        print(f"   {i + 1}. {step}")
+        after = f"  (after {', '.join(str(d + 1) for d in graph[i])})" if graph[i] else ""
+        print(f"   {i + 1}. {step}{after}")
 
-    return {"plan": plan, "current_step_index": 0, "step_results": {}}
+    return {"plan": plan, "plan_dependencies": dependencies, "current_step_index": 0, "step_results": {}}
 
 def approval_node(state: ResearchState):
     return {"plan": state["plan"]}
 
+def executor_context_budget(step: str) -> int:
+    template = EXECUTOR_PROMPT.format(step=step, context="", tools=GLOBAL_TOOL_REGISTRY.describe())
+    return min(EXECUTOR_CONTEXT_TOKENS, prompt_budget(EXECUTOR_MODEL_ID, call_site_max_tokens("executor"), reserved=template))
+
+def build_executor_context(step_results: Dict[str, str], step: str, index: ContextIndex = None) -> str:
+    """
+    The key facts of previous step outputs most relevant to `step`, packed into the executor's
+    context budget. Pass the run's ContextIndex so each result is only digested once.
+    """
+    index = index if index is not None else ContextIndex()
+    for k, v in step_results.items():
+        index.add(k, v)
+    return index.context(step, executor_context_budget(step), steps=list(step_results))
+
 def executor_node(state: ResearchState):
     # Executor remains on Llama 3.3 70B (OpenRouter) for tool handling
     step_idx = state["current_step_index"]
@@ -202,24 +338,63 @@ def executor_node(state: ResearchState):
     task = plan[step_idx]
     cprint(f"\n[DEBUG] === EXECUTING STEP {step_idx + 1}/{len(plan)}: {task} ===", "magenta")
     
-    context_str = "\n".join([f"Step '{k}': {v[:300]}..." for k, v in state["step_results"].items()])
+    context_str = build_executor_context(state["step_results"], task)
+    result_text = run_step(task, context_str)
+
+    return {
+        "step_results": {**state["step_results"], task: result_text},
+        "current_step_index": step_idx + 1
+    }
+
+class StepFailure(str):
+    """
+    What run_step returns for a step that failed. It reads like any other result, so the report
+    still mentions it, but it is not checkpointed as finished: a resumed run tries the step again.
+    """
 
+def dispatch_tool(tool_name: str, args: dict, task: str, context_str: str) -> str:
+    """Runs one resolved tool call through the tool registry (schema checked, timed, bounded)."""
+    if tool_name not in GLOBAL_TOOL_REGISTRY:
+        return StepFailure(f"Unknown tool: {tool_name}")
+    return GLOBAL_TOOL_REGISTRY.call(tool_name, args, context=context_str)
+
+def _tool_step_result(tool_name: str, args: dict, task: str, context_str: str) -> str:
+    """A tool call's result as a step result; unknown tools and error results are step failures."""
+    output = dispatch_tool(tool_name, args, task, context_str)
+    if isinstance(output, StepFailure) or is_error_result(output):
+        return StepFailure(f"Tool Execution Failed: {output}")
+    return f"Tool Output:\n{output}"
+
+def run_step(task: str, context_str: str) -> str:
+    """Executes one plan step (tool call, ensemble or direct synthesis); failures come back as StepFailure text."""
     is_analysis = any(k in task.lower() for k in ["compare", "analyze", "evaluate", "synthesize"])
     result_text = ""
     
     try:
+        parsed = parse_step(task)
         if is_analysis and "ensemble" in task.lower():
             cprint("[DEBUG] Routing to Ensemble Engine...", "magenta")
+            record_step_dispatch("ensemble")
             result_text = ensemble_query(task, context_str)
+        elif parsed:
+            # Well-formed "<tool> <args>" step: call the tool directly, no executor LLM round trip
+            tool_name, args = parsed
+            cprint(f"[DEBUG] Parsed Tool Call: {tool_name} {args}", "yellow")
+            record_step_dispatch("parsed")
+            try:
+                result_text = _tool_step_result(tool_name, args, task, context_str)
+            except Exception as e:
+                result_text = StepFailure(f"Tool Execution Failed: {str(e)}")
         else:
             tool_prompt = f"""
-            {EXECUTOR_PROMPT.format(step=task, context=context_str)}
+            {EXECUTOR_PROMPT.format(step=task, context=context_str, tools=GLOBAL_TOOL_REGISTRY.describe())}
             Based on the task, select the best tool. Respond ONLY with: TOOL: <name> ARGS: <json>
             """
             
-            # Using OpenRouter for Executor (Tools)
+            # Using OpenRouter for Executor (Tools), only for steps the parser could not resolve
             cprint(f"[DEBUG] Selecting tool via {EXECUTOR_MODEL_ID}...", "magenta")
-            response = call_openrouter(tool_prompt, EXECUTOR_MODEL_ID)
+            record_step_dispatch("llm")
+            response = call_openrouter(tool_prompt, EXECUTOR_MODEL_ID, max_tokens=call_site_max_tokens("executor"))
             
             if "TOOL:" in response:
                 parts = response.split("TOOL:")[1].split("ARGS:")
@@ -228,60 +403,151 @@ def executor_node(state: ResearchState):
                 try:
                     args = json.loads(args_str)
                     cprint(f"[DEBUG] Tool Call: {tool_name} {args}", "yellow")
-                    
-                    if tool_name == "tavily_search":
-                        tool_output = tavily_search.invoke(args)
-                    elif tool_name == "get_company_fundamentals":
-                        tool_output = get_company_fundamentals.invoke(args)
-                    elif tool_name == "get_historical_performance":
-                        tool_output = get_historical_performance.invoke(args)
-                    elif tool_name == "ensemble_query":
-                        tool_output = ensemble_query(args.get("query", task), context_str)
-                    elif tool_name == "load_skill":
-                        tool_output = load_skill.invoke(args)
-                    else:
-                        tool_output = f"Unknown tool: {tool_name}"
-                        
-                    result_text = f"Tool Output:\n{tool_output}"
+                    result_text = _tool_step_result(tool_name, args, task, context_str)
                 except Exception as e:
-                    result_text = f"Tool Execution Failed: {str(e)}"
+                    result_text = StepFailure(f"Tool Execution Failed: {str(e)}")
             else:
                 result_text = response
 
     except Exception as e:
-        result_text = f"Step Failed: {str(e)}"
+        result_text = StepFailure(f"Step Failed: {str(e)}")
 
-    return {
-        "step_results": {**state["step_results"], task: result_text},
-        "current_step_index": step_idx + 1
-    }
+    return result_text
+
+def execute_plan(state: ResearchState, width: int = None, on_step=None) -> Dict[str, str]:
+    """
+    Runs the plan as a dependency graph: every step whose dependencies are done is started,
+    up to `width` at a time, and sees the results of the steps it (transitively) depends on.
+    Steps already in state["step_results"], or recorded for state["run_id"] by the checkpointer,
+    are not run again; each step that succeeded is recorded there. on_step(index, step, result) is
+    called as each step finishes. Returns step_results in plan order, whatever order steps
+    finished in.
+    """
+    plan = state["plan"]
+    width = max(1, width or PLAN_MAX_PARALLEL_STEPS)
+    graph = plan_dependencies(state)
+    ancestors = _ancestors(graph)
+    run_id = state.get("run_id")
+    checkpointer = GLOBAL_CHECKPOINTER if run_id else None
+    # A resumed run picks up the steps it finished before it died
+    previous = {**(checkpointer.completed_steps(run_id) if checkpointer else {}), **(state.get("step_results") or {})}
+    results = {i: previous[step] for i, step in enumerate(plan) if step in previous}
+    index = ContextIndex()  # Facts of finished steps, extracted once and reused by every later step
+    print(f"⚡ PLAN: {len(plan) - len(results)} steps to run, critical path of {_critical_path(graph)}, width {width}")
+
+    pool = ThreadPoolExecutor(max_workers=width, thread_name_prefix="plan")
+    running = {}
+    try:
+        while len(results) < len(plan):
+            started = set(running.values())
+            for i, step in enumerate(plan):
+                if len(running) >= width:
+                    break
+                if i in results or i in started or not all(d in results for d in graph[i]):
+                    continue
+                context_str = build_executor_context({plan[a]: results[a] for a in ancestors[i]}, step, index)
+                cprint(f"\n[DEBUG] === STARTING STEP {i + 1}/{len(plan)}: {step} ===", "magenta")
+                # Each step runs in a copy of this context so node, priority and session follow it
+                running[pool.submit(contextvars.copy_context().run, run_step, step, context_str)] = i
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in sorted(done, key=running.get):
+                i = running.pop(future)
+                results[i] = future.result()
+                if checkpointer and not isinstance(results[i], StepFailure):
+                    checkpointer.record_step(run_id, plan[i], results[i])
+                if on_step:
+                    on_step(i, plan[i], results[i])
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    return {step: str(results[i]) for i, step in enumerate(plan)}
+
+def iter_plan(state: ResearchState, width: int = None):
+    """
+    execute_plan for UIs: yields (index, step, result) as each step finishes, then stores the
+    merged results in state["step_results"]. The plan runs on a helper thread meanwhile.
+    """
+    events = queue.Queue()
+
+    def run():
+        try:
+            with node_scope("executor"):
+                results = execute_plan(state, width, on_step=lambda *event: events.put(("step", event)))
+            events.put(("done", results))
+        except BaseException as e:
+            events.put(("error", e))
+
+    threading.Thread(target=contextvars.copy_context().run, args=(run,), daemon=True).start()
+    while True:
+        kind, payload = events.get()
+        if kind == "step":
+            yield payload
+        elif kind == "error":
+            raise payload
+        else:
+            state["step_results"] = payload
+            state["current_step_index"] = len(state["plan"])
+            return
+
+@instrument_node("executor")
+def plan_executor_node(state: ResearchState):
+    """Graph node: runs the whole plan, independent steps in parallel."""
+    return {"step_results": execute_plan(state), "current_step_index": len(state["plan"])}
 
 def orchestrator_check(state: ResearchState):
     if state["current_step_index"] < len(state["plan"]):
         return "continue"
     return "finalize"
 
-def reporter_node(state: ResearchState):
-    # Reporter remains on OpenRouter (Llama 405B) for high quality writing
-    cprint("\n[DEBUG] === REPORTER NODE STARTED ===", "green")
-    
-    print(f"\n✍️ WRITER ({PLANNER_MODEL_ID}): Synthesizing Final Report...")
-    
-    context_str = "\n".join([f"## Finding from '{k}'\n{v}" for k,v in state["step_results"].items()])
-    
-    final_prompt = f"""
+REPORT_PROMPT = """
     You are the Chief Financial Editor.
     Compile the research notes into a comprehensive, professional financial report in Markdown.
     
-    Original Task: {state["task"]}
+    Original Task: {task}
     
     RESEARCH NOTES:
-    {context_str}
+    {notes}
     
     Final Report (Use Headers, Tables, Bullet Points):
     """
+
+def build_report_prompt(state: ResearchState) -> str:
+    # Every finding gets a fair share of the writer's context window instead of overflowing it
+    template = REPORT_PROMPT.format(task=state["task"], notes="")
+    budget = prompt_budget(PLANNER_MODEL_ID, call_site_max_tokens("reporter"), reserved=template)
+    findings = [(0, f"## Finding from '{k}'\n{v}") for k, v in state["step_results"].items()]
+    return REPORT_PROMPT.format(task=state["task"], notes=pack_sections(findings, budget, separator="\n"))
+
+def stream_report(state: ResearchState):
+    """Yields the final report token by token so UIs can render it as it is written."""
+    print(f"\n✍️ WRITER ({PLANNER_MODEL_ID}): Streaming Final Report...")
+    with node_scope("reporter"):
+        yield from stream_openrouter(build_report_prompt(state), PLANNER_MODEL_ID, max_tokens=call_site_max_tokens("reporter"))
+
+def _report_token_writer():
+    # Inside a graph run, tokens go to stream_mode="custom" consumers; elsewhere there is no writer.
+    try:
+        return get_stream_writer()
+    except RuntimeError:
+        return None
+
+@instrument_node("reporter")
+def reporter_node(state: ResearchState):
+    # Reporter remains on OpenRouter (Llama 405B) for high quality writing
+    cprint("\n[DEBUG] === REPORTER NODE STARTED ===", "green")
+    
+    print(f"\n✍️ WRITER ({PLANNER_MODEL_ID}): Synthesizing Final Report...")
     
-    report = call_openrouter(final_prompt, PLANNER_MODEL_ID)
+    writer = _report_token_writer()
+    on_token = (lambda token: writer({"report_token": token})) if writer else None
+    
+    try:
+        report = call_openrouter(build_report_prompt(state), PLANNER_MODEL_ID, on_token=on_token,
+                                 max_tokens=call_site_max_tokens("reporter"))
+    except LLMCallError as e:
+        # Left unfinished, so resuming the run writes the report again instead of keeping the error
+        cprint(f"[DEBUG] Report generation failed: {e}", "red")
+        raise
     return {"final_report": report}
 
 # --- GRAPH ---
@@ -289,7 +555,7 @@ builder = StateGraph(ResearchState)
 builder.add_node("background_research", research_background_node)
 builder.add_node("planner", planner_node)
 builder.add_node("approval", approval_node)
-builder.add_node("executor", executor_node)
+builder.add_node("executor", plan_executor_node)
 builder.add_node("reporter", reporter_node)
 
 builder.set_entry_point("background_research")
@@ -302,4 +568,43 @@ builder.add_conditional_edges("executor", orchestrator_check, {
 })
 builder.add_edge("reporter", END)
 
-orchestrator_app = builder.compile()
\ No newline at end of file
+# Checkpointed after every node under the run ID passed as thread_id (see run_config)
+orchestrator_app = builder.compile(checkpointer=GLOBAL_CHECKPOINTER)
+
+# --- RUNS ---
+def new_run_id() -> str:
+    return uuid.uuid4().hex[:12]
+
+def run_config(run_id: str) -> dict:
+    """Graph config for a run: checkpoints are keyed by the run ID."""
+    return {"configurable": {"thread_id": run_id}}
+
+def record_progress(state: ResearchState, node: str):
+    """
+    For UIs that call the nodes themselves: checkpoints `state` as if graph node `node` had
+    just produced it, so the run can later be resumed from the UIs or main.py --resume.
+    """
+    if GLOBAL_CHECKPOINTER and state.get("run_id"):
+        values = {key: state[key] for key in ResearchState.__annotations__ if key in state}
+        orchestrator_app.update_state(run_config(state["run_id"]), values, as_node=node)
+
+def load_run(run_id: str):
+    """
+    The latest checkpointed state of a run, with step_results holding the plan steps that
+    succeeded, and the graph nodes still to run. (None, ()) for an unknown run. A run whose
+    report is still to be written but had failed steps is rewound to the executor, so the
+    failed steps are tried again first.
+    """
+    if not GLOBAL_CHECKPOINTER:
+        return None, ()
+    config = run_config(run_id)
+    snapshot = orchestrator_app.get_state(config)
+    if not snapshot.values:
+        return None, ()
+    state = dict(snapshot.values)
+    finished = GLOBAL_CHECKPOINTER.completed_steps(run_id)
+    state["step_results"] = {step: finished[step] for step in state.get("plan", []) if step in finished}
+    if snapshot.next == ("reporter",) and len(state["step_results"]) < len(state["plan"]):
+        orchestrator_app.update_state(config, {"step_results": state["step_results"]}, as_node="approval")
+        return state, orchestrator_app.get_state(config).next
+    return state, snapshot.next
\ No newline at end of file
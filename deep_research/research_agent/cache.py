@@ -0,0 +1,168 @@
+"""Response Cache.
+
+Content-addressed on-disk cache for LLM responses. Entries are keyed on a hash
+of (model, prompt, generation params), expire after a per-model TTL, and the
+least recently used entries are evicted once the store exceeds its size cap.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from research_agent.config import CACHE_ENABLED, CACHE_MAX_BYTES, CACHE_PATH, CACHE_TTLS
+from research_agent.metrics import record_cache_lookup
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    model TEXT NOT NULL,
+    response TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    expires_at REAL NOT NULL,
+    last_access REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS responses_last_access ON responses (last_access);
+"""
+
+
+class ResponseCache:
+    """
+    SQLite-backed LLM response cache with per-model TTLs and LRU eviction.
+    Safe to share between threads; WAL mode lets several processes share one file.
+    """
+
+    def __init__(self, path: str, max_bytes: int = CACHE_MAX_BYTES, ttls: dict = None, clock=time.time):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttls = dict(CACHE_TTLS if ttls is None else ttls)
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_SCHEMA)
+
+    @staticmethod
+    def make_key(model_id: str, prompt: str, params: dict = None) -> str:
+        """Stable SHA-256 key for a (model, prompt, params) triple."""
+        payload = json.dumps(
+            {"model": model_id, "prompt": prompt, "params": params or {}},
+            sort_keys=True,
+            ensure_ascii=False,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def ttl_for(self, model_id: str) -> float:
+        return self.ttls.get(model_id, self.ttls.get("default", 0))
+
+    def get(self, key: str):
+        """Returns the cached response, or None on a miss or expired entry."""
+        now = self.clock()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT response, expires_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            response, expires_at = row
+            if expires_at <= now:
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE responses SET last_access = ? WHERE key = ?", (now, key))
+            self.hits += 1
+            return response
+
+    def set(self, key: str, model_id: str, response: str):
+        """Stores a response under the model's TTL, then evicts down to the size cap."""
+        ttl = self.ttl_for(model_id)
+        if ttl <= 0:
+            return
+        now = self.clock()
+        size = len(response.encode("utf-8"))
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, model_id, response, size, now, now + ttl, now),
+            )
+            self._evict(now)
+
+    def _evict(self, now: float):
+        self._conn.execute("DELETE FROM responses WHERE expires_at <= ?", (now,))
+        # Keep the most recently used entries whose running size fits under the cap
+        self._conn.execute(
+            """
+            DELETE FROM responses WHERE key IN (
+                SELECT key FROM (
+                    SELECT key, SUM(size) OVER (ORDER BY last_access DESC, created_at DESC) AS running
+                    FROM responses
+                ) WHERE running > ?
+            )
+            """,
+            (self.max_bytes,),
+        )
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            entries, size = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses"
+            ).fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": entries,
+            "bytes": size,
+        }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def cache_enabled() -> bool:
+    """The cache is on unless disabled in config or bypassed via DEEP_RESEARCH_NO_CACHE=1."""
+    return CACHE_ENABLED and os.environ.get("DEEP_RESEARCH_NO_CACHE", "0") in ("", "0")
+
+
+def get_response_cache():
+    """Returns the process-wide ResponseCache, or None when caching is bypassed."""
+    global _cache
+    if not cache_enabled():
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = ResponseCache(CACHE_PATH)
+    return _cache
+
+
+def cache_lookup(model_id: str, prompt: str, params: dict, use_cache: bool = True):
+    """
+    Returns (cache, key, cached_response). cache is None when caching is bypassed.
+    """
+    cache = get_response_cache() if use_cache else None
+    if cache is None:
+        return None, None, None
+    key = cache.make_key(model_id, prompt, params)
+    cached = cache.get(key)
+    record_cache_lookup(model_id, cached is not None)
+    if cached is not None:
+        print(f"💾 CACHE HIT: {model_id}")
+    return cache, key, cached
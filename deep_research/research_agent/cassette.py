@@ -0,0 +1,302 @@
+"""Record/Replay Transport.
+
+Captures upstream exchanges into a JSONL cassette and serves them back
+deterministically, so the orchestrator can be regression-tested and
+benchmarked without keys or network:
+
+- OpenRouter: at the HTTP layer, via CassetteTransport on the pooled clients
+  (streamed completions are recorded whole and replayed as one body)
+- Gemini deep-think, Gemini CLI, Tavily and yfinance: at the function layer,
+  via through_cassette() / @recorded
+
+Identical requests replay in the order they were recorded. Replays can inject
+a fixed latency or the latency observed while recording.
+"""
+
+import asyncio
+import functools
+import hashlib
+import inspect
+import json
+import os
+import threading
+import time
+from collections import deque
+
+import httpx
+
+from research_agent.config import CASSETTE_MODE, CASSETTE_PATH, REPLAY_LATENCY, REPLAY_LATENCY_SCALE
+from research_agent import resilience
+
+MODES = ("off", "record", "replay")
+
+# Headers that describe the wire encoding of the recorded body, not the body we store
+_WIRE_HEADERS = {"content-encoding", "content-length", "transfer-encoding", "connection"}
+
+
+class CassetteMiss(LookupError):
+    """Replay found no recorded interaction for a request."""
+
+
+class Cassette:
+    """
+    One JSONL file of interactions: {"kind", "key", "request", "response" | "error", "duration"}.
+    Safe to share between threads.
+    """
+
+    def __init__(self, path: str, mode: str = "replay", latency=0.0, latency_scale: float = 1.0, sleep=time.sleep):
+        if mode not in ("record", "replay"):
+            raise ValueError(f"Cassette mode must be 'record' or 'replay', not {mode!r}")
+        self.path = path
+        self.mode = mode
+        self.latency = latency
+        self.latency_scale = latency_scale
+        self.sleep = sleep
+        self._lock = threading.Lock()
+        self._interactions = {}
+        if mode == "replay":
+            self._load()
+        else:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def make_key(kind: str, request: dict) -> str:
+        payload = json.dumps({"kind": kind, "request": request}, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _load(self):
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    self._interactions.setdefault(entry["key"], deque()).append(entry)
+
+    def __len__(self):
+        with self._lock:
+            return sum(len(entries) for entries in self._interactions.values())
+
+    def record(self, kind: str, request: dict, response=None, error: BaseException = None, duration: float = 0.0):
+        entry = {"kind": kind, "key": self.make_key(kind, request), "request": request, "duration": round(duration, 4)}
+        if error is not None:
+            entry["error"] = {
+                "type": type(error).__name__,
+                "message": str(error),
+                "model_id": getattr(error, "model_id", None),
+                "retry_after": getattr(error, "retry_after", None),
+                "status_code": getattr(error, "status_code", None),
+            }
+        else:
+            entry["response"] = response
+        line = json.dumps(entry, ensure_ascii=False, default=str)
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+
+    def next(self, kind: str, request: dict) -> dict:
+        """The next recorded interaction for this request; the last one repeats once the rest are used."""
+        key = self.make_key(kind, request)
+        with self._lock:
+            entries = self._interactions.get(key)
+            if not entries:
+                raise CassetteMiss(f"No recorded {kind} interaction for {json.dumps(request)[:200]}")
+            return entries.popleft() if len(entries) > 1 else entries[0]
+
+    def replay_delay(self, entry: dict) -> float:
+        if self.latency == "recorded":
+            return entry.get("duration", 0.0) * self.latency_scale
+        return float(self.latency or 0.0) * self.latency_scale
+
+
+def _replay_result(entry: dict):
+    error = entry.get("error")
+    if error is None:
+        return entry.get("response")
+    error_type = getattr(resilience, error["type"], None)
+    if isinstance(error_type, type) and issubclass(error_type, resilience.LLMCallError):
+        raise error_type(error["message"], error["model_id"], error["retry_after"], error.get("status_code"))
+    raise RuntimeError(f"{error['type']}: {error['message']}")
+
+
+_active = None
+_active_loaded = False
+_active_lock = threading.Lock()
+
+
+def get_active_cassette():
+    """The process-wide cassette selected by DEEP_RESEARCH_CASSETTE_MODE, or None when off."""
+    global _active, _active_loaded
+    if not _active_loaded:
+        with _active_lock:
+            if not _active_loaded:
+                if CASSETTE_MODE not in MODES:
+                    raise ValueError(f"DEEP_RESEARCH_CASSETTE_MODE must be one of {MODES}, not {CASSETTE_MODE!r}")
+                if CASSETTE_MODE != "off":
+                    latency = REPLAY_LATENCY if REPLAY_LATENCY == "recorded" else float(REPLAY_LATENCY)
+                    _active = Cassette(CASSETTE_PATH, CASSETTE_MODE, latency, REPLAY_LATENCY_SCALE)
+                    print(f"📼 CASSETTE {CASSETTE_MODE.upper()}: {CASSETTE_PATH}")
+                _active_loaded = True
+    return _active
+
+
+def set_active_cassette(cassette):
+    """Installs (or with None, removes) the process-wide cassette; returns the previous one.
+    Pooled HTTP clients pick up the change the next time they are created."""
+    global _active, _active_loaded
+    with _active_lock:
+        previous = _active
+        _active = cassette
+        _active_loaded = True
+    return previous
+
+
+# --- FUNCTION LAYER ---
+def through_cassette(kind: str, request: dict, fn):
+    """Runs fn() through the active cassette: recorded in record mode, replaced by the recording in replay mode."""
+    cassette = get_active_cassette()
+    if cassette is None:
+        return fn()
+    if cassette.mode == "replay":
+        entry = cassette.next(kind, request)
+        cassette.sleep(cassette.replay_delay(entry))
+        return _replay_result(entry)
+    started = time.monotonic()
+    try:
+        result = fn()
+    except Exception as e:
+        cassette.record(kind, request, error=e, duration=time.monotonic() - started)
+        raise
+    cassette.record(kind, request, response=result, duration=time.monotonic() - started)
+    return result
+
+
+async def athrough_cassette(kind: str, request: dict, coro_fn):
+    """Async variant of through_cassette; coro_fn() must return an awaitable."""
+    cassette = get_active_cassette()
+    if cassette is None:
+        return await coro_fn()
+    if cassette.mode == "replay":
+        entry = cassette.next(kind, request)
+        await asyncio.sleep(cassette.replay_delay(entry))
+        return _replay_result(entry)
+    started = time.monotonic()
+    try:
+        result = await coro_fn()
+    except Exception as e:
+        cassette.record(kind, request, error=e, duration=time.monotonic() - started)
+        raise
+    cassette.record(kind, request, response=result, duration=time.monotonic() - started)
+    return result
+
+
+def recorded(kind: str):
+    """Decorator that routes a sync function through the active cassette, keyed on its normalised arguments."""
+    def decorator(fn):
+        signature = inspect.signature(fn)
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            return through_cassette(kind, dict(bound.arguments), lambda: fn(*args, **kwargs))
+        return wrapper
+
+    return decorator
+
+
+# --- HTTP LAYER ---
+def _http_request_record(request: httpx.Request) -> dict:
+    """What identifies an HTTP exchange: method, path and JSON body. Host and auth headers are left out
+    so a cassette recorded against OpenRouter replays against any base URL."""
+    body = request.content.decode("utf-8") if request.content else ""
+    try:
+        body = json.loads(body) if body else None
+    except json.JSONDecodeError:
+        pass
+    return {"method": request.method, "path": request.url.path, "body": body}
+
+
+def _stored_headers(headers) -> dict:
+    return {k: v for k, v in headers.items() if k.lower() not in _WIRE_HEADERS}
+
+
+def _replayed_response(entry: dict, request: httpx.Request) -> httpx.Response:
+    response = entry.get("response")
+    if response is None:
+        raise httpx.ConnectError(entry["error"]["message"], request=request)
+    return httpx.Response(
+        response["status_code"],
+        headers=response["headers"],
+        content=response["body"].encode("utf-8"),
+        request=request,
+    )
+
+
+class CassetteTransport(httpx.BaseTransport, httpx.AsyncBaseTransport):
+    """
+    httpx transport that records exchanges made through an inner transport, or
+    replays them from the cassette without touching the network.
+    """
+
+    def __init__(self, cassette: Cassette, inner=None):
+        self.cassette = cassette
+        self.inner = inner
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        record = _http_request_record(request)
+        if self.cassette.mode == "replay":
+            entry = self._next(record, request)
+            self.cassette.sleep(self.cassette.replay_delay(entry))
+            return _replayed_response(entry, request)
+
+        started = time.monotonic()
+        try:
+            response = self.inner.handle_request(request)
+            body = response.read()
+        except httpx.TransportError as e:
+            self.cassette.record("http", record, error=e, duration=time.monotonic() - started)
+            raise
+        return self._record(record, request, response, body, started)
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        record = _http_request_record(request)
+        if self.cassette.mode == "replay":
+            entry = self._next(record, request)
+            await asyncio.sleep(self.cassette.replay_delay(entry))
+            return _replayed_response(entry, request)
+
+        started = time.monotonic()
+        try:
+            response = await self.inner.handle_async_request(request)
+            body = await response.aread()
+        except httpx.TransportError as e:
+            self.cassette.record("http", record, error=e, duration=time.monotonic() - started)
+            raise
+        return self._record(record, request, response, body, started)
+
+    def _next(self, record: dict, request: httpx.Request) -> dict:
+        try:
+            return self.cassette.next("http", record)
+        except CassetteMiss as e:
+            # Surface misses as transport failures so callers see a normal connection error
+            raise httpx.ConnectError(str(e), request=request) from e
+
+    def _record(self, record, request, response, body, started) -> httpx.Response:
+        headers = _stored_headers(response.headers)
+        text = body.decode("utf-8", errors="replace")
+        self.cassette.record(
+            "http",
+            record,
+            response={"status_code": response.status_code, "headers": headers, "body": text},
+            duration=time.monotonic() - started,
+        )
+        return httpx.Response(response.status_code, headers=headers, content=body, request=request)
+
+    def close(self):
+        if self.inner is not None and hasattr(self.inner, "close"):
+            self.inner.close()
+
+    async def aclose(self):
+        if self.inner is not None and hasattr(self.inner, "aclose"):
+            await self.inner.aclose()
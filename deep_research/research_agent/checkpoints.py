@@ -0,0 +1,242 @@
+"""Run Checkpoints.
+
+Durable, local checkpointing for research runs. SQLiteCheckpointer is a LangGraph
+checkpointer that keeps every graph checkpoint (and the pending writes of a step
+that was interrupted) in SQLite as compressed serialized blobs, keyed by run ID,
+so a run that dies at step 7 resumes from its last completed node. Plan steps are
+also recorded one by one as they finish, so the executor skips finished steps of
+a half-executed plan instead of repeating their searches and LLM calls.
+"""
+
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from typing import Any, Iterator, Optional, Sequence
+
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    WRITES_IDX_MAP,
+    BaseCheckpointSaver,
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+    get_checkpoint_id,
+    get_checkpoint_metadata,
+)
+
+from research_agent.config import CHECKPOINT_COMPRESSION_LEVEL, CHECKPOINT_PATH, CHECKPOINTS_ENABLED
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS checkpoints (
+    run_id TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL,
+    checkpoint_id TEXT NOT NULL,
+    parent_id TEXT,
+    type TEXT NOT NULL,
+    checkpoint BLOB NOT NULL,
+    metadata_type TEXT NOT NULL,
+    metadata BLOB NOT NULL,
+    created_at REAL NOT NULL,
+    PRIMARY KEY (run_id, checkpoint_ns, checkpoint_id)
+);
+CREATE TABLE IF NOT EXISTS writes (
+    run_id TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL,
+    checkpoint_id TEXT NOT NULL,
+    task_id TEXT NOT NULL,
+    idx INTEGER NOT NULL,
+    channel TEXT NOT NULL,
+    type TEXT NOT NULL,
+    value BLOB NOT NULL,
+    task_path TEXT NOT NULL,
+    PRIMARY KEY (run_id, checkpoint_ns, checkpoint_id, task_id, idx)
+);
+CREATE TABLE IF NOT EXISTS plan_steps (
+    run_id TEXT NOT NULL,
+    step TEXT NOT NULL,
+    result BLOB NOT NULL,
+    finished_at REAL NOT NULL,
+    PRIMARY KEY (run_id, step)
+);
+"""
+
+
+class SQLiteCheckpointer(BaseCheckpointSaver):
+    """
+    LangGraph checkpointer backed by one SQLite file. Checkpoints hold the full state and
+    are stored zlib-compressed (research state is mostly text and compresses several-fold).
+    The async methods run the sync ones: SQLite calls are short and local.
+    """
+
+    def __init__(self, path: str, compression_level: int = CHECKPOINT_COMPRESSION_LEVEL):
+        super().__init__()
+        self.path = path
+        self.compression_level = compression_level
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def _connection(self):
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False, isolation_level=None)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript(_SCHEMA)
+        return self._conn
+
+    def _pack(self, value: Any):
+        type_, data = self.serde.dumps_typed(value)
+        return type_, zlib.compress(data, self.compression_level)
+
+    def _unpack(self, type_: str, blob: bytes) -> Any:
+        return self.serde.loads_typed((type_, zlib.decompress(blob)))
+
+    # --- checkpoints ---
+    def get_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        """The checkpoint named in config, or the run's latest one when config names none."""
+        return next(self.list(config, limit=1), None)
+
+    def list(self, config: Optional[RunnableConfig], *, filter: Optional[dict] = None,
+             before: Optional[RunnableConfig] = None, limit: Optional[int] = None) -> Iterator[CheckpointTuple]:
+        """Checkpoints matching config, filter and before, newest first."""
+        clauses, params = [], []
+        if config:
+            clauses.append("run_id = ?")
+            params.append(config["configurable"]["thread_id"])
+            if config["configurable"].get("checkpoint_ns") is not None:
+                clauses.append("checkpoint_ns = ?")
+                params.append(config["configurable"]["checkpoint_ns"])
+            if checkpoint_id := get_checkpoint_id(config):
+                clauses.append("checkpoint_id = ?")
+                params.append(checkpoint_id)
+        if before and (before_id := get_checkpoint_id(before)):
+            clauses.append("checkpoint_id < ?")
+            params.append(before_id)
+        sql = "SELECT run_id, checkpoint_ns, checkpoint_id, parent_id, type, checkpoint, metadata_type, metadata FROM checkpoints"
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += " ORDER BY checkpoint_id DESC"
+
+        with self._lock:
+            rows = self._connection().execute(sql, params).fetchall()
+        for run_id, ns, checkpoint_id, parent_id, type_, blob, metadata_type, metadata_blob in rows:
+            metadata = self._unpack(metadata_type, metadata_blob)
+            if filter and not all(metadata.get(k) == v for k, v in filter.items()):
+                continue
+            if limit is not None:
+                if limit <= 0:
+                    return
+                limit -= 1
+            yield CheckpointTuple(
+                config={"configurable": {"thread_id": run_id, "checkpoint_ns": ns, "checkpoint_id": checkpoint_id}},
+                checkpoint=self._unpack(type_, blob),
+                metadata=metadata,
+                parent_config=(
+                    {"configurable": {"thread_id": run_id, "checkpoint_ns": ns, "checkpoint_id": parent_id}}
+                    if parent_id else None
+                ),
+                pending_writes=self._pending_writes(run_id, ns, checkpoint_id),
+            )
+
+    def _pending_writes(self, run_id: str, ns: str, checkpoint_id: str) -> list:
+        with self._lock:
+            rows = self._connection().execute(
+                "SELECT task_id, channel, type, value FROM writes"
+                " WHERE run_id = ? AND checkpoint_ns = ? AND checkpoint_id = ?"
+                " ORDER BY task_path, task_id, idx",  # writes_sort_key order
+                (run_id, ns, checkpoint_id),
+            ).fetchall()
+        return [(task_id, channel, self._unpack(type_, value)) for task_id, channel, type_, value in rows]
+
+    def put(self, config: RunnableConfig, checkpoint: Checkpoint, metadata: CheckpointMetadata,
+            new_versions: ChannelVersions) -> RunnableConfig:
+        run_id = config["configurable"]["thread_id"]
+        ns = config["configurable"].get("checkpoint_ns", "")
+        type_, blob = self._pack(checkpoint)
+        metadata_type, metadata_blob = self._pack(get_checkpoint_metadata(config, metadata))
+        with self._lock:
+            self._connection().execute(
+                "INSERT OR REPLACE INTO checkpoints VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (run_id, ns, checkpoint["id"], config["configurable"].get("checkpoint_id"),
+                 type_, blob, metadata_type, metadata_blob, time.time()),
+            )
+        return {"configurable": {"thread_id": run_id, "checkpoint_ns": ns, "checkpoint_id": checkpoint["id"]}}
+
+    def put_writes(self, config: RunnableConfig, writes: Sequence[tuple], task_id: str, task_path: str = "") -> None:
+        """Writes of a task that finished while others in its step did not, so they are not redone."""
+        run_id = config["configurable"]["thread_id"]
+        ns = config["configurable"].get("checkpoint_ns", "")
+        checkpoint_id = config["configurable"]["checkpoint_id"]
+        rows = []
+        for idx, (channel, value) in enumerate(writes):
+            idx = WRITES_IDX_MAP.get(channel, idx)
+            rows.append((idx, (run_id, ns, checkpoint_id, task_id, idx, channel, *self._pack(value), task_path)))
+        with self._lock:
+            conn = self._connection()
+            for idx, row in rows:
+                # Special writes (errors, interrupts) replace earlier ones; regular writes are kept once
+                verb = "INSERT OR REPLACE" if idx < 0 else "INSERT OR IGNORE"
+                conn.execute(f"{verb} INTO writes VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", row)
+
+    def delete_thread(self, thread_id: str) -> None:
+        with self._lock:
+            conn = self._connection()
+            for table in ("checkpoints", "writes", "plan_steps"):
+                conn.execute(f"DELETE FROM {table} WHERE run_id = ?", (thread_id,))
+
+    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        return self.get_tuple(config)
+
+    async def alist(self, config: Optional[RunnableConfig], *, filter: Optional[dict] = None,
+                    before: Optional[RunnableConfig] = None, limit: Optional[int] = None):
+        for item in self.list(config, filter=filter, before=before, limit=limit):
+            yield item
+
+    async def aput(self, config: RunnableConfig, checkpoint: Checkpoint, metadata: CheckpointMetadata,
+                   new_versions: ChannelVersions) -> RunnableConfig:
+        return self.put(config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(self, config: RunnableConfig, writes: Sequence[tuple], task_id: str,
+                          task_path: str = "") -> None:
+        return self.put_writes(config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        return self.delete_thread(thread_id)
+
+    def get_next_version(self, current, channel=None) -> str:
+        # Zero-padded so versions compare correctly as strings, like the in-memory saver's
+        current_v = 0 if current is None else current if isinstance(current, int) else int(current.split(".")[0])
+        return f"{current_v + 1:032}"
+
+    # --- plan steps ---
+    def record_step(self, run_id: str, step: str, result: str):
+        """One finished plan step of a run."""
+        with self._lock:
+            self._connection().execute(
+                "INSERT OR REPLACE INTO plan_steps VALUES (?, ?, ?, ?)",
+                (run_id, step, zlib.compress(result.encode("utf-8"), self.compression_level), time.time()),
+            )
+
+    def completed_steps(self, run_id: str) -> dict:
+        """step -> result for every plan step the run has finished."""
+        with self._lock:
+            rows = self._connection().execute(
+                "SELECT step, result FROM plan_steps WHERE run_id = ? ORDER BY finished_at", (run_id,)
+            ).fetchall()
+        return {step: zlib.decompress(result).decode("utf-8") for step, result in rows}
+
+    def runs(self, limit: int = 20) -> list:
+        """(run_id, last checkpoint time) of the most recently active runs."""
+        with self._lock:
+            return self._connection().execute(
+                "SELECT run_id, MAX(created_at) AS updated FROM checkpoints"
+                " GROUP BY run_id ORDER BY updated DESC LIMIT ?", (limit,)
+            ).fetchall()
+
+
+# Global singleton instance (None when checkpointing is disabled)
+GLOBAL_CHECKPOINTER = SQLiteCheckpointer(CHECKPOINT_PATH) if CHECKPOINTS_ENABLED else None
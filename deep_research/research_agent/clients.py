@@ -1,197 +1,860 @@
 import os
 import json
-import requests
+import asyncio
 import subprocess
+import re
+import time
+import httpx
 from google import genai
 from google.genai import types
 from dotenv import load_dotenv
-import sys 
+import sys
 
-from research_agent.config import MODEL_LIMITS, LEVEL_5_MODEL
-from research_agent.rate_limiter import GLOBAL_RATE_LIMITER
+from research_agent.cache import cache_lookup
+from research_agent.cassette import athrough_cassette, get_active_cassette, through_cassette
+from research_agent.config import (
+    LEVEL_5_MODEL,
+    OPENROUTER_BASE_URL,
+    HTTP_CONNECT_TIMEOUT,
+    HTTP_READ_TIMEOUT,
+    GEMINI_CLI_TIMEOUT,
+    MAX_TOKENS_BY_CALL_SITE,
+    MODEL_CONTEXT_WINDOWS,
+    MODEL_MAX_OUTPUT_TOKENS,
+    PROMPT_SAFETY_MARGIN,
+)
+from research_agent.hedging import GLOBAL_LATENCY_TRACKER, arun_hedged, hedge_delay, hedging_enabled, run_hedged
+from research_agent.metrics import llm_call_timer, record_llm_call, record_ttft, record_usage
+from research_agent.http_transport import get_http_client, get_async_http_client
+from research_agent.rate_limiter import GLOBAL_RATE_LIMITER, limits_for
+from research_agent.singleflight import coalesce
+from research_agent.text_utils import count_tokens, truncate_to_tokens
+from research_agent.resilience import (
+    GLOBAL_CALL_POLICY,
+    FatalError,
+    LLMCallError,
+    RetryableError,
+    error_for_status,
+    fallback_chain,
+)
 
 load_dotenv(override=True)
 
+_genai_client = None
+
+
+def get_genai_client():
+    """Return a process-wide Gemini client so its connection pool is reused."""
+    global _genai_client
+    if _genai_client is None:
+        _genai_client = genai.Client(api_key=os.environ.get("GEMINI_API_KEY"))
+    return _genai_client
+
+# --- RESPONSE CACHE ---
+def _models_for(model_id: str, fallback: bool) -> list:
+    return fallback_chain(model_id) if fallback else [model_id]
+
+# --- RATE LIMITS ---
+def _acquire(model_id: str, prompt: str):
+    """Waits for the model's RPM / TPM / in-flight limits; the request is charged its estimated prompt tokens."""
+    return GLOBAL_RATE_LIMITER.acquire(model_id, limits_for(model_id), count_tokens(prompt))
+
+
+async def _aacquire(model_id: str, prompt: str):
+    return await GLOBAL_RATE_LIMITER.async_acquire(model_id, limits_for(model_id), count_tokens(prompt))
+
+
+def _observe_limits(model_id: str, status_code: int, headers=None):
+    """Lets the adaptive limiter learn from a response: 429 backs off, success grows the limit."""
+    GLOBAL_RATE_LIMITER.observe(model_id, status_code, headers)
+
+
+def _settle(lease, model_id: str, usage: dict):
+    """Records the provider's usage and corrects the limiter's token charge with it."""
+    record_usage(model_id, usage)
+    if lease is not None and usage:
+        total = usage.get("total_tokens") or (usage.get("prompt_tokens") or 0) + (usage.get("completion_tokens") or 0)
+        lease.settle(total)
+
 # --- GOOGLE GENAI CLIENT (Level 5) ---
-def call_gemini_deep_think(prompt: str):
-    """
-    Uses Gemini 3 Pro Preview with High Thinking config.
-    """
-    # 1. Rate Limit Check
-    limit = MODEL_LIMITS.get(LEVEL_5_MODEL, MODEL_LIMITS["default"])
-    GLOBAL_RATE_LIMITER.wait_for_slot(LEVEL_5_MODEL, limit)
-    
-    print("🧠 INVOKING GEMINI 3 PRO PREVIEW (DEEP THINKING)...")
-    
-    api_key = os.environ.get("GEMINI_API_KEY")
-    if not api_key:
-        return "Error: GEMINI_API_KEY not found in environment variables."
-
-    import time
-    
-    # REVERTING TO USER CODE SNIPPET EXACTLY
-    client = genai.Client(api_key=os.environ.get("GEMINI_API_KEY"))
-    model = "gemini-3-pro-preview" 
-    
+# Generation params that change Gemini output, and therefore the cache key
+GEMINI_CACHE_PARAMS = {"thinking": True, "tools": ["google_search"]}
+
+_GEMINI_RETRY_DELAY = re.compile(r"retryDelay['\"]?\s*[:=]\s*['\"]?(\d+(?:\.\d+)?)s")
+
+
+def _gemini_request(prompt: str, timeout: float):
+    """Builds the (model, contents, config) triple shared by the sync and async clients."""
     contents = [
         types.Content(
             role="user",
             parts=[types.Part.from_text(text=prompt)],
         ),
     ]
-    
+
     # Enable Google Search tool + Thinking
     tools = [
         types.Tool(google_search=types.GoogleSearch()),
     ]
-    
+
     config = types.GenerateContentConfig(
         thinking_config=types.ThinkingConfig(include_thoughts=True),
         tools=tools,
         response_modalities=["TEXT"],
+        http_options=types.HttpOptions(timeout=int(timeout * 1000)),
     )
+    return LEVEL_5_MODEL, contents, config
+
+
+def _gemini_error(error: Exception) -> LLMCallError:
+    """Maps a genai SDK / transport exception onto the retryable/fatal error types."""
+    if isinstance(error, (httpx.TimeoutException, httpx.TransportError)):
+        return RetryableError(f"Gemini transport error: {error}", LEVEL_5_MODEL)
+    code = getattr(error, "code", None)
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    if code is None:
+        error_str = str(error)
+        code = 429 if ("429" in error_str or "RESOURCE_EXHAUSTED" in error_str) else 500
+    mapped = error_for_status(code, str(error), LEVEL_5_MODEL, headers)
+    if mapped.retry_after is None:
+        # Gemini puts its hint in the RetryInfo error detail rather than a header
+        match = _GEMINI_RETRY_DELAY.search(str(error))
+        if match:
+            mapped.retry_after = float(match.group(1))
+    return mapped
+
+
+def _gemini_usage(usage_metadata) -> dict:
+    """Maps Gemini's usage metadata onto OpenRouter-style usage keys."""
+    if usage_metadata is None:
+        return {}
+    return {
+        "prompt_tokens": usage_metadata.prompt_token_count or 0,
+        "completion_tokens": (usage_metadata.candidates_token_count or 0) + (usage_metadata.thoughts_token_count or 0),
+    }
+
+
+def _gemini_cassette_request(prompt: str) -> dict:
+    return {"model": LEVEL_5_MODEL, "prompt": prompt, **GEMINI_CACHE_PARAMS}
+
+
+def _gemini_attempt(prompt: str, timeout: float) -> str:
+    """One Gemini streaming call; raises LLMCallError on failure."""
+    # 1. Rate Limit Check
+    with _acquire(LEVEL_5_MODEL, prompt) as lease:
+        print("🧠 INVOKING GEMINI 3 PRO PREVIEW (DEEP THINKING)...")
+        with llm_call_timer(LEVEL_5_MODEL):
+            return through_cassette("gemini", _gemini_cassette_request(prompt), lambda: _gemini_stream(prompt, timeout, lease))
+
+
+def _gemini_stream(prompt: str, timeout: float, lease=None) -> str:
+    if not os.environ.get("GEMINI_API_KEY"):
+        raise FatalError("GEMINI_API_KEY not found in environment variables.", LEVEL_5_MODEL)
+
+    client = get_genai_client()
+    model, contents, config = _gemini_request(prompt, timeout)
 
     full_response = []
-    
-    # Retry loop for 429 errors
-    max_retries = 3
-    for attempt in range(max_retries):
-        try:
-            print("\n--- GEMINI THINKING PROCESS ---")
-            full_response = []
-            for chunk in client.models.generate_content_stream(
-                model=model,
-                contents=contents,
-                config=config,
-            ):
-                if chunk.text:
-                    print(chunk.text, end="", flush=True)
-                    full_response.append(chunk.text)
-            
-            # If we get here success
-            print("\n--- END THINKING ---\n")
-            return "".join(full_response)
+    usage = None
+    started = time.monotonic()
+    try:
+        print("\n--- GEMINI THINKING PROCESS ---")
+        for chunk in client.models.generate_content_stream(
+            model=model,
+            contents=contents,
+            config=config,
+        ):
+            usage = chunk.usage_metadata or usage
+            if chunk.text:
+                if not full_response:
+                    record_ttft(LEVEL_5_MODEL, time.monotonic() - started)
+                print(chunk.text, end="", flush=True)
+                full_response.append(chunk.text)
+    except Exception as e:
+        error = _gemini_error(e)
+        _observe_limits(LEVEL_5_MODEL, error.status_code)
+        raise error from e
+    _observe_limits(LEVEL_5_MODEL, 200)
+    _settle(lease, LEVEL_5_MODEL, _gemini_usage(usage))
 
-        except Exception as e:
-            error_str = str(e)
-            if "429" in error_str or "RESOURCE_EXHAUSTED" in error_str:
-                wait_time = 15 * (attempt + 1)
-                print(f"\n⚠️ Gemini Rate Limit Hit (Attempt {attempt+1}/{max_retries}). Waiting {wait_time}s...")
-                time.sleep(wait_time)
-            else:
-                return f"Gemini Error: {str(e)}"
-    
-    return "Error: Gemini Rate Limit Exceeded after retries."
+    print("\n--- END THINKING ---\n")
+    return "".join(full_response)
 
-# --- OPENROUTER CLIENT (Levels 1-4) ---
-def call_openrouter(prompt: str, model_id: str):
+
+async def _agemini_attempt(prompt: str, timeout: float) -> str:
+    with await _aacquire(LEVEL_5_MODEL, prompt) as lease:
+        print("🧠 INVOKING GEMINI 3 PRO PREVIEW (DEEP THINKING, ASYNC)...")
+        with llm_call_timer(LEVEL_5_MODEL):
+            return await athrough_cassette(
+                "gemini", _gemini_cassette_request(prompt), lambda: _agemini_stream(prompt, timeout, lease)
+            )
+
+
+async def _agemini_stream(prompt: str, timeout: float, lease=None) -> str:
+    if not os.environ.get("GEMINI_API_KEY"):
+        raise FatalError("GEMINI_API_KEY not found in environment variables.", LEVEL_5_MODEL)
+
+    client = get_genai_client()
+    model, contents, config = _gemini_request(prompt, timeout)
+
+    full_response = []
+    usage = None
+    started = time.monotonic()
+    try:
+        stream = await client.aio.models.generate_content_stream(
+            model=model,
+            contents=contents,
+            config=config,
+        )
+        async for chunk in stream:
+            usage = chunk.usage_metadata or usage
+            if chunk.text:
+                if not full_response:
+                    record_ttft(LEVEL_5_MODEL, time.monotonic() - started)
+                full_response.append(chunk.text)
+    except Exception as e:
+        error = _gemini_error(e)
+        _observe_limits(LEVEL_5_MODEL, error.status_code)
+        raise error from e
+    _observe_limits(LEVEL_5_MODEL, 200)
+    _settle(lease, LEVEL_5_MODEL, _gemini_usage(usage))
+    return "".join(full_response)
+
+
+def call_gemini_deep_think(prompt: str, use_cache: bool = True, fallback: bool = True, deadline=None):
     """
-    Generic wrapper for OpenRouter models.
+    Uses Gemini 3 Pro Preview with High Thinking config.
+    Falls back down the OpenRouter levels if Gemini is rate limited or unavailable;
+    raises LLMCallError once every model in the chain has failed.
     """
-    # 1. Rate Limit Check
-    limit = MODEL_LIMITS.get(model_id, MODEL_LIMITS["default"])
-    GLOBAL_RATE_LIMITER.wait_for_slot(model_id, limit)
-    
-    print(f"⚡ INVOKING OPENROUTER: {model_id}")
-    
+    cache, cache_key, cached = cache_lookup(LEVEL_5_MODEL, prompt, GEMINI_CACHE_PARAMS, use_cache)
+    if cached is not None:
+        return cached
+
+    def attempt(model_id, timeout):
+        if model_id == LEVEL_5_MODEL:
+            return _gemini_attempt(prompt, timeout)
+        return _openrouter_attempt(prompt, model_id, _openrouter_api_key(), timeout)
+
+    used, text = GLOBAL_CALL_POLICY.run(_models_for(LEVEL_5_MODEL, fallback), attempt, deadline)
+    if cache and used == LEVEL_5_MODEL:
+        cache.set(cache_key, LEVEL_5_MODEL, text)
+    return text
+
+
+async def acall_gemini_deep_think(prompt: str, use_cache: bool = True, fallback: bool = True, deadline=None):
+    """
+    Async counterpart of call_gemini_deep_think built on the genai aio streaming API.
+    """
+    cache, cache_key, cached = cache_lookup(LEVEL_5_MODEL, prompt, GEMINI_CACHE_PARAMS, use_cache)
+    if cached is not None:
+        return cached
+
+    def attempt(model_id, timeout):
+        if model_id == LEVEL_5_MODEL:
+            return _agemini_attempt(prompt, timeout)
+        return _aopenrouter_attempt(prompt, model_id, _openrouter_api_key(), timeout)
+
+    used, text = await GLOBAL_CALL_POLICY.arun(_models_for(LEVEL_5_MODEL, fallback), attempt, deadline)
+    if cache and used == LEVEL_5_MODEL:
+        cache.set(cache_key, LEVEL_5_MODEL, text)
+    return text
+
+# --- TOKEN BUDGETING ---
+MIN_SECTION_TOKENS = 16  # Sections squeezed below this are dropped rather than kept as a stub
+
+
+def context_window(model_id: str) -> int:
+    return MODEL_CONTEXT_WINDOWS.get(model_id, MODEL_CONTEXT_WINDOWS["default"])
+
+
+def max_output_tokens(model_id: str) -> int:
+    return MODEL_MAX_OUTPUT_TOKENS.get(model_id, MODEL_MAX_OUTPUT_TOKENS["default"])
+
+
+def call_site_max_tokens(call_site: str) -> int:
+    return MAX_TOKENS_BY_CALL_SITE.get(call_site, MAX_TOKENS_BY_CALL_SITE["default"])
+
+
+def prompt_budget(model_id: str, max_tokens: int = None, reserved: str = "") -> int:
+    """
+    Tokens left for variable prompt content once the completion, the safety
+    margin and any fixed text (`reserved`, e.g. the prompt template) are accounted for.
+    """
+    output = min(max_tokens or call_site_max_tokens("default"), max_output_tokens(model_id))
+    return max(0, context_window(model_id) - output - PROMPT_SAFETY_MARGIN - count_tokens(reserved))
+
+
+def _fair_shares(sizes: list, budget: int) -> list:
+    """Water-fills `budget` across sections: small ones fit whole, the rest split what is left evenly."""
+    shares = [0] * len(sizes)
+    pending = sorted(range(len(sizes)), key=lambda i: sizes[i])
+    while pending:
+        share = budget // len(pending)
+        smallest = pending[0]
+        if sizes[smallest] > share:
+            for i in pending:
+                shares[i] = share
+            break
+        shares[smallest] = sizes[smallest]
+        budget -= sizes[smallest]
+        pending.pop(0)
+    return shares
+
+
+def pack_sections(sections: list, budget: int, separator: str = "\n\n") -> str:
+    """
+    Packs prompt sections into a token budget by priority and joins them in their original order.
+
+    sections: list of (priority, text); lower numbers are more important.
+    Whole priority tiers are admitted while they fit; the first tier that does
+    not fit shares the remaining budget fairly (each section truncated to its
+    share) and lower tiers are dropped.
+    """
+    separator_cost = count_tokens(separator)
+    sizes = [count_tokens(text) + separator_cost for _, text in sections]
+    kept = {}
+    remaining = budget
+    for priority in sorted({priority for priority, _ in sections}):
+        tier = [i for i, (p, _) in enumerate(sections) if p == priority]
+        tier_size = sum(sizes[i] for i in tier)
+        if tier_size <= remaining:
+            kept.update({i: sections[i][1] for i in tier})
+            remaining -= tier_size
+            continue
+        for i, share in zip(tier, _fair_shares([sizes[i] for i in tier], remaining)):
+            if share >= sizes[i]:
+                kept[i] = sections[i][1]
+            elif share - separator_cost >= MIN_SECTION_TOKENS:
+                kept[i] = truncate_to_tokens(sections[i][1], share - separator_cost)
+        break
+    return separator.join(kept[i] for i in sorted(kept))
+
+
+def resolve_max_tokens(prompt: str, model_id: str, max_tokens: int = None) -> int:
+    """
+    Clamps the requested completion size to the model's output cap and to the
+    room its context window leaves after the prompt. Raises FatalError when the
+    prompt alone does not fit, so the policy can move on to a larger-window model.
+    """
+    requested = min(max_tokens or call_site_max_tokens("default"), max_output_tokens(model_id))
+    room = context_window(model_id) - count_tokens(prompt) - PROMPT_SAFETY_MARGIN
+    if room <= 0:
+        raise FatalError(
+            f"Prompt of ~{count_tokens(prompt)} tokens does not fit {model_id}'s {context_window(model_id)}-token window.",
+            model_id,
+        )
+    return min(requested, room)
+
+# --- OPENROUTER CLIENT (Levels 1-4) ---
+def _openrouter_api_key() -> str:
     api_key = os.environ.get("OPENROUTER_API_KEY")
+    if not api_key and _replaying():
+        return "replay"  # Replayed exchanges never reach OpenRouter, so no real key is needed
     if not api_key:
-        return "Error: OPENROUTER_API_KEY not found in environment variables."
+        raise FatalError("OPENROUTER_API_KEY not found in environment variables.")
+    return api_key
+
+
+def _replaying() -> bool:
+    cassette = get_active_cassette()
+    return cassette is not None and cassette.mode == "replay"
+
+
+def _openrouter_params(max_tokens: int = None) -> dict:
+    """Generation params requested by the call site (also part of the cache key)."""
+    return {"max_tokens": max_tokens or call_site_max_tokens("default")}
+
+
+def _openrouter_request(prompt: str, model_id: str, api_key: str, max_tokens: int = None):
+    """Builds the (url, headers, payload) triple shared by the sync and async clients."""
+    url = f"{OPENROUTER_BASE_URL}/chat/completions"
+    headers = {
+        "Authorization": f"Bearer {api_key}",
+        "Content-Type": "application/json",
+        "HTTP-Referer": "https://localhost:3000",
+    }
+    payload = {
+        "model": model_id,
+        "max_tokens": resolve_max_tokens(prompt, model_id, max_tokens),
+        "messages": [{"role": "user", "content": prompt}]
+    }
+    return url, headers, payload
+
+
+def _request_timeout(remaining: float) -> httpx.Timeout:
+    """Per-request timeout that never outlives the call's deadline."""
+    return httpx.Timeout(min(remaining, HTTP_READ_TIMEOUT), connect=min(remaining, HTTP_CONNECT_TIMEOUT))
+
+
+def _transport_error(error: Exception, model_id: str) -> RetryableError:
+    kind = "Timeout" if isinstance(error, httpx.TimeoutException) else "Connection error"
+    return RetryableError(f"{kind} calling {model_id}: {error}", model_id)
+
+
+def _parse_openrouter_response(response, model_id: str, lease=None) -> str:
+    """Returns the completion text or raises the matching LLMCallError."""
+    _observe_limits(model_id, response.status_code, response.headers)
+    if response.status_code != 200:
+        raise error_for_status(response.status_code, response.text, model_id, response.headers)
+    data = response.json()
+    if "error" in data:
+        # OpenRouter occasionally reports upstream provider failures inside a 200 body
+        raise RetryableError(f"OpenRouter upstream error from {model_id}: {data['error']}", model_id)
+    _settle(lease, model_id, data.get("usage"))
+    return data['choices'][0]['message']['content']
+
+
+def _sse_event(line: str):
+    """
+    Parses one server-sent-events line from a streamed completion.
+    Returns (kind, value) where kind is "token", "usage", "error", "done" or None for lines without data.
+    """
+    # Blank separators and ": OPENROUTER PROCESSING" keep-alive comments carry no data
+    if not line or not line.startswith("data:"):
+        return None, None
+    data = line[len("data:"):].strip()
+    if data == "[DONE]":
+        return "done", None
+    try:
+        chunk = json.loads(data)
+    except json.JSONDecodeError:
+        return None, None
+    if "error" in chunk:
+        error = chunk["error"]
+        message = error.get("message", error) if isinstance(error, dict) else error
+        return "error", f"OpenRouter Stream Error: {message}"
+    choices = chunk.get("choices") or []
+    token = choices[0].get("delta", {}).get("content") if choices else None
+    if token:
+        return "token", token
+    # OpenRouter reports token usage on the final chunk of a stream
+    if chunk.get("usage"):
+        return "usage", chunk["usage"]
+    return None, None
+
+
+def _openrouter_attempt(prompt: str, model_id: str, api_key: str, timeout: float,
+                        lease=None, max_tokens: int = None) -> str:
+    """One OpenRouter completion; raises LLMCallError on failure."""
+    # 1. Rate Limit Check (hedges claim their slot up front and pass its lease in)
+    with lease or _acquire(model_id, prompt) as lease:
+        print(f"⚡ INVOKING OPENROUTER: {model_id}")
+
+        url, headers, payload = _openrouter_request(prompt, model_id, api_key, max_tokens)
+        started = time.monotonic()
+        with llm_call_timer(model_id):
+            try:
+                response = get_http_client().post(url, headers=headers, json=payload, timeout=_request_timeout(timeout))
+            except httpx.TransportError as e:
+                raise _transport_error(e, model_id) from e
+            text = _parse_openrouter_response(response, model_id, lease)
+    GLOBAL_LATENCY_TRACKER.record(model_id, time.monotonic() - started)
+    return text
+
+
+async def _aopenrouter_attempt(prompt: str, model_id: str, api_key: str, timeout: float,
+                               lease=None, max_tokens: int = None) -> str:
+    with lease or await _aacquire(model_id, prompt) as lease:
+        print(f"⚡ INVOKING OPENROUTER (ASYNC): {model_id}")
+
+        url, headers, payload = _openrouter_request(prompt, model_id, api_key, max_tokens)
+        started = time.monotonic()
+        with llm_call_timer(model_id):
+            try:
+                response = await get_async_http_client().post(
+                    url, headers=headers, json=payload, timeout=_request_timeout(timeout)
+                )
+            except httpx.TransportError as e:
+                raise _transport_error(e, model_id) from e
+            text = _parse_openrouter_response(response, model_id, lease)
+    GLOBAL_LATENCY_TRACKER.record(model_id, time.monotonic() - started)
+    return text
+
+
+def _reserve_slot(model_id: str, prompt: str):
+    """Claims a rate-limit slot for a hedge only if one is free right now; returns its lease or None."""
+    return GLOBAL_RATE_LIMITER.try_acquire(model_id, limits_for(model_id), count_tokens(prompt))
+
 
+def _hedged_openrouter_attempt(prompt: str, model_id: str, api_key: str, timeout: float,
+                               max_tokens: int = None):
+    """Runs one attempt with hedging; returns (model_that_answered, text)."""
+    started = time.monotonic()
+
+    def attempt(target, lease):
+        remaining = max(0.1, timeout - (time.monotonic() - started))
+        return _openrouter_attempt(prompt, target, api_key, remaining, lease or None, max_tokens)
+
+    return run_hedged(model_id, attempt, lambda target: _reserve_slot(target, prompt), hedge_delay(model_id))
+
+
+async def _ahedged_openrouter_attempt(prompt: str, model_id: str, api_key: str, timeout: float,
+                                      max_tokens: int = None):
+    started = time.monotonic()
+
+    def attempt(target, lease):
+        remaining = max(0.1, timeout - (time.monotonic() - started))
+        return _aopenrouter_attempt(prompt, target, api_key, remaining, lease or None, max_tokens)
+
+    return await arun_hedged(model_id, attempt, lambda target: _reserve_slot(target, prompt), hedge_delay(model_id))
+
+
+def _open_openrouter_stream(prompt: str, model_id: str, api_key: str, timeout: float, max_tokens: int = None):
+    """
+    Opens a streamed completion and checks its status.
+    Returns (response, started_at, lease); the caller must close the response and release the lease.
+    """
+    lease = _acquire(model_id, prompt)
     try:
-        response = requests.post(
-            url="https://openrouter.ai/api/v1/chat/completions",
-            headers={
-                "Authorization": f"Bearer {api_key}",
-                "Content-Type": "application/json",
-                "HTTP-Referer": "https://localhost:3000", 
-            },
-            data=json.dumps({
-                "model": model_id,
-                "max_tokens": 1000,
-                "messages": [{"role": "user", "content": prompt}]
-            })
-        )
-        
-        if response.status_code == 200:
-            return response.json()['choices'][0]['message']['content']
-        else:
-            return f"OpenRouter Error {response.status_code}: {response.text}"
-    except Exception as e:
-        return f"OpenRouter Connection Error: {str(e)}"
+        response, started = _send_openrouter_stream(prompt, model_id, api_key, timeout, max_tokens)
+    except BaseException:
+        lease.release()
+        raise
+    return response, started, lease
 
-from research_agent.rate_limiter import GLOBAL_RATE_LIMITER
 
-load_dotenv(override=True)
+def _send_openrouter_stream(prompt: str, model_id: str, api_key: str, timeout: float, max_tokens: int = None):
+    print(f"⚡ STREAMING OPENROUTER: {model_id}")
+
+    url, headers, payload = _openrouter_request(prompt, model_id, api_key, max_tokens)
+    payload["stream"] = True
+    client = get_http_client()
+    request = client.build_request("POST", url, headers=headers, json=payload, timeout=_request_timeout(timeout))
+    started = time.monotonic()
+    try:
+        response = client.send(request, stream=True)
+    except httpx.TransportError as e:
+        record_llm_call(model_id, time.monotonic() - started, "RetryableError")
+        raise _transport_error(e, model_id) from e
+    _observe_limits(model_id, response.status_code, response.headers)
+    if response.status_code != 200:
+        response.read()
+        response.close()
+        error = error_for_status(response.status_code, response.text, model_id, response.headers)
+        record_llm_call(model_id, time.monotonic() - started, type(error).__name__)
+        raise error
+    return response, started
+
+
+async def _aopen_openrouter_stream(prompt: str, model_id: str, api_key: str, timeout: float,
+                                   max_tokens: int = None):
+    lease = await _aacquire(model_id, prompt)
+    try:
+        response, started = await _asend_openrouter_stream(prompt, model_id, api_key, timeout, max_tokens)
+    except BaseException:
+        lease.release()
+        raise
+    return response, started, lease
+
+
+async def _asend_openrouter_stream(prompt: str, model_id: str, api_key: str, timeout: float,
+                                   max_tokens: int = None):
+    print(f"⚡ STREAMING OPENROUTER (ASYNC): {model_id}")
+
+    url, headers, payload = _openrouter_request(prompt, model_id, api_key, max_tokens)
+    payload["stream"] = True
+    client = get_async_http_client()
+    request = client.build_request("POST", url, headers=headers, json=payload, timeout=_request_timeout(timeout))
+    started = time.monotonic()
+    try:
+        response = await client.send(request, stream=True)
+    except httpx.TransportError as e:
+        record_llm_call(model_id, time.monotonic() - started, "RetryableError")
+        raise _transport_error(e, model_id) from e
+    _observe_limits(model_id, response.status_code, response.headers)
+    if response.status_code != 200:
+        await response.aread()
+        await response.aclose()
+        error = error_for_status(response.status_code, response.text, model_id, response.headers)
+        record_llm_call(model_id, time.monotonic() - started, type(error).__name__)
+        raise error
+    return response, started
+
+
+def stream_openrouter(prompt: str, model_id: str, use_cache: bool = True, fallback: bool = True, deadline=None,
+                      max_tokens: int = None):
+    """
+    Streams an OpenRouter completion, yielding content tokens as they arrive.
+    Retries and fallbacks apply until the stream opens; a failure after the
+    first token raises LLMCallError. A cache hit is yielded as one token.
+    """
+    cache, cache_key, cached = cache_lookup(model_id, prompt, _openrouter_params(max_tokens), use_cache)
+    if cached is not None:
+        yield cached
+        return
+
+    api_key = _openrouter_api_key()
+    used, opened = GLOBAL_CALL_POLICY.run(
+        _models_for(model_id, fallback),
+        lambda m, timeout: _open_openrouter_stream(prompt, m, api_key, timeout, max_tokens),
+        deadline,
+    )
+    response, started, lease = opened
+    tokens = []
+    outcome = "incomplete"  # Stays so if the consumer stops reading early
+    try:
+        for line in response.iter_lines():
+            kind, value = _sse_event(line)
+            if kind == "token":
+                if not tokens:
+                    record_ttft(used, time.monotonic() - started)
+                tokens.append(value)
+                yield value
+            elif kind == "usage":
+                _settle(lease, used, value)
+            elif kind == "error":
+                outcome = "RetryableError"
+                raise RetryableError(value, used)
+            elif kind == "done":
+                outcome = "ok"
+                # Only a cleanly finished stream from the requested model is worth caching
+                if cache and used == model_id:
+                    cache.set(cache_key, model_id, "".join(tokens))
+                return
+    except httpx.TransportError as e:
+        outcome = "RetryableError"
+        raise _transport_error(e, used) from e
+    finally:
+        record_llm_call(used, time.monotonic() - started, outcome)
+        response.close()
+        lease.release()
+
+
+async def astream_openrouter(prompt: str, model_id: str, use_cache: bool = True, fallback: bool = True,
+                             deadline=None, max_tokens: int = None):
+    """
+    Async counterpart of stream_openrouter.
+    """
+    cache, cache_key, cached = cache_lookup(model_id, prompt, _openrouter_params(max_tokens), use_cache)
+    if cached is not None:
+        yield cached
+        return
+
+    api_key = _openrouter_api_key()
+    used, opened = await GLOBAL_CALL_POLICY.arun(
+        _models_for(model_id, fallback),
+        lambda m, timeout: _aopen_openrouter_stream(prompt, m, api_key, timeout, max_tokens),
+        deadline,
+    )
+    response, started, lease = opened
+    tokens = []
+    outcome = "incomplete"  # Stays so if the consumer stops reading early
+    try:
+        async for line in response.aiter_lines():
+            kind, value = _sse_event(line)
+            if kind == "token":
+                if not tokens:
+                    record_ttft(used, time.monotonic() - started)
+                tokens.append(value)
+                yield value
+            elif kind == "usage":
+                _settle(lease, used, value)
+            elif kind == "error":
+                outcome = "RetryableError"
+                raise RetryableError(value, used)
+            elif kind == "done":
+                outcome = "ok"
+                if cache and used == model_id:
+                    cache.set(cache_key, model_id, "".join(tokens))
+                return
+    except httpx.TransportError as e:
+        outcome = "RetryableError"
+        raise _transport_error(e, used) from e
+    finally:
+        record_llm_call(used, time.monotonic() - started, outcome)
+        await response.aclose()
+        lease.release()
+
+
+@coalesce("call_openrouter")
+def call_openrouter(prompt: str, model_id: str, on_token=None, use_cache: bool = True,
+                    fallback: bool = True, deadline=None, hedge=None, max_tokens: int = None):
+    """
+    Generic wrapper for OpenRouter models.
+    Pass on_token to stream: it is called with each token and the full text is still returned.
+    Pass use_cache=False to bypass the response cache for this call.
+    Retries, fails over along the model's fallback chain (unless fallback=False)
+    and raises LLMCallError once every model has failed.
+    hedge=True/False overrides the process-wide hedging setting (streamed calls are never hedged).
+    max_tokens is the call site's completion budget (see MAX_TOKENS_BY_CALL_SITE); it is
+    clamped per model to the output cap and to what the context window leaves.
+    """
+    if on_token is not None:
+        tokens = []
+        for token in stream_openrouter(prompt, model_id, use_cache=use_cache, fallback=fallback,
+                                       deadline=deadline, max_tokens=max_tokens):
+            on_token(token)
+            tokens.append(token)
+        return "".join(tokens)
+
+    cache, cache_key, cached = cache_lookup(model_id, prompt, _openrouter_params(max_tokens), use_cache)
+    if cached is not None:
+        return cached
+
+    api_key = _openrouter_api_key()
+    hedged = hedging_enabled(hedge)
+
+    def attempt(m, timeout):
+        if hedged:
+            return _hedged_openrouter_attempt(prompt, m, api_key, timeout, max_tokens)
+        return m, _openrouter_attempt(prompt, m, api_key, timeout, max_tokens=max_tokens)
+
+    _, (answered_by, text) = GLOBAL_CALL_POLICY.run(_models_for(model_id, fallback), attempt, deadline)
+    if cache and answered_by == model_id:
+        cache.set(cache_key, model_id, text)
+    return text
+
+
+@coalesce("call_openrouter")
+async def acall_openrouter(prompt: str, model_id: str, on_token=None, use_cache: bool = True,
+                           fallback: bool = True, deadline=None, hedge=None, max_tokens: int = None):
+    """
+    Async counterpart of call_openrouter; awaits the rate limiter instead of sleeping the thread.
+    """
+    if on_token is not None:
+        tokens = []
+        async for token in astream_openrouter(prompt, model_id, use_cache=use_cache, fallback=fallback,
+                                              deadline=deadline, max_tokens=max_tokens):
+            on_token(token)
+            tokens.append(token)
+        return "".join(tokens)
+
+    cache, cache_key, cached = cache_lookup(model_id, prompt, _openrouter_params(max_tokens), use_cache)
+    if cached is not None:
+        return cached
+
+    api_key = _openrouter_api_key()
+    hedged = hedging_enabled(hedge)
+
+    async def attempt(m, timeout):
+        if hedged:
+            return await _ahedged_openrouter_attempt(prompt, m, api_key, timeout, max_tokens)
+        return m, await _aopenrouter_attempt(prompt, m, api_key, timeout, max_tokens=max_tokens)
+
+    _, (answered_by, text) = await GLOBAL_CALL_POLICY.arun(_models_for(model_id, fallback), attempt, deadline)
+    if cache and answered_by == model_id:
+        cache.set(cache_key, model_id, text)
+    return text
 
 # --- GEMINI CLI WRAPPER ---
-def ask_gemini_cli(prompt: str) -> str:
+def _gemini_cli_fallback_script():
+    """Path to the local gemini_cli.py in the project root, or None if missing."""
+    base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    script_path = os.path.join(base_dir, "gemini_cli.py")
+    return script_path if os.path.exists(script_path) else None
+
+
+def _is_cli_error(text: str) -> bool:
+    # Both the CLI wrappers and gemini_cli.py report failures as text on stdout
+    return text.startswith(("Error", "Gemini CLI"))
+
+
+def ask_gemini_cli(prompt: str, use_cache: bool = True) -> str:
     """
     Sends a prompt to the Gemini CLI.
     Tries 'gemini' command first, falls back to local 'gemini_cli.py'.
     """
+    cache, cache_key, cached = cache_lookup("gemini-cli", prompt, {}, use_cache)
+    if cached is not None:
+        return cached
+
+    answer = _invoke_gemini_cli(prompt)
+    if cache and not _is_cli_error(answer):
+        cache.set(cache_key, "gemini-cli", answer)
+    return answer
+
+
+def _invoke_gemini_cli(prompt: str) -> str:
     GLOBAL_RATE_LIMITER.wait_for_slot("gemini", 15)
-    
+
     print("🤖 INVOKING GEMINI CLI...")
-    
+
     # 1. Try Global Command
     try:
         result = subprocess.run(
             ["gemini", "-p", prompt],
             capture_output=True,
             text=True,
-            check=True
+            check=True,
+            timeout=GEMINI_CLI_TIMEOUT
         )
         return result.stdout.strip()
     except (FileNotFoundError, subprocess.CalledProcessError):
         # 2. Fallback: Try local script in project root
         try:
-            # Find the script relative to this file
-            base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-            script_path = os.path.join(base_dir, "gemini_cli.py")
-            
-            if os.path.exists(script_path):
+            script_path = _gemini_cli_fallback_script()
+
+            if script_path:
                 # Run with current python executable
                 result = subprocess.run(
                     [sys.executable, script_path, "-p", prompt],
                     capture_output=True,
                     text=True,
-                    check=True
+                    check=True,
+                    timeout=GEMINI_CLI_TIMEOUT
                 )
                 return result.stdout.strip()
             else:
                 return "Error: Could not find gemini command or gemini_cli.py"
-                
+
         except Exception as e:
             return f"Gemini CLI Fallback Error: {str(e)}"
     except Exception as e:
         return f"Gemini CLI Error: {str(e)}"
 
-# Alias for backward compatibility with orchestrator
-call_gemini = ask_gemini_cli
 
-# --- OTHER CLIENTS (Preserved for compatibility) ---
-# (OpenRouter and other client functions remain unchanged)
-def call_openrouter(prompt: str, model_id: str):
-    # ... existing implementation ...
-    from research_agent.config import MODEL_LIMITS
-    limit = MODEL_LIMITS.get(model_id, 10)
-    GLOBAL_RATE_LIMITER.wait_for_slot(model_id, limit)
-    
-    api_key = os.environ.get("OPENROUTER_API_KEY")
-    if not api_key: return "Error: No API key."
-    
+async def _run_cli(*command) -> str:
+    """Runs a command without blocking the event loop; raises CalledProcessError on failure."""
+    process = await asyncio.create_subprocess_exec(
+        *command,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+    )
     try:
-        response = requests.post(
-            "https://openrouter.ai/api/v1/chat/completions",
-            headers={"Authorization": f"Bearer {api_key}"},
-            json={
-                "model": model_id,
-                "messages": [{"role": "user", "content": prompt}]
-            }
-        )
-        if response.status_code == 200:
-            return response.json()['choices'][0]['message']['content']
-        return f"Error {response.status_code}: {response.text}"
+        stdout, stderr = await asyncio.wait_for(process.communicate(), GEMINI_CLI_TIMEOUT)
+    except asyncio.TimeoutError:
+        process.kill()
+        await process.wait()
+        raise subprocess.TimeoutExpired(command, GEMINI_CLI_TIMEOUT)
+    if process.returncode != 0:
+        raise subprocess.CalledProcessError(process.returncode, command, stdout, stderr)
+    return stdout.decode().strip()
+
+
+async def aask_gemini_cli(prompt: str, use_cache: bool = True) -> str:
+    """
+    Async counterpart of ask_gemini_cli using asyncio subprocesses.
+    """
+    cache, cache_key, cached = cache_lookup("gemini-cli", prompt, {}, use_cache)
+    if cached is not None:
+        return cached
+
+    answer = await _ainvoke_gemini_cli(prompt)
+    if cache and not _is_cli_error(answer):
+        cache.set(cache_key, "gemini-cli", answer)
+    return answer
+
+
+async def _ainvoke_gemini_cli(prompt: str) -> str:
+    await GLOBAL_RATE_LIMITER.async_wait_for_slot("gemini", 15)
+
+    print("🤖 INVOKING GEMINI CLI (ASYNC)...")
+
+    try:
+        return await _run_cli("gemini", "-p", prompt)
+    except (FileNotFoundError, subprocess.CalledProcessError):
+        try:
+            script_path = _gemini_cli_fallback_script()
+            if script_path:
+                return await _run_cli(sys.executable, script_path, "-p", prompt)
+            return "Error: Could not find gemini command or gemini_cli.py"
+        except Exception as e:
+            return f"Gemini CLI Fallback Error: {str(e)}"
     except Exception as e:
-        return f"Connection Error: {e}"
\ No newline at end of file
+        return f"Gemini CLI Error: {str(e)}"
+
+# Alias for backward compatibility with orchestrator
+call_gemini = ask_gemini_cli
+acall_gemini = aask_gemini_cli
@@ -1,4 +1,5 @@
 # src/config.py
+import os
 
 # LEVEL 1: Trivial (Formatting, Spelling, Simple Extraction)
 # Provider: OpenRouter (Free/Cheap)
@@ -32,3 +33,292 @@ MODEL_LIMITS = {
     # Generic fallback
     "default": 10
 }
+
+# --- TOKEN & CONCURRENCY LIMITS ---
+# Tokens Per Minute (prompt + completion) and concurrent requests (incl. open streams) per model.
+# Requests are charged their estimated prompt tokens up front and corrected from `usage` afterwards.
+# 0 disables a limit.
+MODEL_TPM_LIMITS = {
+    LEVEL_1_MODEL: 100000,
+    LEVEL_2_MODEL: 200000,
+    LEVEL_3_MODEL: 200000,
+    LEVEL_4_MODEL: 80000,   # Anthropic tiers throttle on input tokens long before requests
+    LEVEL_5_MODEL: 250000,  # Gemini preview free tier
+
+    "default": 150000
+}
+
+MODEL_MAX_IN_FLIGHT = {
+    LEVEL_4_MODEL: 4,
+    LEVEL_5_MODEL: 2,
+
+    "default": 8
+}
+
+# Where admitted requests are tracked. "sqlite" shares one quota between every worker process
+# on the host (Streamlit, Gradio, CLI) and survives restarts; "memory" is per process.
+RATE_LIMIT_BACKEND = os.environ.get("DEEP_RESEARCH_RATE_LIMIT_BACKEND", "sqlite")
+RATE_LIMIT_DB_PATH = os.environ.get(
+    "DEEP_RESEARCH_RATE_LIMIT_PATH",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".cache", "rate_limits.sqlite"),
+)
+RATE_LIMIT_POLL_INTERVAL = 0.25  # Seconds between re-checks while another process holds the slot
+RATE_LIMIT_LEASE_TTL = 900       # Seconds after which an unreleased in-flight slot is reclaimed
+
+# Adaptive limits (AIMD): each model's RPM is learned online, starting from MODEL_LIMITS.
+# Every success while the model is under pressure (within a minute of a request that had to wait,
+# or was admitted with the window at least AIMD_NEAR_LIMIT full) adds AIMD_INCREASE / rpm, so
+# +AIMD_INCREASE RPM per minute's worth of successes; a 429 / RESOURCE_EXHAUSTED multiplies it by
+# AIMD_DECREASE. x-ratelimit-* headers seed the RPM / TPM and cap growth; without them growth stops
+# at AIMD_MAX_FACTOR x the configured RPM. Changing a model's MODEL_LIMITS entry discards what was learned.
+AIMD_ENABLED = os.environ.get("DEEP_RESEARCH_ADAPTIVE_LIMITS", "1") not in ("", "0")
+AIMD_INCREASE = 1.0
+AIMD_DECREASE = 0.5
+AIMD_MIN_RPM = 1
+AIMD_MAX_FACTOR = 4
+AIMD_NEAR_LIMIT = 0.8         # Share of the RPM in use at admission that counts as pressing the limit
+AIMD_DECREASE_COOLDOWN = 5.0  # Seconds; a burst of 429s from requests already in flight counts once
+AIMD_PERSIST_INTERVAL = 10.0  # Seconds between writes of a model's learned limits while it keeps growing
+AIMD_STATE_PATH = os.environ.get("DEEP_RESEARCH_ADAPTIVE_LIMITS_PATH", RATE_LIMIT_DB_PATH)
+
+# --- SCHEDULING ---
+# When a model's limits are reached, queued LLM calls are admitted by priority class first
+# (strictly, highest first) and then fairly across sessions (users), weighted per session.
+PRIORITY_CLASSES = ["interactive", "executor", "background"]  # Highest first
+NODE_PRIORITIES = {
+    "planner": "interactive",
+    "reporter": "interactive",
+    "router": "interactive",
+    "executor": "executor",
+    "background_research": "background",
+}
+DEFAULT_PRIORITY = "executor"
+DEFAULT_SESSION = "default"
+
+# --- HTTP TRANSPORT ---
+# A single pooled client is shared by every OpenRouter call in the process.
+# Override with OPENROUTER_BASE_URL to point at the local stand-in (research_agent/stub_server.py).
+OPENROUTER_BASE_URL = os.environ.get("OPENROUTER_BASE_URL", "https://openrouter.ai/api/v1")
+
+HTTP_MAX_CONNECTIONS = 20           # Upper bound on open sockets across all hosts
+HTTP_MAX_KEEPALIVE_CONNECTIONS = 10 # Idle sockets kept warm for reuse
+HTTP_KEEPALIVE_EXPIRY = 120         # Seconds an idle socket stays in the pool
+HTTP_CONNECT_TIMEOUT = 10           # Seconds
+HTTP_READ_TIMEOUT = 300             # Seconds (long completions from 405B models)
+HTTP_ENABLE_HTTP2 = True            # Only honoured when the optional `h2` package is installed
+
+# Hosts to open connections to at startup so the first LLM call skips the handshake.
+PREWARM_URLS = [OPENROUTER_BASE_URL]
+
+# --- RESPONSE CACHE ---
+# Identical (model, prompt, params) calls are served from a local SQLite store.
+# Set DEEP_RESEARCH_NO_CACHE=1 to bypass it for a whole process.
+CACHE_ENABLED = True
+CACHE_PATH = os.environ.get(
+    "DEEP_RESEARCH_CACHE_PATH",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".cache", "llm_responses.sqlite"),
+)
+CACHE_MAX_BYTES = 256 * 1024 * 1024  # LRU eviction kicks in above this size
+
+# Seconds a cached response stays valid. A TTL of 0 disables caching for that model.
+CACHE_TTLS = {
+    LEVEL_5_MODEL: 6 * 3600,   # Grounded in live Google Search, so results go stale faster
+    "gemini-cli": 6 * 3600,
+    "default": 24 * 3600,
+}
+
+# --- RESILIENCE ---
+LLM_CALL_DEADLINE = 240        # Seconds one logical LLM call may take, retries and fallbacks included
+LLM_MAX_ATTEMPTS = 3           # Attempts per model before moving down the fallback chain
+LLM_BACKOFF_BASE = 1.0         # Seconds; exponential backoff with jitter when no Retry-After is given
+LLM_BACKOFF_MAX = 30.0         # Seconds; cap on any single backoff sleep
+FAILOVER_AFTER_SECONDS = 2.0   # Fail over instead of sleeping when the model asks us to wait longer
+CIRCUIT_FAILURE_THRESHOLD = 3  # Consecutive failures that open a model's circuit
+CIRCUIT_RESET_SECONDS = 60     # Seconds an open circuit waits before letting a probe through
+GEMINI_CLI_TIMEOUT = 180       # Seconds before a Gemini CLI subprocess is killed
+
+# Ordered fallbacks per model, drawn from neighbouring complexity levels.
+# Gemini (Level 5) falls back onto OpenRouter; OpenRouter models never fall back onto Gemini.
+FALLBACK_CHAINS = {
+    LEVEL_1_MODEL: [LEVEL_2_MODEL],
+    LEVEL_2_MODEL: [LEVEL_3_MODEL, LEVEL_1_MODEL],
+    LEVEL_3_MODEL: [LEVEL_4_MODEL, LEVEL_2_MODEL],
+    LEVEL_4_MODEL: [LEVEL_3_MODEL],
+    LEVEL_5_MODEL: [LEVEL_4_MODEL, LEVEL_3_MODEL],
+}
+# Models without an explicit chain (e.g. the 405B planner, ensemble workers) fall back to these
+DEFAULT_FALLBACKS = [LEVEL_4_MODEL, LEVEL_3_MODEL]
+
+# --- HEDGED REQUESTS ---
+# Opt-in: set DEEP_RESEARCH_HEDGE=1, or pass hedge=True to call_openrouter / acall_openrouter.
+# A call still unanswered after HEDGE_PERCENTILE of the model's observed latency is duplicated;
+# the first good answer wins and the rest are cancelled. Hedges only go out when the rate
+# limiter has a free slot right now, so they never queue behind (or crowd out) regular calls.
+HEDGE_ENABLED = False          # Process-wide default; DEEP_RESEARCH_HEDGE=1 turns it on too
+HEDGE_PERCENTILE = 95          # Percentile of recent latencies after which a hedge is sent
+HEDGE_MIN_SAMPLES = 5          # Observed calls needed before the percentile is trusted
+HEDGE_DEFAULT_DELAY = 30.0     # Seconds to wait before hedging a model with too few samples
+HEDGE_MIN_DELAY = 2.0          # Never hedge sooner than this, however fast the model usually is
+HEDGE_MAX_EXTRA = 1            # Duplicates allowed per call on top of the original request
+HEDGE_LATENCY_WINDOW = 100     # Recent latencies kept per model
+HEDGE_MAX_WORKERS = 16         # Threads backing synchronous hedged calls
+
+# Models interchangeable enough to take a hedge. Without an entry the duplicate goes to the
+# same model, which OpenRouter usually routes to a different upstream provider.
+HEDGE_EQUIVALENTS = {}
+
+# --- SINGLE-FLIGHT ---
+# Concurrent byte-identical LLM prompts and tool calls share one upstream request.
+SINGLE_FLIGHT_ENABLED = True
+
+# --- TOOL REGISTRY ---
+# Every registered tool call is bounded by a timeout and a per-tool cap on concurrent calls,
+# and timed per cost class: "free" (local or free APIs), "api" (metered third-party APIs)
+# or "llm" (spends LLM tokens). A call still running at its timeout is abandoned, but keeps
+# its concurrency slot until it really returns, so hung calls cannot pile up.
+TOOL_LIMITS = {
+    "tavily_search":              {"timeout": 60,  "max_concurrency": 4,  "cost_class": "api"},
+    "get_company_fundamentals":   {"timeout": 45,  "max_concurrency": 4,  "cost_class": "free"},
+    "get_historical_performance": {"timeout": 90,  "max_concurrency": 2,  "cost_class": "free"},
+    "ask_gemini_cli_tool":        {"timeout": GEMINI_CLI_TIMEOUT + 15, "max_concurrency": 2, "cost_class": "llm"},
+    "ensemble_query":             {"timeout": 600, "max_concurrency": 4,  "cost_class": "llm"},
+    "load_skill":                 {"timeout": 5,   "max_concurrency": 16, "cost_class": "free"},
+    "think_tool":                 {"timeout": 5,   "max_concurrency": 16, "cost_class": "free"},
+    "default":                    {"timeout": 120, "max_concurrency": 4,  "cost_class": "free"},
+}
+
+# --- ENSEMBLE ---
+# Ensemble workers run concurrently, each under its own deadline. Once ENSEMBLE_QUORUM of them
+# have answered, the stragglers get ENSEMBLE_STRAGGLER_GRACE more seconds and are then dropped;
+# the meta-judge is told which models timed out or failed.
+ENSEMBLE_MODEL_DEADLINE = 120.0   # Seconds each worker may take, retries included
+ENSEMBLE_QUORUM = 2               # Answers after which stragglers only get the grace period
+ENSEMBLE_STRAGGLER_GRACE = 15.0   # Seconds; 0 proceeds as soon as the quorum is in
+
+# When enough of the workers' answers agree, the consensus answer is returned without the meta-judge call.
+# Agreement = mean of unigram and bigram overlap F1 (ROUGE-1/-2 style) at or above the threshold,
+# and no conflicting figures: numbers quoted by both answers must match within the tolerance.
+# "sequential" asks the workers one at a time and stops as soon as two of them agree.
+ENSEMBLE_MODE = os.environ.get("DEEP_RESEARCH_ENSEMBLE_MODE", "parallel")   # parallel | sequential
+ENSEMBLE_EARLY_EXIT = True                # False always defers to the meta-judge
+ENSEMBLE_AGREEMENT_THRESHOLD = 0.6        # Text similarity (0-1) for two answers to agree
+ENSEMBLE_CONSENSUS_QUORUM = 2             # Agreeing answers (not all answers) needed to skip the meta-judge
+ENSEMBLE_NUMERIC_TOLERANCE = 0.01         # Relative difference under which two figures are the same
+ENSEMBLE_NUMERIC_MIN_MATCH = 0.8          # Share of the figures in the less numeric answer found in the other
+
+# The meta-judge sees the answers as numbered plain text (not JSON) with greetings and sign-offs
+# stripped and any sentence quoted by several answers sent once as a shared passage [S1], [S2]...
+JUDGE_CANDIDATE_TOKENS = 1500             # Cap per candidate answer in the judge prompt
+JUDGE_SHARED_MIN_CHARS = 40               # Shorter repeated sentences stay inline (a reference would not save much)
+
+# Dynamic membership: each query asks the ENSEMBLE_SIZE best of ENSEMBLE_CANDIDATES (new_config)
+# for its query class, ranked on a persistent scoreboard of how often the judge picked or used each
+# member's answer and how often the member failed. Members whose p90 latency is over budget are
+# skipped, the chosen members' relative costs must fit ENSEMBLE_COST_BUDGET, and with probability
+# ENSEMBLE_EXPLORE_RATE one slot goes to another candidate so every score stays current.
+ENSEMBLE_DYNAMIC = os.environ.get("DEEP_RESEARCH_ENSEMBLE_DYNAMIC", "1") not in ("", "0")
+ENSEMBLE_SIZE = 3
+ENSEMBLE_LATENCY_BUDGET = 60.0            # Seconds of p90 latency above which a member is skipped
+ENSEMBLE_COST_BUDGET = 3.0                # Sum of the chosen members' relative costs
+ENSEMBLE_MODEL_COSTS = {"default": 1.0}   # Relative cost per call; unlisted models use "default"
+ENSEMBLE_EXPLORE_RATE = 0.1
+ENSEMBLE_MIN_SAMPLES = 5                  # Calls before a member's latency is held against it
+ENSEMBLE_USED_SIMILARITY = 0.3            # Similarity to the final answer for a member's answer to count as used
+ENSEMBLE_SCOREBOARD_PATH = os.environ.get(
+    "DEEP_RESEARCH_ENSEMBLE_SCOREBOARD",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".cache", "ensemble_scoreboard.sqlite"),
+)
+
+# --- PLAN EXECUTION ---
+# The planner emits steps with depends_on; steps whose dependencies are done run concurrently,
+# at most PLAN_MAX_PARALLEL_STEPS at a time, so a plan takes about as long as its critical path.
+PLAN_MAX_PARALLEL_STEPS = int(os.environ.get("DEEP_RESEARCH_PLAN_WIDTH", "4"))
+
+# --- BACKGROUND RESEARCH ---
+# Query analysis and each company's news search run as parallel branches; a branch that has not
+# finished after BACKGROUND_BRANCH_TIMEOUT seconds is left out, so the stage takes as long as its
+# slowest branch (at most the timeout) however many companies the query names.
+BACKGROUND_BRANCH_TIMEOUT = float(os.environ.get("DEEP_RESEARCH_BACKGROUND_TIMEOUT", "120"))
+
+# --- CHECKPOINTS ---
+# Every run is checkpointed after each graph node (and each finished plan step) under its run ID,
+# so a run that dies part-way can be resumed without redoing completed work.
+# Set DEEP_RESEARCH_NO_CHECKPOINTS=1 to run without a checkpointer.
+CHECKPOINTS_ENABLED = os.environ.get("DEEP_RESEARCH_NO_CHECKPOINTS", "0") in ("", "0")
+CHECKPOINT_PATH = os.environ.get(
+    "DEEP_RESEARCH_CHECKPOINT_PATH",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".cache", "checkpoints.sqlite"),
+)
+CHECKPOINT_COMPRESSION_LEVEL = 6    # zlib level for stored state blobs
+
+# --- TOKEN BUDGETS ---
+# Context windows and output caps (tokens) as served through OpenRouter / Google.
+# Models not listed here (or in new_config) use the "default" entry.
+MODEL_CONTEXT_WINDOWS = {
+    LEVEL_1_MODEL: 131072,
+    LEVEL_2_MODEL: 131072,
+    LEVEL_3_MODEL: 131072,
+    LEVEL_4_MODEL: 200000,
+    LEVEL_5_MODEL: 1048576,
+    "meta-llama/llama-3.1-405b-instruct": 32768,  # Planner / judge; many providers serve a 32k window
+    "qwen/qwen-2.5-72b-instruct": 32768,
+    "mistralai/mixtral-8x22b-instruct": 65536,
+    "gemini-cli": 1048576,
+    "default": 32768,
+}
+MODEL_MAX_OUTPUT_TOKENS = {
+    LEVEL_4_MODEL: 8192,
+    LEVEL_5_MODEL: 65536,
+    "default": 4096,
+}
+PROMPT_SAFETY_MARGIN = 256     # Tokens left free for tokenizer drift between our estimate and the provider
+
+# max_tokens requested by each call site (replaces the old blanket 1000)
+MAX_TOKENS_BY_CALL_SITE = {
+    "router": 8,               # A single digit
+    "executor": 600,           # TOOL: <name> ARGS: <json>, or a short synthesis
+    "ensemble": 1200,          # Each ensemble member's answer
+    "judge": 1500,             # The meta-judge's final answer
+    "reporter": 4096,          # The full markdown report
+    "default": 1000,
+}
+
+# Token caps for prompt sections that used to be cut with character slices
+SECTION_TOKEN_CAPS = {
+    "background_core": 400,    # Core-entity search result in background research
+    "background_news": 250,    # Per-company news in background research
+    "step_result": 400,        # One previous step's output in the executor context
+}
+PLANNER_BACKGROUND_TOKENS = 6000   # Background research handed to the planner
+EXECUTOR_CONTEXT_TOKENS = 3000     # Previous-step context handed to the executor
+
+# --- EXECUTOR CONTEXT ---
+# Each finished step's result is reduced once to its key facts; a step's context is then the
+# facts ranked by BM25 against the step's text, packed into EXECUTOR_CONTEXT_TOKENS with at
+# most SECTION_TOKEN_CAPS["step_result"] tokens from any one earlier step.
+CONTEXT_FACTS_PER_STEP = 12     # Key facts kept per step result
+CONTEXT_FACT_TOKENS = 80        # Cap on a single fact
+BM25_K1 = 1.5                   # Term-frequency saturation
+BM25_B = 0.75                   # Length normalisation
+
+# --- RECORD / REPLAY ---
+# DEEP_RESEARCH_CASSETTE_MODE=record captures every upstream exchange into the cassette;
+# =replay serves them back without network or keys. Pair replay with DEEP_RESEARCH_NO_CACHE=1
+# when benchmarking so the response cache doesn't short-circuit the calls being measured.
+CASSETTE_MODE = os.environ.get("DEEP_RESEARCH_CASSETTE_MODE", "off")   # off | record | replay
+CASSETTE_PATH = os.environ.get(
+    "DEEP_RESEARCH_CASSETTE",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".cache", "cassette.jsonl"),
+)
+# Injected replay latency: seconds per call, or "recorded" to reuse each call's recorded duration
+REPLAY_LATENCY = os.environ.get("DEEP_RESEARCH_REPLAY_LATENCY", "0")
+REPLAY_LATENCY_SCALE = float(os.environ.get("DEEP_RESEARCH_REPLAY_SCALE", "1.0"))
+
+STUB_SERVER_HOST = "127.0.0.1"
+STUB_SERVER_PORT = 8765
+
+# --- METRICS ---
+# Set DEEP_RESEARCH_METRICS_PORT to serve /metrics (Prometheus) and /metrics.json from the apps.
+METRICS_HOST = "0.0.0.0"
+METRICS_PORT = int(os.environ["DEEP_RESEARCH_METRICS_PORT"]) if os.environ.get("DEEP_RESEARCH_METRICS_PORT") else None
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)  # Seconds
@@ -0,0 +1,155 @@
+"""Executor Context Index.
+
+Incrementally maintained index over finished plan steps. Each step result is
+reduced once, when it is added, to its key facts: the sentences that carry
+figures or financial terms, without boilerplate. A step's context is then built
+from the facts most relevant to that step (BM25 over the step's text), packed
+into a token budget, instead of the first few hundred tokens of every earlier result.
+"""
+
+import math
+import re
+import threading
+from collections import Counter
+
+from research_agent.config import (
+    BM25_B,
+    BM25_K1,
+    CONTEXT_FACT_TOKENS,
+    CONTEXT_FACTS_PER_STEP,
+    SECTION_TOKEN_CAPS,
+)
+from research_agent.text_utils import (
+    FINANCIAL_TERMS,
+    count_tokens,
+    split_sentences,
+    strip_boilerplate,
+    truncate_to_tokens,
+    words,
+)
+
+_FIGURE = re.compile(r"\d")
+_NOISE = re.compile(r"https?://|^\W*$|^(tool output|source|url|title)\s*:", re.IGNORECASE)
+_STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "in", "is", "it", "its", "of", "on",
+    "or", "that", "the", "this", "to", "vs", "was", "were", "with",
+}
+
+
+def terms(text: str) -> list:
+    """Lower-cased word terms without stopwords; "TCS.NS" gives "tcs" and "ns"."""
+    return [t for t in words(text) if t not in _STOPWORDS]
+
+
+def _weight(sentence: str) -> int:
+    """How fact-like a sentence is: figures (up to five) count double, then financial terms."""
+    return 2 * len(_FIGURE.findall(sentence)[:5]) + len(FINANCIAL_TERMS.findall(sentence))
+
+
+def extract_facts(result: str, limit: int = CONTEXT_FACTS_PER_STEP) -> list:
+    """
+    Up to `limit` key facts of a step result, in their original order: the sentences with
+    the most figures and financial terms, each capped at CONTEXT_FACT_TOKENS. A result with
+    no such sentence keeps its opening sentences.
+    """
+    sentences = [s for s in split_sentences(strip_boilerplate(result)) if not _NOISE.search(s)]
+    weighted = [(_weight(s), i, s) for i, s in enumerate(sentences) if len(s) >= 25]
+    weighted = [w for w in weighted if w[0]]
+    kept = sorted(sorted(weighted, key=lambda w: (-w[0], w[1]))[:limit], key=lambda w: w[1])
+    if not kept:
+        kept = [(0, i, s) for i, s in enumerate(sentences[:limit])]
+    return [truncate_to_tokens(s, CONTEXT_FACT_TOKENS) for _, _, s in kept]
+
+
+class ContextIndex:
+    """
+    Key facts of finished steps with their term statistics. add() does the per-result work
+    once; context() only scores facts against the current step. Safe to share across threads.
+    """
+
+    def __init__(self, k1: float = BM25_K1, b: float = BM25_B):
+        self.k1 = k1
+        self.b = b
+        self._facts = []          # {"step", "text", "terms": Counter, "length", "tokens", "weight"}
+        self._by_step = {}        # step -> fact indexes, in step order
+        self._df = Counter()      # term -> number of facts containing it
+        self._total_length = 0
+        self._lock = threading.Lock()
+
+    def __contains__(self, step: str) -> bool:
+        with self._lock:
+            return step in self._by_step
+
+    def add(self, step: str, result: str):
+        """Indexes a finished step's key facts; a step already indexed is left as it is."""
+        if step in self:
+            return
+        facts = []
+        for text in extract_facts(result or ""):
+            counts = Counter(terms(text))
+            facts.append({
+                "step": step, "text": text, "terms": counts, "length": sum(counts.values()),
+                "tokens": count_tokens(text),
+                "weight": _weight(text),
+            })
+        with self._lock:
+            if step in self._by_step:
+                return
+            self._by_step[step] = list(range(len(self._facts), len(self._facts) + len(facts)))
+            self._facts.extend(facts)
+            for fact in facts:
+                self._df.update(fact["terms"].keys())
+                self._total_length += fact["length"]
+
+    def _bm25(self, query: list, fact: dict, n: int, average: float) -> float:
+        score = 0.0
+        for term in query:
+            tf = fact["terms"].get(term, 0)
+            if tf:
+                idf = math.log(1 + (n - self._df[term] + 0.5) / (self._df[term] + 0.5))
+                score += idf * tf * (self.k1 + 1) / (tf + self.k1 * (1 - self.b + self.b * fact["length"] / average))
+        return score
+
+    def context(self, step: str, budget: int, steps: list = None) -> str:
+        """
+        The facts of `steps` (default: every indexed step) most relevant to `step`, within
+        `budget` tokens and SECTION_TOKEN_CAPS["step_result"] per earlier step. Each step's
+        best fact goes in first so none is left out entirely, then the rest by relevance.
+        Output lists facts under their step, in the order the steps were given.
+        """
+        query = set(terms(step))
+        with self._lock:
+            order = [s for s in (steps if steps is not None else self._by_step) if s in self._by_step]
+            by_step = {s: self._by_step[s] for s in order}
+            n = max(1, len(self._facts))
+            average = max(1.0, self._total_length / n)
+            ranked = sorted(
+                (i for s in order for i in by_step[s]),
+                key=lambda i: -(self._bm25(query, self._facts[i], n, average) + 0.01 * self._facts[i]["weight"]),
+            )
+            facts = self._facts
+
+        step_cap = SECTION_TOKEN_CAPS["step_result"]
+        chosen, used, per_step = set(), 0, Counter()
+        firsts, seen = [], set()
+        for i in ranked:  # Each step's best fact, most relevant steps first
+            if facts[i]["step"] not in seen:
+                seen.add(facts[i]["step"])
+                firsts.append(i)
+        first_set = set(firsts)
+        for i in firsts + [i for i in ranked if i not in first_set]:
+            fact = facts[i]
+            header = 0 if per_step[fact["step"]] else count_tokens(f"Step '{fact['step']}': ")
+            cost = fact["tokens"] + header + 1
+            if used + cost > budget or per_step[fact["step"]] + fact["tokens"] > step_cap:
+                continue
+            chosen.add(i)
+            used += cost
+            per_step[fact["step"]] += fact["tokens"]
+
+        lines = []
+        for s in order:
+            picked = [facts[i]["text"] for i in by_step[s] if i in chosen]
+            if picked:
+                lines.append(f"Step '{s}': " + " ".join(picked))
+        return "\n".join(lines)
@@ -1,63 +1,347 @@
+import contextvars
+import re
+import time
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 
-import json
-from research_agent.clients import call_openrouter
+from research_agent.clients import call_openrouter, call_site_max_tokens, pack_sections, prompt_budget
+from research_agent.config import (
+    ENSEMBLE_AGREEMENT_THRESHOLD,
+    ENSEMBLE_CONSENSUS_QUORUM,
+    ENSEMBLE_DYNAMIC,
+    ENSEMBLE_EARLY_EXIT,
+    ENSEMBLE_MODE,
+    ENSEMBLE_MODEL_DEADLINE,
+    ENSEMBLE_NUMERIC_MIN_MATCH,
+    ENSEMBLE_NUMERIC_TOLERANCE,
+    ENSEMBLE_QUORUM,
+    ENSEMBLE_STRAGGLER_GRACE,
+    ENSEMBLE_USED_SIMILARITY,
+    JUDGE_CANDIDATE_TOKENS,
+    JUDGE_SHARED_MIN_CHARS,
+)
+from research_agent.metrics import record_ensemble_decision
+from research_agent.resilience import Deadline, DeadlineExceeded, LLMCallError
+from research_agent.scoreboard import GLOBAL_SCOREBOARD, query_class
+from research_agent.text_utils import split_sentences, strip_boilerplate, truncate_to_tokens, words
+from research_agent.tool_registry import register_function
 from research_agent.new_config import ENSEMBLE_MODELS, PLANNER_MODEL_ID
 
-def ensemble_query(query: str, context: str = "") -> str:
+
+# --- AGREEMENT ---
+_FIGURE = re.compile(r"(?<![\w.])-?\d[\d,]*(?:\.\d+)?")
+
+
+def _overlap_f1(a: Counter, b: Counter) -> float:
+    common = sum((a & b).values())
+    if not common:
+        return 0.0
+    precision, recall = common / sum(b.values()), common / sum(a.values())
+    return 2 * precision * recall / (precision + recall)
+
+
+def text_similarity(a: str, b: str) -> float:
+    """Mean of unigram and bigram overlap F1 between two answers (ROUGE-1/-2 style), 0-1."""
+    words_a, words_b = words(a), words(b)
+    unigrams = _overlap_f1(Counter(words_a), Counter(words_b))
+    bigrams = _overlap_f1(Counter(zip(words_a, words_a[1:])), Counter(zip(words_b, words_b[1:])))
+    return (unigrams + bigrams) / 2
+
+
+def extract_figures(text: str) -> list:
+    """Every number quoted in the text ("1,234.5", "-3", "12%") as a float."""
+    return [float(match.replace(",", "")) for match in _FIGURE.findall(text) if match.strip(",-")]
+
+
+def numeric_consistency(a: str, b: str, tolerance: float = ENSEMBLE_NUMERIC_TOLERANCE) -> float:
+    """
+    Share of the figures in the answer quoting fewer of them that the other answer
+    also quotes, within a relative tolerance; 1.0 when either quotes none.
+    """
+    fewer, more = sorted((extract_figures(a), extract_figures(b)), key=len)
+    if not fewer:
+        return 1.0
+    matched = sum(1 for x in fewer if any(abs(x - y) <= tolerance * max(abs(x), abs(y)) for y in more))
+    return matched / len(fewer)
+
+
+def answers_agree(a: str, b: str, threshold: float = ENSEMBLE_AGREEMENT_THRESHOLD) -> bool:
+    return text_similarity(a, b) >= threshold and numeric_consistency(a, b) >= ENSEMBLE_NUMERIC_MIN_MATCH
+
+
+def consensus(responses: list, quorum: int = ENSEMBLE_CONSENSUS_QUORUM):
+    """
+    The answer to return without a meta-judge, or None. An outlier does not block it: the answer
+    that agrees with the most others is chosen once at least `quorum` answers (itself included)
+    agree, then the one closest to those it agrees with (earlier models win ties).
+    """
+    if len(responses) < max(quorum, 2):
+        return None
+    answers = [r["response"] for r in responses]
+    support = [1] * len(answers)
+    closeness = [0.0] * len(answers)
+    for i in range(len(answers)):
+        for j in range(i + 1, len(answers)):
+            if answers_agree(answers[i], answers[j]):
+                similarity = text_similarity(answers[i], answers[j])
+                for k in (i, j):
+                    support[k] += 1
+                    closeness[k] += similarity
+    best = max(range(len(answers)), key=lambda i: (support[i], closeness[i], -i))
+    return responses[best] if support[best] >= quorum else None
+
+
+# --- JUDGE PAYLOAD ---
+def _sentence_key(sentence: str) -> str:
+    return " ".join(sentence.lower().split()).rstrip(".!? ")
+
+
+def compact_candidates(responses: list, budget: int) -> str:
+    """
+    The candidate answers as the judge sees them: numbered plain text instead of JSON, with
+    boilerplate stripped and each sentence that several answers share sent once as [S1], [S2]...
+    Each answer is capped at JUDGE_CANDIDATE_TOKENS and the whole payload fits `budget` tokens.
+    """
+    answers = [strip_boilerplate(r["response"]) for r in responses]
+
+    owners = {}
+    for i, answer in enumerate(answers):
+        for sentence in split_sentences(answer):
+            if len(sentence) >= JUDGE_SHARED_MIN_CHARS:
+                owners.setdefault(_sentence_key(sentence), {"text": sentence, "answers": set()})["answers"].add(i)
+    labels = {}
+    for key, entry in owners.items():
+        if len(entry["answers"]) > 1:
+            labels[key] = f"[S{len(labels) + 1}]"
+    for i, answer in enumerate(answers):
+        for sentence in split_sentences(answer):
+            label = labels.get(_sentence_key(sentence))
+            if label:
+                answer = answer.replace(sentence, label, 1)
+        answers[i] = answer
+
+    sections = []
+    if labels:
+        shared = "\n".join(f"{label} {owners[key]['text']}" for key, label in labels.items())
+        sections.append((0, f"Shared passages (quoted by more than one answer, which cite them by label):\n{shared}"))
+    for i, answer in enumerate(answers, 1):
+        sections.append((1, f"Answer {i}:\n{truncate_to_tokens(answer, JUDGE_CANDIDATE_TOKENS)}"))
+    return pack_sections(sections, budget)
+
+
+# --- WORKERS ---
+def _ask(model_id: str, prompt: str, deadline: Deadline, scoreboard=None) -> str:
+    started = time.monotonic()
+    try:
+        # No fallback: substituting another model would defeat the ensemble's diversity
+        answer = call_openrouter(prompt, model_id, fallback=False, deadline=deadline,
+                                 max_tokens=call_site_max_tokens("ensemble"))
+    except LLMCallError:
+        if scoreboard is not None:
+            scoreboard.record_call(model_id, time.monotonic() - started, ok=False)
+        raise
+    if scoreboard is not None:
+        scoreboard.record_call(model_id, time.monotonic() - started, ok=True)
+    return answer
+
+
+def _out_of_time(error: LLMCallError, deadline: Deadline) -> bool:
+    """A member whose deadline is used up timed out, whatever the error (a read timeout is retryable)."""
+    return isinstance(error, DeadlineExceeded) or deadline.expired()
+
+
+def gather_responses(prompt: str, models=ENSEMBLE_MODELS, deadline: float = ENSEMBLE_MODEL_DEADLINE,
+                     quorum: int = ENSEMBLE_QUORUM, grace: float = ENSEMBLE_STRAGGLER_GRACE, enough=None,
+                     scoreboard=None):
+    """
+    Sends the prompt to every model concurrently.
+
+    Each model has `deadline` seconds to answer. Once `quorum` models have answered,
+    the rest get `grace` more seconds before they are dropped. A dropped request keeps
+    running in the background until its own deadline stops it, but nobody waits for it.
+    `enough(responses)` returning True stops the wait at once (the rest are not needed).
+    Every call's latency and outcome, dropped ones included, is recorded on `scoreboard`.
+
+    Returns:
+        (responses, timed_out, failed): the answers in `models` order as
+        {"model", "response"} dicts, the models that ran out of time, and
+        {model: error message} for the models that failed.
+    """
+    pool = ThreadPoolExecutor(max_workers=len(models), thread_name_prefix="ensemble")
+    deadlines = {model_id: Deadline(deadline) for model_id in models}
+    # Each worker runs in a copy of the caller's context so node, priority and session follow it
+    futures = {
+        pool.submit(contextvars.copy_context().run, _ask, model_id, prompt, deadlines[model_id], scoreboard): model_id
+        for model_id in models
+    }
+    answers, failed = {}, {}
+    timed_out = []
+    satisfied = False
+    pending = set(futures)
+    cutoff = time.monotonic() + deadline
+    try:
+        while pending:
+            remaining = cutoff - time.monotonic()
+            if remaining <= 0:
+                break
+            done, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+            for future in done:
+                model_id = futures[future]
+                try:
+                    answers[model_id] = future.result()
+                    print(f"   ✓ {model_id} answered")
+                except LLMCallError as e:
+                    if _out_of_time(e, deadlines[model_id]):
+                        timed_out.append(model_id)
+                    else:
+                        # Failed members are left out so the judge never weighs an error message
+                        print(f"   ⚠️ {model_id} failed: {e}")
+                        failed[model_id] = str(e)
+            if pending and enough and enough(_in_order(answers, models)):
+                satisfied = True
+                break
+            if pending and len(answers) >= quorum:
+                cutoff = min(cutoff, time.monotonic() + grace)
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    for future in pending:
+        if satisfied:
+            print(f"   ⏭️ {futures[future]} no longer needed")
+            continue
+        print(f"   ⏱️ {futures[future]} dropped: no answer in time")
+        timed_out.append(futures[future])
+    return _in_order(answers, models), [m for m in models if m in timed_out], failed
+
+
+def _in_order(answers: dict, models) -> list:
+    return [{"model": m, "response": answers[m]} for m in models if m in answers]
+
+
+def sequential_responses(prompt: str, models=ENSEMBLE_MODELS, deadline: float = ENSEMBLE_MODEL_DEADLINE,
+                         enough=None, scoreboard=None):
+    """
+    Asks the models one at a time, stopping as soon as `enough(responses)` is True.
+    Cheaper than gather_responses when answers usually agree; slower when they don't.
+    Returns the same (responses, timed_out, failed) triple.
+    """
+    responses, timed_out, failed = [], [], {}
+    for model_id in models:
+        model_deadline = Deadline(deadline)
+        try:
+            responses.append({"model": model_id, "response": _ask(model_id, prompt, model_deadline, scoreboard)})
+            print(f"   ✓ {model_id} answered")
+        except LLMCallError as e:
+            if _out_of_time(e, model_deadline):
+                print(f"   ⏱️ {model_id} dropped: no answer in time")
+                timed_out.append(model_id)
+            else:
+                print(f"   ⚠️ {model_id} failed: {e}")
+                failed[model_id] = str(e)
+        if enough and enough(responses):
+            break
+    return responses, timed_out, failed
+
+
+def _missing_models_note(timed_out: list, failed: dict) -> str:
+    if not timed_out and not failed:
+        return ""
+    lines = [f"- {m}: timed out" for m in timed_out] + [f"- {m}: failed" for m in failed]
+    return ("\nModels That Did Not Answer (judge only the responses above; do not guess what these would have said):\n"
+            + "\n".join(lines) + "\n")
+
+
+def _record_outcome(klass: str, responses: list, final_answer: str):
+    """Credits the member whose answer the final one is closest to, and those it drew on."""
+    similarity = {r["model"]: text_similarity(r["response"], final_answer) for r in responses}
+    best = max(similarity, key=similarity.get)
+    picked = best if similarity[best] >= ENSEMBLE_USED_SIMILARITY else None
+    used = [m for m, s in similarity.items() if m != picked and s >= ENSEMBLE_USED_SIMILARITY]
+    unused = [m for m in similarity if m != picked and m not in used]
+    GLOBAL_SCOREBOARD.record_outcome(klass, picked, used, unused)
+
+
+def ensemble_query(query: str, context: str = "", mode: str = None, early_exit: bool = ENSEMBLE_EARLY_EXIT) -> str:
     """
     Executes a query using 3 different models and uses a meta-model to select the best answer.
-    
+    With ENSEMBLE_DYNAMIC the members are the scoreboard's current best for the query's class
+    (see EnsembleScoreboard.select), else ENSEMBLE_MODELS. In "parallel" mode the members run
+    concurrently (see gather_responses for the deadline and quorum rules); in "sequential" mode
+    they run one after another. With early_exit, the wait ends as soon as enough answers agree
+    (see consensus) and the agreed answer is returned without the meta-judge.
+
     Args:
         query: The question or task to execute
         context: Any relevant context from previous steps
-        
+        mode: "parallel" or "sequential"; defaults to ENSEMBLE_MODE
+
     Returns:
         The synthesized/selected best answer
     """
-    print(f"\n🔄 ENSEMBLE: Running query through {len(ENSEMBLE_MODELS)} models...")
-    
+    mode = mode or ENSEMBLE_MODE
+    if mode not in ("parallel", "sequential"):
+        raise ValueError(f"Unknown ensemble mode {mode!r}")
+    klass = query_class(query)
+    members = GLOBAL_SCOREBOARD.select(klass) if ENSEMBLE_DYNAMIC else list(ENSEMBLE_MODELS)
+    print(f"\n🔄 ENSEMBLE: Running {klass} query through {len(members)} models ({mode}): {', '.join(members)}")
+
     # Prepare the prompt for each model
     prompt = f"""Context: {context}
 
 Task: {query}
 
 Provide a clear, accurate answer."""
-    
-    # Collect responses from all models
-    responses = []
-    for i, model_id in enumerate(ENSEMBLE_MODELS):
-        print(f"   Model {i+1}/{len(ENSEMBLE_MODELS)}: {model_id}")
-        try:
-            response = call_openrouter(prompt, model_id)
-            responses.append({
-                "model": model_id,
-                "response": response
-            })
-        except Exception as e:
-            responses.append({
-                "model": model_id,
-                "response": f"Error: {str(e)}"
-            })
-    
+
+    enough = (lambda responses: consensus(responses) is not None) if early_exit else None
+    gather = gather_responses if mode == "parallel" else sequential_responses
+    responses, timed_out, failed = gather(prompt, models=members, enough=enough, scoreboard=GLOBAL_SCOREBOARD)
+
+    if not responses:
+        raise LLMCallError("Every ensemble model failed or timed out.")
+
+    agreed = consensus(responses) if early_exit else None
+    if agreed is not None:
+        others = [r for r in responses if r is not agreed]
+        used = [r["model"] for r in others if answers_agree(r["response"], agreed["response"])]
+        unused = [r["model"] for r in others if r["model"] not in used]
+        print(f"✅ ENSEMBLE CONSENSUS: {len(used) + 1}/{len(responses)} models agree; skipping the meta-judge")
+        record_ensemble_decision(mode, "consensus")
+        GLOBAL_SCOREBOARD.record_outcome(klass, agreed["model"], used, unused)
+        return agreed["response"]
+    record_ensemble_decision(mode, "judge")
+
     # Use Meta-Model (405B) to select/synthesize the best answer
-    print(f"\n🧠 META-MODEL ({PLANNER_MODEL_ID}): Synthesizing ensemble results...")
-    
-    meta_prompt = f"""You are a Meta-Judge AI evaluating multiple model responses to select or synthesize the best answer.
+    print(f"\n🧠 META-MODEL ({PLANNER_MODEL_ID}): Synthesizing {len(responses)}/{len(members)} ensemble results...")
 
-Original Query: {query}
+    meta_template = """You are a Meta-Judge AI evaluating multiple model responses to select or synthesize the best answer.
 
-Model Responses:
-{json.dumps(responses, indent=2)}
+Original Query: {query}
 
+Candidate Answers:
+{candidates}
+{missing}
 INSTRUCTIONS:
 1. Compare the responses for accuracy, completeness, and relevance.
 2. If one response is clearly superior, select it.
 3. If multiple responses have complementary strengths, synthesize them into a unified answer.
-4. Return ONLY the final answer (not meta-commentary about the models).
+4. Return ONLY the final answer (not meta-commentary about the models), with shared passages written out in full.
 
 Final Answer:"""
-    
-    final_answer = call_openrouter(meta_prompt, PLANNER_MODEL_ID)
-    
+    fields = {"query": query, "missing": _missing_models_note(timed_out, failed)}
+    budget = prompt_budget(PLANNER_MODEL_ID, call_site_max_tokens("judge"), meta_template.format(candidates="", **fields))
+    meta_prompt = meta_template.format(candidates=compact_candidates(responses, budget), **fields)
+
+    final_answer = call_openrouter(meta_prompt, PLANNER_MODEL_ID, max_tokens=call_site_max_tokens("judge"))
+    _record_outcome(klass, responses, final_answer)
+
     print(f"✅ ENSEMBLE COMPLETE")
     return final_answer
+
+
+def _ensemble_tool(query: str, context: str = "") -> str:
+    """Answers a question with several models and returns their consensus, or the meta-judge's pick."""
+    return ensemble_query(query, context)
+
+
+# Plan steps and the executor LLM reach the ensemble as a tool; mode and early exit stay config
+register_function("ensemble_query", _ensemble_tool)
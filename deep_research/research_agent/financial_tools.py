@@ -7,13 +7,20 @@ ensuring mathematical accuracy separate from LLM reasoning.
 import yfinance as yf
 from langchain_core.tools import tool
 
+from research_agent.cassette import recorded
+from research_agent.singleflight import coalesce
+from research_agent.tool_registry import register_tool
+
 def calculate_cagr(start_value, end_value, periods):
     """Programmatic CAGR calculation to ensure math accuracy."""
     if start_value == 0 or periods == 0:
         return 0
     return (end_value / start_value) ** (1 / periods) - 1
 
+@register_tool
 @tool(parse_docstring=True)
+@coalesce("get_company_fundamentals")
+@recorded("get_company_fundamentals")
 def get_company_fundamentals(ticker: str) -> str:
     """Fetch core fundamental data and calculated metrics for a specific company.
 
@@ -68,7 +75,10 @@ def get_company_fundamentals(ticker: str) -> str:
     except Exception as e:
         return f"Error fetching data for {ticker}: {str(e)}"
 
+@register_tool
 @tool(parse_docstring=True)
+@coalesce("get_historical_performance")
+@recorded("get_historical_performance")
 def get_historical_performance(tickers: str, period: str = "5y") -> str:
     """Fetch historical stock performance and calculate CAGR for multiple companies.
     
@@ -2,8 +2,36 @@ import subprocess
 import json
 from langchain.tools import tool
 
+from research_agent.cache import cache_lookup
+from research_agent.cassette import recorded
+from research_agent.config import GEMINI_CLI_TIMEOUT
+from research_agent.metrics import is_error_result
+from research_agent.singleflight import coalesce
+from research_agent.tool_registry import register_tool
+
+# Output format changes the answer shape, so it is part of the cache key
+CLI_CACHE_PARAMS = {"output_format": "json"}
+
+@register_tool
 @tool
+@coalesce("ask_gemini_cli_tool")
 def ask_gemini_cli_tool(query: str) -> str:
+    """Ask the Gemini CLI a question and return its text response.
+
+    Args:
+        query: The prompt to send to the Gemini CLI.
+    """
+    cache, cache_key, cached = cache_lookup("gemini-cli", query, CLI_CACHE_PARAMS)
+    if cached is not None:
+        return cached
+
+    answer = _run_gemini_cli(query)
+    if cache and not is_error_result(answer):
+        cache.set(cache_key, "gemini-cli", answer)
+    return answer
+
+@recorded("gemini-cli")
+def _run_gemini_cli(query: str) -> str:
     print(f"\n[DEBUG] Sending query to Gemini: {query[:50]}...")
     
     command = ["gemini", "-p", query, "--output-format", "json"]
@@ -13,7 +41,8 @@ def ask_gemini_cli_tool(query: str) -> str:
         result = subprocess.run(
             command, 
             capture_output=True, 
-            text=True
+            text=True,
+            timeout=GEMINI_CLI_TIMEOUT
         )
         
         # DEBUG: Check if there was an error in the CLI itself
@@ -41,5 +70,7 @@ def ask_gemini_cli_tool(query: str) -> str:
             # Fallback for when CLI prints raw text instead of JSON
             return result.stdout
 
+    except subprocess.TimeoutExpired:
+        return f"Error: Gemini CLI timed out after {GEMINI_CLI_TIMEOUT}s."
     except Exception as e:
         return f"System Error: {str(e)}"
\ No newline at end of file
@@ -0,0 +1,191 @@
+"""Hedged Requests.
+
+Tail-latency protection for LLM calls. Once a call has been outstanding for
+longer than a percentile of the model's recently observed latency, a duplicate
+is sent to the same model (or a configured equivalent). The first good answer
+wins and the remaining requests are cancelled.
+"""
+
+import asyncio
+import contextvars
+import os
+import threading
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from research_agent.config import (
+    HEDGE_DEFAULT_DELAY,
+    HEDGE_ENABLED,
+    HEDGE_EQUIVALENTS,
+    HEDGE_LATENCY_WINDOW,
+    HEDGE_MAX_EXTRA,
+    HEDGE_MAX_WORKERS,
+    HEDGE_MIN_DELAY,
+    HEDGE_MIN_SAMPLES,
+    HEDGE_PERCENTILE,
+)
+
+
+class LatencyTracker:
+    """Rolling window of successful call latencies per model."""
+
+    def __init__(self, window: int = HEDGE_LATENCY_WINDOW):
+        self.window = window
+        self._samples = {}
+        self._lock = threading.Lock()
+
+    def record(self, model_id: str, seconds: float):
+        with self._lock:
+            if model_id not in self._samples:
+                self._samples[model_id] = deque(maxlen=self.window)
+            self._samples[model_id].append(seconds)
+
+    def samples(self, model_id: str) -> list:
+        with self._lock:
+            return list(self._samples.get(model_id, ()))
+
+    def count(self, model_id: str) -> int:
+        with self._lock:
+            return len(self._samples.get(model_id, ()))
+
+    def percentile(self, model_id: str, pct: float):
+        """Nearest-rank percentile of the model's recent latencies, or None without samples."""
+        with self._lock:
+            samples = sorted(self._samples.get(model_id, ()))
+        if not samples:
+            return None
+        index = min(len(samples) - 1, max(0, round(pct / 100 * len(samples)) - 1))
+        return samples[index]
+
+
+# Global singleton instance
+GLOBAL_LATENCY_TRACKER = LatencyTracker()
+
+
+def hedging_enabled(hedge=None) -> bool:
+    """Per-call override if given, else the process-wide setting (re-read from the environment)."""
+    if hedge is not None:
+        return hedge
+    return HEDGE_ENABLED or os.environ.get("DEEP_RESEARCH_HEDGE", "0") not in ("", "0")
+
+
+def hedge_delay(model_id: str, tracker: LatencyTracker = None) -> float:
+    """Seconds to wait for the original request before sending a hedge."""
+    tracker = tracker or GLOBAL_LATENCY_TRACKER
+    if tracker.count(model_id) < HEDGE_MIN_SAMPLES:
+        return HEDGE_DEFAULT_DELAY
+    return max(HEDGE_MIN_DELAY, tracker.percentile(model_id, HEDGE_PERCENTILE))
+
+
+def hedge_target(model_id: str, hedge_number: int) -> str:
+    """The model the n-th hedge (1-based) goes to: rotating through equivalents, else the same model."""
+    equivalents = HEDGE_EQUIVALENTS.get(model_id)
+    if not equivalents:
+        return model_id
+    return equivalents[(hedge_number - 1) % len(equivalents)]
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=HEDGE_MAX_WORKERS, thread_name_prefix="hedge")
+    return _executor
+
+
+def _release(reservation):
+    release = getattr(reservation, "release", None)
+    if release is not None:
+        release()
+
+
+def _submit(executor, fn, *args):
+    # Each attempt runs in a copy of the caller's context so its node, priority and session follow it
+    return executor.submit(contextvars.copy_context().run, fn, *args)
+
+
+def run_hedged(model_id: str, attempt_fn, reserve_fn, delay: float, max_hedges: int = HEDGE_MAX_EXTRA):
+    """
+    Runs attempt_fn(target, reservation) with hedging; returns (target, result).
+
+    reserve_fn(target) must claim a rate-limit slot without waiting and return
+    it (falsy when none is free); a hedge is skipped when it gets none. The
+    primary request is passed reservation=False and the hedges what reserve_fn returned. Raises the first
+    error once every request has failed. A synchronous request that already
+    started cannot be aborted: a losing request runs to completion in the
+    background and its answer is discarded.
+    """
+    executor = _get_executor()
+    pending = {_submit(executor, attempt_fn, model_id, False): model_id}
+    reservations = {}
+    hedges = 0
+    errors = []
+    try:
+        while pending:
+            done, _ = wait(pending, timeout=delay if hedges < max_hedges else None, return_when=FIRST_COMPLETED)
+            if not done:
+                hedges += 1
+                target = hedge_target(model_id, hedges)
+                reservation = reserve_fn(target)
+                if reservation:
+                    print(f"🪁 HEDGE: {model_id} slower than {delay:.1f}s; duplicating to {target}")
+                    future = _submit(executor, attempt_fn, target, reservation)
+                    pending[future] = target
+                    reservations[future] = reservation
+                else:
+                    print(f"🪁 HEDGE skipped: no rate-limit budget for {target}")
+                continue
+            for future in done:
+                target = pending.pop(future)
+                try:
+                    return target, future.result()
+                except Exception as e:
+                    errors.append(e)
+        raise errors[0]
+    finally:
+        for future in pending:
+            # A hedge that never started never gets to release the slot it was given
+            if future.cancel():
+                _release(reservations.get(future))
+
+
+async def arun_hedged(model_id: str, attempt_fn, reserve_fn, delay: float, max_hedges: int = HEDGE_MAX_EXTRA):
+    """Async variant of run_hedged; attempt_fn must be a coroutine function and losers are cancelled."""
+    pending = {asyncio.ensure_future(attempt_fn(model_id, False)): model_id}
+    reservations = {}
+    hedges = 0
+    errors = []
+    try:
+        while pending:
+            done, _ = await asyncio.wait(
+                pending, timeout=delay if hedges < max_hedges else None, return_when=asyncio.FIRST_COMPLETED
+            )
+            if not done:
+                hedges += 1
+                target = hedge_target(model_id, hedges)
+                reservation = reserve_fn(target)
+                if reservation:
+                    print(f"🪁 HEDGE: {model_id} slower than {delay:.1f}s; duplicating to {target}")
+                    task = asyncio.ensure_future(attempt_fn(target, reservation))
+                    pending[task] = target
+                    reservations[task] = reservation
+                else:
+                    print(f"🪁 HEDGE skipped: no rate-limit budget for {target}")
+                continue
+            for task in done:
+                target = pending.pop(task)
+                try:
+                    return target, task.result()
+                except Exception as e:
+                    errors.append(e)
+        raise errors[0]
+    finally:
+        for task in pending:
+            task.cancel()
+            # A task cancelled before its first step never gets to release its slot
+            _release(reservations.get(task))
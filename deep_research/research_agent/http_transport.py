@@ -0,0 +1,148 @@
+"""HTTP Transport.
+
+Process-wide pooled HTTP client shared by the LLM clients. Every call reuses
+keep-alive connections from one pool instead of paying a fresh TCP+TLS
+handshake per request. Async callers get one pooled client per event loop,
+since httpx async connections cannot be shared across loops.
+"""
+
+import asyncio
+import atexit
+import threading
+import weakref
+
+import httpx
+
+from research_agent.cassette import CassetteTransport, get_active_cassette
+from research_agent.config import (
+    HTTP_CONNECT_TIMEOUT,
+    HTTP_ENABLE_HTTP2,
+    HTTP_KEEPALIVE_EXPIRY,
+    HTTP_MAX_CONNECTIONS,
+    HTTP_MAX_KEEPALIVE_CONNECTIONS,
+    HTTP_READ_TIMEOUT,
+    PREWARM_URLS,
+)
+
+_client = None
+_client_lock = threading.Lock()
+_async_clients = weakref.WeakKeyDictionary()  # {event_loop: httpx.AsyncClient}
+
+
+def http2_available() -> bool:
+    """Return True if HTTP/2 is enabled in config and the `h2` package is installed."""
+    if not HTTP_ENABLE_HTTP2:
+        return False
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def _build_limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+    )
+
+
+def _build_timeout() -> httpx.Timeout:
+    return httpx.Timeout(HTTP_READ_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT)
+
+
+def _build_transport(async_client: bool = False):
+    """A CassetteTransport when record/replay is active, else None for httpx's default pool."""
+    cassette = get_active_cassette()
+    if cassette is None:
+        return None
+    inner = None
+    if cassette.mode == "record":
+        transport_cls = httpx.AsyncHTTPTransport if async_client else httpx.HTTPTransport
+        inner = transport_cls(http2=http2_available(), limits=_build_limits())
+    return CassetteTransport(cassette, inner)
+
+
+def get_http_client() -> httpx.Client:
+    """Return the shared, lazily created pooled HTTP client."""
+    global _client
+    if _client is None or _client.is_closed:
+        with _client_lock:
+            if _client is None or _client.is_closed:
+                _client = httpx.Client(
+                    http2=http2_available(),
+                    limits=_build_limits(),
+                    timeout=_build_timeout(),
+                    transport=_build_transport(),
+                )
+    return _client
+
+
+def get_async_http_client() -> httpx.AsyncClient:
+    """Return the pooled async HTTP client bound to the running event loop."""
+    loop = asyncio.get_running_loop()
+    with _client_lock:
+        client = _async_clients.get(loop)
+        if client is None or client.is_closed:
+            client = httpx.AsyncClient(
+                http2=http2_available(),
+                limits=_build_limits(),
+                timeout=_build_timeout(),
+                transport=_build_transport(async_client=True),
+            )
+            _async_clients[loop] = client
+    return client
+
+
+async def aclose_http_client():
+    """Close the async client bound to the running event loop."""
+    loop = asyncio.get_running_loop()
+    with _client_lock:
+        client = _async_clients.pop(loop, None)
+    if client is not None:
+        await client.aclose()
+
+
+def prewarm_connections(urls=None, background: bool = True):
+    """Open pooled connections ahead of the first LLM call.
+
+    Args:
+        urls: URLs to touch (defaults to PREWARM_URLS from config)
+        background: Run in a daemon thread so startup is never delayed
+
+    Returns:
+        The warming thread when background is True, otherwise None (always None
+        while a record/replay cassette is active)
+    """
+    targets = list(urls if urls is not None else PREWARM_URLS)
+    if get_active_cassette() is not None:
+        return None  # Record/replay runs never need (or, replaying, have) live connections
+
+    def _warm():
+        client = get_http_client()
+        for url in targets:
+            try:
+                # Any response (even 404) leaves a negotiated connection in the pool.
+                client.head(url, timeout=HTTP_CONNECT_TIMEOUT)
+            except httpx.HTTPError as e:
+                print(f"⚠️ Connection pre-warm failed for {url}: {e}")
+
+    if background:
+        thread = threading.Thread(target=_warm, name="http-prewarm", daemon=True)
+        thread.start()
+        return thread
+    _warm()
+    return None
+
+
+def close_http_clients():
+    """Close the shared client and release its pooled connections."""
+    global _client
+    with _client_lock:
+        if _client is not None:
+            _client.close()
+            _client = None
+
+
+atexit.register(close_http_clients)
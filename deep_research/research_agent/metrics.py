@@ -0,0 +1,398 @@
+"""Metrics Registry.
+
+In-process counters and histograms for every LLM and tool invocation, labeled
+by model, graph node and tool: latency, time-to-first-token, prompt and
+completion tokens (from OpenRouter's `usage`), retries, cache hits and
+rate-limit waits. Exported as Prometheus text or a JSON snapshot, and
+optionally served over HTTP for scraping.
+"""
+
+import contextlib
+import contextvars
+import functools
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from research_agent.config import LATENCY_BUCKETS, METRICS_HOST
+
+_current_node = contextvars.ContextVar("metrics_node", default="")
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels: dict) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items()) + "}"
+
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name: str, help_text: str, label_names=()):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(label_names)
+        self._samples = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict) -> tuple:
+        unknown = set(labels) - set(self.label_names)
+        if unknown:
+            raise ValueError(f"Unknown labels for {self.name}: {sorted(unknown)}")
+        return tuple(str(labels.get(name, "")) for name in self.label_names)
+
+    def _labels(self, key: tuple) -> dict:
+        return dict(zip(self.label_names, key))
+
+    def reset(self):
+        with self._lock:
+            self._samples.clear()
+
+
+class _Scalar(_Metric):
+    """One number per label set."""
+
+    def _add(self, amount: float, labels: dict):
+        key = self._key(labels)
+        with self._lock:
+            self._samples[key] = self._samples.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._samples.get(self._key(labels), 0)
+
+    def prometheus_lines(self) -> list:
+        with self._lock:
+            samples = list(self._samples.items())
+        return [f"{self.name}{_format_labels(self._labels(k))} {_format_value(v)}" for k, v in samples]
+
+    def snapshot(self) -> list:
+        with self._lock:
+            return [{"labels": self._labels(k), "value": v} for k, v in self._samples.items()]
+
+
+class Counter(_Scalar):
+    """Monotonically increasing total."""
+
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        self._add(amount, labels)
+
+
+class Gauge(_Scalar):
+    """Value that goes up and down (e.g. queue depth)."""
+
+    kind = "gauge"
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._samples[key] = value
+
+    def inc(self, amount: float = 1, **labels):
+        self._add(amount, labels)
+
+    def dec(self, amount: float = 1, **labels):
+        self._add(-amount, labels)
+
+
+class Histogram(_Metric):
+    """Bucketed distribution with running sum and count."""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, label_names=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help_text, label_names)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            sample = self._samples.get(key)
+            if sample is None:
+                sample = self._samples[key] = {"buckets": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    sample["buckets"][i] += 1
+            sample["sum"] += value
+            sample["count"] += 1
+
+    def count(self, **labels) -> int:
+        with self._lock:
+            sample = self._samples.get(self._key(labels))
+            return sample["count"] if sample else 0
+
+    def prometheus_lines(self) -> list:
+        with self._lock:
+            samples = [(k, dict(v, buckets=list(v["buckets"]))) for k, v in self._samples.items()]
+        lines = []
+        for key, sample in samples:
+            labels = self._labels(key)
+            for bound, cumulative in zip(self.buckets, sample["buckets"]):
+                lines.append(f"{self.name}_bucket{_format_labels({**labels, 'le': _format_value(bound)})} {cumulative}")
+            lines.append(f"{self.name}_bucket{_format_labels({**labels, 'le': '+Inf'})} {sample['count']}")
+            lines.append(f"{self.name}_sum{_format_labels(labels)} {_format_value(sample['sum'])}")
+            lines.append(f"{self.name}_count{_format_labels(labels)} {sample['count']}")
+        return lines
+
+    def snapshot(self) -> list:
+        with self._lock:
+            return [
+                {
+                    "labels": self._labels(k),
+                    "count": v["count"],
+                    "sum": v["sum"],
+                    "mean": v["sum"] / v["count"] if v["count"] else 0.0,
+                    "buckets": {_format_value(b): c for b, c in zip(self.buckets, v["buckets"])},
+                }
+                for k, v in self._samples.items()
+            ]
+
+
+class MetricsRegistry:
+    """Named collection of metrics; creating a metric twice returns the existing one."""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, cls, name, help_text, label_names, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, help_text, label_names, **kwargs)
+            elif not isinstance(metric, cls):
+                raise ValueError(f"Metric {name} already registered as a {metric.kind}")
+            return metric
+
+    def counter(self, name: str, help_text: str, label_names=()) -> Counter:
+        return self._get_or_create(Counter, name, help_text, label_names)
+
+    def gauge(self, name: str, help_text: str, label_names=()) -> Gauge:
+        return self._get_or_create(Gauge, name, help_text, label_names)
+
+    def histogram(self, name: str, help_text: str, label_names=(), buckets=LATENCY_BUCKETS) -> Histogram:
+        return self._get_or_create(Histogram, name, help_text, label_names, buckets=buckets)
+
+    def to_prometheus(self) -> str:
+        """Prometheus text exposition format (version 0.0.4)."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.prometheus_lines())
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self) -> dict:
+        """JSON-serialisable view of every metric."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return {
+            "timestamp": time.time(),
+            "metrics": {m.name: {"type": m.kind, "help": m.help, "samples": m.snapshot()} for m in metrics},
+        }
+
+    def reset(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+        for metric in metrics:
+            metric.reset()
+
+
+# Global singleton instance
+REGISTRY = MetricsRegistry()
+
+LLM_LATENCY = REGISTRY.histogram(
+    "llm_request_duration_seconds", "Wall-clock time of one LLM request attempt.", ("model", "node", "outcome"))
+LLM_TTFT = REGISTRY.histogram(
+    "llm_time_to_first_token_seconds", "Time from sending a streamed request to its first token.", ("model", "node"))
+LLM_PROMPT_TOKENS = REGISTRY.counter(
+    "llm_prompt_tokens_total", "Prompt tokens reported by the provider.", ("model", "node"))
+LLM_COMPLETION_TOKENS = REGISTRY.counter(
+    "llm_completion_tokens_total", "Completion tokens reported by the provider.", ("model", "node"))
+LLM_RETRIES = REGISTRY.counter(
+    "llm_retries_total", "Failed attempts followed by a retry or a failover.", ("model", "node", "action"))
+LLM_CACHE_LOOKUPS = REGISTRY.counter(
+    "llm_cache_lookups_total", "Response cache lookups by result (hit or miss).", ("model", "node", "result"))
+RATE_LIMIT_WAIT = REGISTRY.histogram(
+    "rate_limit_wait_seconds", "Time spent waiting for a rate-limiter slot.", ("model", "node", "priority"))
+RATE_LIMIT_QUEUE_DEPTH = REGISTRY.gauge(
+    "rate_limit_queue_depth", "Calls currently queued for a rate-limiter slot.", ("model", "priority"))
+TOOL_LATENCY = REGISTRY.histogram(
+    "tool_duration_seconds", "Wall-clock time of one tool invocation (concurrency-slot wait included for registry tools).",
+    ("tool", "node", "cost_class", "outcome"))
+NODE_LATENCY = REGISTRY.histogram(
+    "node_duration_seconds", "Wall-clock time of one graph node run.", ("node",))
+ENSEMBLE_DECISIONS = REGISTRY.counter(
+    "ensemble_decisions_total", "Ensemble queries by how the answer was chosen (consensus or judge).", ("mode", "outcome"))
+STEP_DISPATCH = REGISTRY.counter(
+    "step_dispatch_total", "Plan steps by how their tool call was resolved (parsed locally or by the executor LLM).", ("route",))
+
+
+# --- NODE CONTEXT ---
+def current_node() -> str:
+    """The graph node the current call is running under ('' outside the graph)."""
+    return _current_node.get()
+
+
+@contextlib.contextmanager
+def node_scope(node: str):
+    """Labels every metric recorded inside the block with this node."""
+    token = _current_node.set(node)
+    try:
+        yield
+    finally:
+        try:
+            _current_node.reset(token)
+        except ValueError:
+            # A generator (e.g. stream_report) resumed by a UI worker thread in another context
+            _current_node.set("" if token.old_value is contextvars.Token.MISSING else token.old_value)
+
+
+def instrument_node(node: str):
+    """Decorator for graph nodes: sets the node label and times the node."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            started = time.monotonic()
+            with node_scope(node):
+                try:
+                    return fn(*args, **kwargs)
+                finally:
+                    NODE_LATENCY.observe(time.monotonic() - started, node=node)
+        return wrapper
+    return decorator
+
+
+def is_error_result(result) -> bool:
+    """Tools report failures as text; these are the results that count as errors."""
+    return isinstance(result, str) and result.startswith(("Error", "System Error"))
+
+
+def instrument_tool(tool: str, cost_class: str = ""):
+    """
+    Decorator that times a tool; results that are error strings count as errors.
+    Tools in the tool registry are timed by it instead (see record_tool_call).
+    """
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            started = time.monotonic()
+            outcome = "error"
+            try:
+                result = fn(*args, **kwargs)
+                if not is_error_result(result):
+                    outcome = "ok"
+                return result
+            finally:
+                record_tool_call(tool, cost_class, time.monotonic() - started, outcome)
+        return wrapper
+    return decorator
+
+
+# --- RECORDING HELPERS ---
+def record_llm_call(model_id: str, seconds: float, outcome: str = "ok"):
+    LLM_LATENCY.observe(seconds, model=model_id, node=current_node(), outcome=outcome)
+
+
+@contextlib.contextmanager
+def llm_call_timer(model_id: str):
+    """Times the enclosed LLM request; the outcome label is the exception type when it raises."""
+    started = time.monotonic()
+    outcome = "ok"
+    try:
+        yield
+    except BaseException as e:
+        outcome = type(e).__name__
+        raise
+    finally:
+        record_llm_call(model_id, time.monotonic() - started, outcome)
+
+
+def record_ttft(model_id: str, seconds: float):
+    LLM_TTFT.observe(seconds, model=model_id, node=current_node())
+
+
+def record_usage(model_id: str, usage: dict):
+    """Adds the token counts from an OpenRouter `usage` object."""
+    if not usage:
+        return
+    node = current_node()
+    LLM_PROMPT_TOKENS.inc(usage.get("prompt_tokens") or 0, model=model_id, node=node)
+    LLM_COMPLETION_TOKENS.inc(usage.get("completion_tokens") or 0, model=model_id, node=node)
+
+
+def record_retry(model_id: str, action: str):
+    """action is "retry" (same model again) or "failover" (moving down the chain)."""
+    LLM_RETRIES.inc(model=model_id, node=current_node(), action=action)
+
+
+def record_cache_lookup(model_id: str, hit: bool):
+    LLM_CACHE_LOOKUPS.inc(model=model_id, node=current_node(), result="hit" if hit else "miss")
+
+
+def record_rate_limit_wait(model_id: str, seconds: float, priority: str = ""):
+    RATE_LIMIT_WAIT.observe(seconds, model=model_id, node=current_node(), priority=priority)
+
+
+def record_queue_depth(model_id: str, priority: str, change: int):
+    RATE_LIMIT_QUEUE_DEPTH.inc(change, model=model_id, priority=priority)
+
+
+def record_ensemble_decision(mode: str, outcome: str):
+    ENSEMBLE_DECISIONS.inc(mode=mode, outcome=outcome)
+
+
+def record_tool_call(tool: str, cost_class: str, seconds: float, outcome: str):
+    """outcome is "ok", "error", "timeout" (call abandoned) or "busy" (no concurrency slot in time)."""
+    TOOL_LATENCY.observe(seconds, tool=tool, node=current_node(), cost_class=cost_class, outcome=outcome)
+
+
+def record_step_dispatch(route: str):
+    """route is "parsed" (tool call read straight from the step), "llm" or "ensemble"."""
+    STEP_DISPATCH.inc(route=route)
+
+
+# --- EXPORT ---
+def start_metrics_server(port: int, host: str = METRICS_HOST, registry: MetricsRegistry = None):
+    """
+    Serves /metrics (Prometheus text) and /metrics.json (snapshot) from a daemon thread.
+    Returns the server; call shutdown() on it to stop.
+    """
+    registry = registry or REGISTRY
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+        def do_GET(self):
+            if self.path.startswith("/metrics.json"):
+                body, content_type = json.dumps(registry.snapshot()).encode("utf-8"), "application/json"
+            elif self.path.startswith("/metrics"):
+                body, content_type = registry.to_prometheus().encode("utf-8"), "text/plain; version=0.0.4"
+            else:
+                self.send_error(404)
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    print(f"📈 Metrics on http://{host}:{server.server_address[1]}/metrics")
+    return server
@@ -13,6 +13,13 @@ ENSEMBLE_MODELS = [
     "mistralai/mixtral-8x22b-instruct",    # Mixtral (MoE Architecture)
 ]
 
+# Pool the ensemble draws from when membership is dynamic (see ENSEMBLE_DYNAMIC in config).
+# The first three are the default members until the scoreboard has learned otherwise.
+ENSEMBLE_CANDIDATES = ENSEMBLE_MODELS + [
+    "deepseek/deepseek-chat",              # DeepSeek V3 (Reasoning/Finance)
+    "google/gemma-2-27b-it",               # Gemma 2 (Compact Generalist)
+]
+
 # RATE LIMITS (RPM)
 PLANNER_RATE_LIMIT = 50 
 EXECUTOR_RATE_LIMIT = 50
@@ -1,50 +1,781 @@
+"""Rate Limiter.
+
+Per-model limits on requests per minute (RPM), tokens per minute (TPM) and
+requests in flight, all enforced together. A request is charged its estimated
+prompt tokens when admitted; the charge is corrected from the provider's
+`usage` once the answer arrives, and its in-flight slot is held until the
+returned Lease is released.
+
+Each model has its own lock and its own queue of waiters, so a thread or
+coroutine waiting on one model never holds up calls to another. Only the waiter
+at the head of a queue watches the clock; when it is admitted it hands the head
+position to the next waiter. The head is chosen by priority class first
+(interactive > executor > background, see scheduling.py) and then by start-time
+fair queuing across sessions, so one user's long plan cannot starve another
+user's planner call; within one session and class, arrival order is kept.
+
+What has been admitted is kept by a backend: in memory for one process, or in a
+SQLite file (SQLiteBackend) so that every worker process on the host shares one
+quota and a restart does not forget the last minute of traffic.
+"""
+
+import asyncio
+import os
+import sqlite3
+import threading
 import time
 from collections import deque
+from typing import NamedTuple
+
+from research_agent.config import (
+    AIMD_DECREASE,
+    AIMD_DECREASE_COOLDOWN,
+    AIMD_ENABLED,
+    AIMD_INCREASE,
+    AIMD_MAX_FACTOR,
+    AIMD_MIN_RPM,
+    AIMD_NEAR_LIMIT,
+    AIMD_PERSIST_INTERVAL,
+    AIMD_STATE_PATH,
+    MODEL_LIMITS,
+    MODEL_MAX_IN_FLIGHT,
+    MODEL_TPM_LIMITS,
+    RATE_LIMIT_BACKEND,
+    RATE_LIMIT_DB_PATH,
+    RATE_LIMIT_LEASE_TTL,
+    RATE_LIMIT_POLL_INTERVAL,
+)
+from research_agent.metrics import record_queue_depth, record_rate_limit_wait
+from research_agent.scheduling import current_priority, current_session, priority_rank
+
+WINDOW_SECONDS = 60.0
+
+
+class ModelLimits(NamedTuple):
+    """Limits for one model; 0 disables a limit."""
+    rpm: int = 0
+    tpm: int = 0
+    max_in_flight: int = 0
+
+
+def limits_for(model_id: str) -> ModelLimits:
+    """The configured RPM / TPM / in-flight limits for a model, falling back to each table's default."""
+    return ModelLimits(
+        rpm=MODEL_LIMITS.get(model_id, MODEL_LIMITS["default"]),
+        tpm=MODEL_TPM_LIMITS.get(model_id, MODEL_TPM_LIMITS["default"]),
+        max_in_flight=MODEL_MAX_IN_FLIGHT.get(model_id, MODEL_MAX_IN_FLIGHT["default"]),
+    )
+
+
+def _header_number(headers: dict, *names):
+    for name in names:
+        value = headers.get(name)
+        if value is None:
+            continue
+        try:
+            return float(value)
+        except ValueError:
+            continue
+    return None
+
+
+_LEARNED_SCHEMA = """
+CREATE TABLE IF NOT EXISTS learned_limits (
+    model TEXT PRIMARY KEY,
+    rpm REAL NOT NULL,
+    tpm REAL,
+    ceiling REAL,
+    updated_at REAL NOT NULL,
+    base REAL
+);
+"""
+
+
+class AdaptiveLimits:
+    """
+    Learns each model's effective RPM online with AIMD: additive increase while calls succeed
+    under pressure, multiplicative decrease on 429. `x-ratelimit-*` headers seed the RPM / TPM
+    and cap growth. With a path, learned limits are persisted in SQLite and picked up by the
+    next run, unless the configured RPM they were learned from has changed since.
+    """
+
+    def __init__(self, path: str = None, increase: float = AIMD_INCREASE, decrease: float = AIMD_DECREASE,
+                 min_rpm: float = AIMD_MIN_RPM, max_factor: float = AIMD_MAX_FACTOR,
+                 cooldown: float = AIMD_DECREASE_COOLDOWN, persist_interval: float = AIMD_PERSIST_INTERVAL,
+                 clock=time.time):
+        self.path = path
+        self.increase = increase
+        self.decrease = decrease
+        self.min_rpm = min_rpm
+        self.max_factor = max_factor
+        self.cooldown = cooldown
+        self.persist_interval = persist_interval
+        self.clock = clock
+        self._state = {}
+        self._lock = threading.Lock()
+        self._conn = None
+
+    # --- persistence ---
+    def _connection(self):
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False, isolation_level=None)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript(_LEARNED_SCHEMA)
+            columns = {row[1] for row in self._conn.execute("PRAGMA table_info(learned_limits)")}
+            if "base" not in columns:  # Files written before learned limits recorded their base
+                self._conn.execute("ALTER TABLE learned_limits ADD COLUMN base REAL")
+        return self._conn
+
+    def _load(self, model_id: str, configured: ModelLimits) -> dict:
+        """
+        Called with the lock held: the model's learned state, read from disk on first use.
+        State learned from a different configured RPM is dropped and reseeded from the config.
+        """
+        state = self._state.get(model_id)
+        if state is not None and state["base"] == configured.rpm:
+            return state
+        state = {"rpm": float(configured.rpm), "tpm": None, "ceiling": None, "base": configured.rpm,
+                 "decreased_at": 0.0, "persisted_at": 0.0}
+        if self.path:
+            row = self._connection().execute(
+                "SELECT rpm, tpm, ceiling, base FROM learned_limits WHERE model = ?", (model_id,)
+            ).fetchone()
+            if row is not None and row[3] == configured.rpm:
+                state.update(rpm=row[0], tpm=row[1], ceiling=row[2])
+        self._state[model_id] = state
+        return state
+
+    def _persist(self, model_id: str, state: dict, force: bool = False):
+        now = self.clock()
+        if not self.path or (not force and now - state["persisted_at"] < self.persist_interval):
+            return
+        state["persisted_at"] = now
+        self._connection().execute(
+            "INSERT OR REPLACE INTO learned_limits (model, rpm, tpm, ceiling, updated_at, base) VALUES (?, ?, ?, ?, ?, ?)",
+            (model_id, state["rpm"], state["tpm"], state["ceiling"], now, state["base"]),
+        )
+
+    # --- learning ---
+    def limits(self, model_id: str, configured: ModelLimits) -> ModelLimits:
+        """The configured limits with RPM (and, when a header gave one, TPM) replaced by the learned values."""
+        if not configured.rpm:
+            return configured  # Unlimited models have nothing to learn
+        with self._lock:
+            state = self._load(model_id, configured)
+            rpm = max(int(state["rpm"]), 1)
+            tpm = int(state["tpm"]) if state["tpm"] else configured.tpm
+        return configured._replace(rpm=rpm, tpm=tpm)
+
+    def _seed(self, state: dict, headers) -> bool:
+        """Applies rate-limit headers; returns whether they changed anything."""
+        if not headers:
+            return False
+        lowered = {str(k).lower(): str(v) for k, v in dict(headers).items()}
+        changed = False
+        limit = _header_number(lowered, "x-ratelimit-limit-requests", "x-ratelimit-limit")
+        if limit and limit != state["ceiling"]:
+            # The provider told us its quota: start there and never grow past it
+            state["ceiling"] = limit
+            state["rpm"] = limit
+            changed = True
+        tokens = _header_number(lowered, "x-ratelimit-limit-tokens")
+        if tokens and tokens != state["tpm"]:
+            state["tpm"] = tokens
+            changed = True
+        return changed
+
+    def on_success(self, model_id: str, configured: ModelLimits, headers=None, pressed: bool = False):
+        """
+        Applies headers, and grows the RPM only when `pressed`: a success from a model whose requests
+        never wait says nothing about whether the provider would allow more.
+        """
+        if not configured.rpm:
+            return
+        with self._lock:
+            state = self._load(model_id, configured)
+            seeded = self._seed(state, headers)
+            if pressed:
+                ceiling = state["ceiling"] or configured.rpm * self.max_factor
+                state["rpm"] = min(state["rpm"] + self.increase / max(state["rpm"], 1.0), ceiling)
+            if seeded or pressed:
+                self._persist(model_id, state, force=seeded)
+
+    def on_throttled(self, model_id: str, configured: ModelLimits, headers=None):
+        if not configured.rpm:
+            return
+        with self._lock:
+            state = self._load(model_id, configured)
+            self._seed(state, headers)
+            now = self.clock()
+            if now - state["decreased_at"] < self.cooldown:
+                return
+            state["decreased_at"] = now
+            state["rpm"] = max(state["rpm"] * self.decrease, self.min_rpm)
+            print(f"📉 ADAPTIVE LIMIT: {model_id} throttled; backing off to {state['rpm']:.1f} RPM")
+            self._persist(model_id, state, force=True)
+
+    def observe(self, model_id: str, configured: ModelLimits, status_code: int, headers=None,
+                pressed: bool = False):
+        """Feeds one response: 429 backs the limit off, a success under pressure grows it, headers seed it."""
+        if status_code == 429:
+            self.on_throttled(model_id, configured, headers)
+        elif 200 <= status_code < 300:
+            self.on_success(model_id, configured, headers, pressed)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {model_id: {"rpm": state["rpm"], "tpm": state["tpm"], "ceiling": state["ceiling"]}
+                    for model_id, state in self._state.items()}
+
+
+def _as_limits(limits) -> ModelLimits:
+    # Bare ints are RPM limits, as the limiter took before TPM and concurrency limits existed
+    return limits if isinstance(limits, ModelLimits) else ModelLimits(rpm=limits)
+
+
+class _Waiter:
+    """One queued acquire. Sync waiters block on a threading.Event; async ones on an asyncio.Event
+    that is set through their own loop, so any thread can wake any waiter."""
+
+    def __init__(self, priority: str, session: str, weight: float, loop=None):
+        self.loop = loop
+        self.event = asyncio.Event() if loop else threading.Event()
+        self.priority = priority
+        self.session = session
+        self.weight = weight
+        self.enqueued_at = time.monotonic()
+        self.start_tag = 0.0  # Set by the fair queue on entry
+        self.seq = 0
+
+    def order(self) -> tuple:
+        return priority_rank(self.priority), self.start_tag, self.seq
+
+    def wake(self):
+        if self.loop is None:
+            self.event.set()
+        elif not self.loop.is_closed():
+            self.loop.call_soon_threadsafe(self.event.set)
+
+
+def _seconds_until_fits(history, charged: int, in_flight: int, limits: ModelLimits, tokens: int,
+                        window: float, now: float) -> float:
+    """
+    How long until a request of `tokens` fits every limit, given the (admitted_at, tokens) pairs
+    still in the window (oldest first): 0 if it fits now, inf if only a finishing request can make room.
+    """
+    if limits.max_in_flight and in_flight >= limits.max_in_flight:
+        return float("inf")
+    ready_at = now
+    if limits.rpm and len(history) >= limits.rpm:
+        # The oldest request has to fall out of the window
+        ready_at = max(ready_at, history[-limits.rpm][0] + window)
+    if limits.tpm:
+        # A request larger than the whole budget is admitted once the window is empty
+        excess = charged + min(tokens, limits.tpm) - limits.tpm
+        for admitted_at, spent in history:
+            if excess <= 0:
+                break
+            excess -= spent
+            ready_at = max(ready_at, admitted_at + window)
+    return max(ready_at - now, 0.001) if ready_at > now else 0
+
+
+class MemoryBackend:
+    """Admissions kept in this process only. Callers serialise access per model."""
+
+    # Every admission, settle and release happens in this process and wakes its waiters
+    poll_interval = None
+
+    def __init__(self):
+        self._models = {}
+        self._lock = threading.Lock()
+
+    def _usage(self, model_id: str) -> dict:
+        with self._lock:
+            return self._models.setdefault(model_id, {"history": deque(), "tokens": 0, "in_flight": 0})
+
+    def try_admit(self, model_id: str, limits: ModelLimits, tokens: int, window: float):
+        """
+        Returns (ticket, 0, requests in the window counting this one) when admitted,
+        else (None, seconds until it might fit, requests in the window).
+        """
+        usage = self._usage(model_id)
+        history = usage["history"]
+        now = time.time()
+        while history and history[0][0] <= now - window:
+            usage["tokens"] -= history.popleft()[1]
+        wait_time = _seconds_until_fits(history, usage["tokens"], usage["in_flight"], limits, tokens, window, now)
+        if wait_time > 0:
+            return None, wait_time, len(history)
+        entry = [now, tokens]
+        history.append(entry)
+        usage["tokens"] += tokens
+        if limits.max_in_flight:
+            usage["in_flight"] += 1
+        return entry, 0, len(history)
+
+    def settle(self, model_id: str, ticket, tokens: int):
+        usage = self._usage(model_id)
+        # A ticket already pruned from the window took its old charge with it; the total must not change
+        if any(entry is ticket for entry in usage["history"]):
+            usage["tokens"] += tokens - ticket[1]
+        ticket[1] = tokens
+
+    def release(self, model_id: str, ticket):
+        self._usage(model_id)["in_flight"] -= 1
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS admissions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    model TEXT NOT NULL,
+    admitted_at REAL NOT NULL,
+    tokens INTEGER NOT NULL,
+    in_flight INTEGER NOT NULL,
+    pid INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS admissions_model ON admissions (model, admitted_at);
+"""
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class SQLiteBackend:
+    """
+    Admissions kept in a SQLite file shared by every process on the host. Each admission
+    decision runs in one IMMEDIATE transaction, so concurrent processes never both take the
+    last slot. In-flight slots held by processes that died, or held for longer than
+    lease_ttl, are reclaimed.
+    """
+
+    def __init__(self, path: str, poll_interval: float = RATE_LIMIT_POLL_INTERVAL,
+                 lease_ttl: float = RATE_LIMIT_LEASE_TTL):
+        self.path = path
+        # Other processes cannot wake this one's waiters, so the head of a queue re-checks this often
+        self.poll_interval = poll_interval
+        self.lease_ttl = lease_ttl
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def _connection(self):
+        # Opened on first use so importing the module never touches the disk
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False, isolation_level=None)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript(_SCHEMA)
+        return self._conn
+
+    def try_admit(self, model_id: str, limits: ModelLimits, tokens: int, window: float):
+        """Returns (row id, 0, requests in the window) when admitted, else (None, seconds until it might fit, requests)."""
+        with self._lock:
+            conn = self._connection()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                now = time.time()
+                conn.execute("DELETE FROM admissions WHERE admitted_at <= ? AND in_flight = 0", (now - window,))
+                history = conn.execute(
+                    "SELECT admitted_at, tokens FROM admissions WHERE model = ? AND admitted_at > ? ORDER BY admitted_at",
+                    (model_id, now - window),
+                ).fetchall()
+                in_flight = self._in_flight(conn, model_id, limits, now)
+                charged = sum(spent for _, spent in history)
+                wait_time = _seconds_until_fits(history, charged, in_flight, limits, tokens, window, now)
+                ticket, in_window = None, len(history)
+                if wait_time == 0:
+                    in_window += 1
+                    ticket = conn.execute(
+                        "INSERT INTO admissions (model, admitted_at, tokens, in_flight, pid) VALUES (?, ?, ?, ?, ?)",
+                        (model_id, now, tokens, int(bool(limits.max_in_flight)), os.getpid()),
+                    ).lastrowid
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        return ticket, wait_time, in_window
+
+    def _in_flight(self, conn, model_id: str, limits: ModelLimits, now: float) -> int:
+        if not limits.max_in_flight:
+            return 0
+        count = conn.execute(
+            "SELECT COUNT(*) FROM admissions WHERE model = ? AND in_flight = 1", (model_id,)
+        ).fetchone()[0]
+        if count < limits.max_in_flight:
+            return count
+        # Full: reclaim slots whose holder crashed or has held them implausibly long, then recount
+        holders = conn.execute(
+            "SELECT DISTINCT pid FROM admissions WHERE model = ? AND in_flight = 1", (model_id,)
+        ).fetchall()
+        dead = [pid for (pid,) in holders if pid != os.getpid() and not _pid_alive(pid)]
+        conn.executemany("UPDATE admissions SET in_flight = 0 WHERE in_flight = 1 AND pid = ?", [(pid,) for pid in dead])
+        conn.execute("UPDATE admissions SET in_flight = 0 WHERE in_flight = 1 AND admitted_at <= ?", (now - self.lease_ttl,))
+        return conn.execute(
+            "SELECT COUNT(*) FROM admissions WHERE model = ? AND in_flight = 1", (model_id,)
+        ).fetchone()[0]
+
+    def settle(self, model_id: str, ticket: int, tokens: int):
+        with self._lock:
+            self._connection().execute("UPDATE admissions SET tokens = ? WHERE id = ?", (tokens, ticket))
+
+    def release(self, model_id: str, ticket: int):
+        with self._lock:
+            self._connection().execute("UPDATE admissions SET in_flight = 0 WHERE id = ?", (ticket,))
+
+    def clear(self):
+        with self._lock:
+            self._connection().execute("DELETE FROM admissions")
+
+
+def default_backend():
+    """The backend selected by DEEP_RESEARCH_RATE_LIMIT_BACKEND ("sqlite" or "memory")."""
+    if RATE_LIMIT_BACKEND == "sqlite":
+        return SQLiteBackend(RATE_LIMIT_DB_PATH)
+    if RATE_LIMIT_BACKEND == "memory":
+        return MemoryBackend()
+    raise ValueError(f"DEEP_RESEARCH_RATE_LIMIT_BACKEND must be 'sqlite' or 'memory', not {RATE_LIMIT_BACKEND!r}")
+
+
+class Lease:
+    """
+    One admitted request. Holds its in-flight slot until released (use it as a context
+    manager) and lets the caller correct its token charge once the real usage is known.
+    `pressed` says whether it was admitted near the model's RPM limit.
+    """
+
+    def __init__(self, state=None, ticket=None, holds_slot: bool = False, pressed: bool = False):
+        self._state = state
+        self._ticket = ticket
+        self._holds_slot = holds_slot
+        self.pressed = pressed
+
+    def settle(self, tokens: int):
+        """Replaces the estimated token charge with what the request actually used."""
+        if self._state is None or tokens is None:
+            return
+        with self._state.lock:
+            self._state.backend.settle(self._state.model_id, self._ticket, tokens)
+            self._state.wake_head()
+
+    def release(self):
+        """Frees the in-flight slot; safe to call more than once."""
+        if self._state is None or not self._holds_slot:
+            return
+        with self._state.lock:
+            if self._holds_slot:
+                self._holds_slot = False
+                self._state.backend.release(self._state.model_id, self._ticket)
+                self._state.wake_head()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+class _ModelWindow:
+    """The queue of this process's waiters for one model; every field is guarded by `lock`."""
+
+    def __init__(self, model_id: str, backend):
+        self.model_id = model_id
+        self.backend = backend
+        self.lock = threading.Lock()
+        self.waiters = []
+        # Start-time fair queuing: each session's next request starts where its last one finished
+        self.virtual_time = 0.0
+        self.session_finish = {}
+        self._seq = 0
+
+    def _tag(self, session: str, weight: float) -> float:
+        start = max(self.virtual_time, self.session_finish.get(session, 0.0))
+        self.session_finish[session] = start + 1.0 / weight
+        return start
+
+    def charge(self, session: str, weight: float):
+        """Counts a request admitted without queueing against its session's share."""
+        self.virtual_time = self._tag(session, weight)
+        if len(self.session_finish) > 1000:
+            # Sessions that are behind the virtual clock are idle; their tags no longer matter
+            self.session_finish = {k: v for k, v in self.session_finish.items() if v > self.virtual_time}
+
+    def join(self, waiter: _Waiter) -> int:
+        """Queues a waiter; returns how many waiters will be admitted before it (plus one)."""
+        waiter.start_tag = self._tag(waiter.session, waiter.weight)
+        self._seq += 1
+        waiter.seq = self._seq
+        self.waiters.append(waiter)
+        record_queue_depth(self.model_id, waiter.priority, 1)
+        return sum(1 for other in self.waiters if other.order() <= waiter.order())
+
+    def head(self):
+        return min(self.waiters, key=_Waiter.order) if self.waiters else None
+
+    def try_admit(self, limits: ModelLimits, tokens: int, window: float):
+        """Returns the Lease when the request fits now, else how long until it might."""
+        ticket, wait_time, in_window = self.backend.try_admit(self.model_id, limits, tokens, window)
+        if ticket is None:
+            if self.backend.poll_interval:
+                wait_time = min(wait_time, self.backend.poll_interval)
+            return wait_time
+        pressed = bool(limits.rpm) and in_window >= AIMD_NEAR_LIMIT * limits.rpm
+        return Lease(self, ticket, holds_slot=bool(limits.max_in_flight), pressed=pressed)
+
+    def wake_head(self):
+        head = self.head()
+        if head is not None:
+            head.wake()
+
+    def _remove(self, waiter: _Waiter):
+        self.waiters.remove(waiter)
+        record_queue_depth(self.model_id, waiter.priority, -1)
+
+    def take_turn(self, waiter: _Waiter, limits: ModelLimits, tokens: int, window: float):
+        """
+        Called with the lock held. Returns the Lease once the waiter is admitted, otherwise
+        how long to wait before looking again: until the head of the queue might fit, or
+        indefinitely (inf) for everyone behind it, who are woken when they reach the head.
+        """
+        if self.head() is not waiter:
+            return float("inf")
+        turn = self.try_admit(limits, tokens, window)
+        if isinstance(turn, Lease):
+            self._remove(waiter)
+            self.virtual_time = max(self.virtual_time, waiter.start_tag)
+            self.wake_head()
+        return turn
+
+    def leave(self, waiter: _Waiter):
+        """Called with the lock held when a waiter gives up (cancelled or interrupted)."""
+        if waiter not in self.waiters:
+            return
+        was_head = self.head() is waiter
+        self._remove(waiter)
+        if was_head:
+            self.wake_head()
+
 
 class RateLimiter:
     """
     Tracks Request Per Minute (RPM) limits for different models.
-    Enforces waits if limits are exceeded.
+    Enforces waits if limits are exceeded. Safe to share between threads and event loops;
+    with a SQLiteBackend, between processes too. With AdaptiveLimits, the limits passed in
+    are starting points and the RPM actually enforced is the learned one.
     """
-    def __init__(self):
-        # Stores timestamps of requests: {model_id: deque([t1, t2, ...])}
-        self.request_history = {}
-    
+    def __init__(self, window: float = WINDOW_SECONDS, backend=None, adaptive: AdaptiveLimits = None):
+        self.window = window
+        self.backend = backend or MemoryBackend()
+        self.adaptive = adaptive
+        self._windows = {}
+        self._pressed_at = {}  # model -> when a request last waited or was admitted near the RPM limit
+        self._lock = threading.Lock()
+
+    def _model(self, model_id: str) -> _ModelWindow:
+        with self._lock:
+            state = self._windows.get(model_id)
+            if state is None:
+                state = self._windows[model_id] = _ModelWindow(model_id, self.backend)
+            return state
+
+    def _note_pressure(self, model_id: str):
+        """A request to the model had to wait, or was admitted near its RPM limit."""
+        with self._lock:
+            self._pressed_at[model_id] = time.monotonic()
+
+    def _enqueue(self, state: _ModelWindow, waiter: _Waiter, limits: ModelLimits, tokens: int):
+        """
+        Admits the request straight away when nobody is queued and it fits (returns its Lease);
+        otherwise joins the queue and returns its 1-based position in it.
+        """
+        with state.lock:
+            if not state.waiters:
+                turn = state.try_admit(limits, tokens, self.window)
+                if isinstance(turn, Lease):
+                    state.charge(waiter.session, waiter.weight)
+                    return turn
+            return state.join(waiter)
+
+    @staticmethod
+    def _waiter(priority, session, weight, loop=None) -> _Waiter:
+        """Builds a waiter, taking the priority class and session from the calling context unless given."""
+        if session is None:
+            session, weight = current_session()
+        return _Waiter(priority or current_priority(), session, weight, loop)
+
+    def acquire(self, model_id: str, limits, tokens: int = 0,
+                priority: str = None, session: str = None, weight: float = 1.0) -> Lease:
+        """
+        Blocks this thread, behind higher-priority and earlier same-session waiters, until a request
+        of `tokens` estimated tokens fits the model's limits. Release the returned Lease when the
+        request ends. Priority class and session default to the calling context (scheduling.py).
+        """
+        limits = self._effective(model_id, limits)
+        if not any(limits):
+            return Lease() # No limit
+
+        state = self._model(model_id)
+        waiter = self._waiter(priority, session, weight)
+        queued = self._enqueue(state, waiter, limits, tokens)
+        if isinstance(queued, Lease):
+            if queued.pressed:
+                self._note_pressure(model_id)
+            return queued
+
+        print(f"⏳ Rate Limit ({self._describe(limits)}) hit for {model_id}. Queued at position {queued} ({waiter.priority})...")
+        started = time.monotonic()
+        try:
+            while True:
+                with state.lock:
+                    waiter.event.clear()
+                    turn = state.take_turn(waiter, limits, tokens, self.window)
+                if isinstance(turn, Lease):
+                    break
+                waiter.event.wait(None if turn == float("inf") else turn)
+        except BaseException:
+            with state.lock:
+                state.leave(waiter)
+            raise
+        record_rate_limit_wait(model_id, time.monotonic() - started, waiter.priority)
+        self._note_pressure(model_id)
+        return turn
+
+    async def async_acquire(self, model_id: str, limits, tokens: int = 0,
+                            priority: str = None, session: str = None, weight: float = 1.0) -> Lease:
+        """
+        Async variant of acquire: shares the same queue but yields to the event loop while waiting.
+        """
+        limits = self._effective(model_id, limits)
+        if not any(limits):
+            return Lease() # No limit
+
+        state = self._model(model_id)
+        waiter = self._waiter(priority, session, weight, asyncio.get_running_loop())
+        queued = self._enqueue(state, waiter, limits, tokens)
+        if isinstance(queued, Lease):
+            if queued.pressed:
+                self._note_pressure(model_id)
+            return queued
+
+        print(f"⏳ Rate Limit ({self._describe(limits)}) hit for {model_id}. Queued at position {queued} ({waiter.priority})...")
+        started = time.monotonic()
+        try:
+            while True:
+                with state.lock:
+                    waiter.event.clear()
+                    turn = state.take_turn(waiter, limits, tokens, self.window)
+                if isinstance(turn, Lease):
+                    break
+                try:
+                    await asyncio.wait_for(waiter.event.wait(), None if turn == float("inf") else turn)
+                except asyncio.TimeoutError:
+                    pass
+        except BaseException:
+            with state.lock:
+                state.leave(waiter)
+            raise
+        record_rate_limit_wait(model_id, time.monotonic() - started, waiter.priority)
+        self._note_pressure(model_id)
+        return turn
+
+    def try_acquire(self, model_id: str, limits, tokens: int = 0):
+        """
+        Admits the request only if it fits right now and nobody is queued; never waits.
+        Returns the Lease, or None when refused. Used by optional extra requests (hedges)
+        that must not eat into the budget of queued calls.
+        """
+        limits = self._effective(model_id, limits)
+        if not any(limits):
+            return Lease()
+        state = self._model(model_id)
+        with state.lock:
+            if state.waiters:
+                return None
+            turn = state.try_admit(limits, tokens, self.window)
+        if not isinstance(turn, Lease):
+            return None
+        if turn.pressed:
+            self._note_pressure(model_id)
+        return turn
+
     def wait_for_slot(self, model_id: str, rpm_limit: int):
         """
-        Checks if the model has available slots in the current minute window.
-        If not, sleeps until a slot opens up.
+        Claims a slot in the model's current minute window (RPM only), blocking this thread
+        behind earlier waiters until one opens up.
         """
-        if rpm_limit <= 0:
-            return # No limit
+        self.acquire(model_id, ModelLimits(rpm=rpm_limit))
 
-        if model_id not in self.request_history:
-            self.request_history[model_id] = deque()
-        
-        history = self.request_history[model_id]
-        now = time.time()
-        
-        # 1. Clean up requests older than 60 seconds
-        while history and history[0] < now - 60:
-            history.popleft()
-            
-        # 2. Check if we are at capacity
-        if len(history) >= rpm_limit:
-            # We hit the limit. Wait until the oldest request falls out of the 60s window.
-            oldest_request_time = history[0]
-            wait_time = 60 - (now - oldest_request_time) + 0.5 # Add small buffer
-            
-            if wait_time > 0:
-                print(f"⏳ Rate Limit ({rpm_limit} RPM) hit for {model_id}. Waiting {wait_time:.1f}s...")
-                time.sleep(wait_time)
-                
-                # After waiting, re-fetch time and clean up to ensure state is correct
-                now = time.time()
-                while history and history[0] < now - 60:
-                    history.popleft()
-        
-        # 3. Record this request
-        self.request_history[model_id].append(time.time())
+    async def async_wait_for_slot(self, model_id: str, rpm_limit: int):
+        """
+        Async variant of wait_for_slot that yields to the event loop instead of sleeping the thread.
+        """
+        await self.async_acquire(model_id, ModelLimits(rpm=rpm_limit))
+
+    def _effective(self, model_id: str, limits) -> ModelLimits:
+        limits = _as_limits(limits)
+        return self.adaptive.limits(model_id, limits) if self.adaptive else limits
+
+    def observe(self, model_id: str, status_code: int, headers=None):
+        """
+        Reports a provider response so adaptive limits can learn from it (no-op without them).
+        Successes only grow the limit while it is being pressed: within a window of a request
+        that had to wait, or was admitted near the RPM limit.
+        """
+        if self.adaptive is None or status_code is None:
+            return
+        with self._lock:
+            pressed_at = self._pressed_at.get(model_id)
+        pressed = pressed_at is not None and time.monotonic() - pressed_at < self.window
+        self.adaptive.observe(model_id, limits_for(model_id), status_code, headers, pressed)
+
+    @staticmethod
+    def _describe(limits: ModelLimits) -> str:
+        parts = [f"{limits.rpm} RPM" if limits.rpm else "", f"{limits.tpm} TPM" if limits.tpm else "",
+                 f"{limits.max_in_flight} in flight" if limits.max_in_flight else ""]
+        return ", ".join(p for p in parts if p)
+
+    def queue_depth(self, model_id: str) -> int:
+        """How many callers are currently waiting for a slot on this model."""
+        state = self._model(model_id)
+        with state.lock:
+            return len(state.waiters)
+
+    def queue_snapshot(self) -> dict:
+        """Per-model view of who is waiting: depth, counts by priority class and session, oldest wait."""
+        now = time.monotonic()
+        with self._lock:
+            states = list(self._windows.values())
+        snapshot = {}
+        for state in states:
+            with state.lock:
+                waiters = list(state.waiters)
+            if not waiters:
+                continue
+            by_priority, by_session = {}, {}
+            for waiter in waiters:
+                by_priority[waiter.priority] = by_priority.get(waiter.priority, 0) + 1
+                by_session[waiter.session] = by_session.get(waiter.session, 0) + 1
+            snapshot[state.model_id] = {
+                "depth": len(waiters),
+                "by_priority": by_priority,
+                "by_session": by_session,
+                "oldest_wait_seconds": round(now - min(w.enqueued_at for w in waiters), 3),
+            }
+        return snapshot
 
 # Global singleton instance
-GLOBAL_RATE_LIMITER = RateLimiter()
+GLOBAL_RATE_LIMITER = RateLimiter(
+    backend=default_backend(),
+    adaptive=AdaptiveLimits(AIMD_STATE_PATH) if AIMD_ENABLED else None,
+)
@@ -0,0 +1,330 @@
+"""Resilience Policy.
+
+Shared policy engine for LLM calls: per-call deadlines, backoff that honours
+Retry-After and rate-limit headers, per-model circuit breakers and an ordered
+fallback chain drawn from the complexity levels in config. A degraded model
+costs a fast failover to the next model instead of minutes of sleeping.
+"""
+
+import asyncio
+import contextlib
+import random
+import re
+import threading
+import time
+from email.utils import parsedate_to_datetime
+
+from research_agent.config import (
+    CIRCUIT_FAILURE_THRESHOLD,
+    CIRCUIT_RESET_SECONDS,
+    DEFAULT_FALLBACKS,
+    FAILOVER_AFTER_SECONDS,
+    FALLBACK_CHAINS,
+    LLM_BACKOFF_BASE,
+    LLM_BACKOFF_MAX,
+    LLM_CALL_DEADLINE,
+    LLM_MAX_ATTEMPTS,
+)
+from research_agent.metrics import record_retry
+
+
+# --- ERRORS ---
+class LLMCallError(Exception):
+    """Base error for an LLM call that could not produce a result."""
+
+    def __init__(self, message: str, model_id: str = None, retry_after: float = None, status_code: int = None):
+        super().__init__(message)
+        self.model_id = model_id
+        self.retry_after = retry_after
+        self.status_code = status_code
+
+
+class RetryableError(LLMCallError):
+    """Transient failure (429, 5xx, timeout, dropped connection) worth retrying."""
+
+
+class FatalError(LLMCallError):
+    """Failure that retrying the same model will not fix (bad request, auth, missing key)."""
+
+
+class CircuitOpenError(LLMCallError):
+    """The model's circuit breaker is open, so the call was not attempted."""
+
+
+class DeadlineExceeded(LLMCallError):
+    """The call's overall deadline ran out before any model answered."""
+
+
+RETRYABLE_STATUS_CODES = {408, 409, 425, 429, 500, 502, 503, 504}
+
+
+def error_for_status(status_code: int, body: str, model_id: str, headers=None) -> LLMCallError:
+    """Maps an HTTP error response onto the retryable/fatal error types."""
+    message = f"HTTP {status_code} from {model_id}: {body[:500]}"
+    if status_code in RETRYABLE_STATUS_CODES:
+        return RetryableError(message, model_id, retry_after_seconds(headers or {}), status_code)
+    return FatalError(message, model_id, status_code=status_code)
+
+
+# --- BACKOFF ---
+_DURATION_PART = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+_DURATION_UNITS = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+
+
+def _parse_duration(value: str):
+    """Parses durations like '20s', '1m30s' or '250ms'; returns seconds or None."""
+    parts = _DURATION_PART.findall(value)
+    if not parts:
+        return None
+    return sum(float(amount) * _DURATION_UNITS[unit] for amount, unit in parts)
+
+
+def retry_after_seconds(headers, now: float = None):
+    """
+    Extracts how long the provider asked us to wait, in seconds, or None.
+
+    Understands Retry-After (seconds or HTTP date), X-RateLimit-Reset
+    (epoch seconds or milliseconds, as OpenRouter sends it) and
+    x-ratelimit-reset-requests/-tokens durations.
+    """
+    now = time.time() if now is None else now
+    lowered = {str(k).lower(): str(v) for k, v in dict(headers).items()}
+
+    retry_after = lowered.get("retry-after")
+    if retry_after:
+        try:
+            return max(0.0, float(retry_after))
+        except ValueError:
+            try:
+                return max(0.0, parsedate_to_datetime(retry_after).timestamp() - now)
+            except (TypeError, ValueError):
+                pass
+
+    reset = lowered.get("x-ratelimit-reset")
+    if reset:
+        try:
+            value = float(reset)
+            if value > 1e12:  # epoch milliseconds
+                value /= 1000
+            return max(0.0, value - now) if value > 1e9 else max(0.0, value)
+        except ValueError:
+            duration = _parse_duration(reset)
+            if duration is not None:
+                return duration
+
+    for key in ("x-ratelimit-reset-requests", "x-ratelimit-reset-tokens"):
+        if key in lowered:
+            duration = _parse_duration(lowered[key])
+            if duration is not None:
+                return duration
+    return None
+
+
+def backoff_delay(attempt: int, retry_after: float = None,
+                  base: float = LLM_BACKOFF_BASE, cap: float = LLM_BACKOFF_MAX) -> float:
+    """Provider-requested wait if given, else exponential backoff with full jitter."""
+    if retry_after is not None:
+        return min(retry_after, cap)
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+# --- DEADLINES ---
+class Deadline:
+    """Monotonic deadline shared by every attempt of one logical call."""
+
+    def __init__(self, seconds: float = LLM_CALL_DEADLINE):
+        self.seconds = seconds
+        self.expires_at = time.monotonic() + seconds
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+
+# --- CIRCUIT BREAKERS ---
+class CircuitBreaker:
+    """
+    Per-model breaker: opens after consecutive failures, then lets a single
+    probe through once the reset period has passed (half-open).
+    """
+
+    def __init__(self, failure_threshold: int = CIRCUIT_FAILURE_THRESHOLD,
+                 reset_seconds: float = CIRCUIT_RESET_SECONDS, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.clock = clock
+        self.failures = 0
+        self.opened_at = None
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._state()
+
+    def _state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if self.clock() - self.opened_at >= self.reset_seconds:
+            return "half_open"
+        return "open"
+
+    def allow(self) -> bool:
+        with self._lock:
+            state = self._state()
+            if state == "closed":
+                return True
+            if state == "half_open" and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._probe_in_flight or self.failures >= self.failure_threshold:
+                self.opened_at = self.clock()
+            self._probe_in_flight = False
+
+
+def fallback_chain(model_id: str) -> list:
+    """The requested model followed by its configured fallbacks, without duplicates."""
+    chain = [model_id] + FALLBACK_CHAINS.get(model_id, DEFAULT_FALLBACKS)
+    return list(dict.fromkeys(chain))
+
+
+# --- POLICY ENGINE ---
+class CallPolicy:
+    """
+    Runs an attempt function across a fallback chain under one deadline.
+
+    attempt_fn(model_id, timeout) must return the result or raise an
+    LLMCallError subclass. run() returns (model_id_used, result) and raises the
+    last error once every model in the chain has failed.
+    """
+
+    def __init__(self, max_attempts: int = LLM_MAX_ATTEMPTS,
+                 failover_after: float = FAILOVER_AFTER_SECONDS, sleep=time.sleep):
+        self.max_attempts = max_attempts
+        self.failover_after = failover_after
+        self.sleep = sleep
+        self._breakers = {}
+        self._lock = threading.Lock()
+
+    def breaker(self, model_id: str) -> CircuitBreaker:
+        with self._lock:
+            if model_id not in self._breakers:
+                self._breakers[model_id] = CircuitBreaker()
+            return self._breakers[model_id]
+
+    def _plan_retry(self, error, model_id, attempt, has_fallback, deadline):
+        """Returns seconds to sleep before retrying the same model, or None to move on."""
+        breaker = self.breaker(model_id)
+        if isinstance(error, FatalError) or breaker.state != "closed":
+            return None
+        if attempt + 1 >= self.max_attempts:
+            return None
+        delay = backoff_delay(attempt, error.retry_after)
+        if has_fallback and delay > self.failover_after:
+            print(f"↪️ {model_id} asked us to wait {delay:.1f}s; failing over instead.")
+            return None
+        if delay >= deadline.remaining():
+            return None
+        return delay
+
+    @contextlib.contextmanager
+    def _settle(self, model_id: str):
+        """
+        Settles the model's breaker however an attempt ends, so a half-open probe is always
+        released: a result or a FatalError (the model answered, the request was bad) counts
+        as a success; a transient error, any other exception or a cancelled attempt as a failure.
+        """
+        answered = False
+        try:
+            yield
+            answered = True
+        except FatalError:
+            answered = True
+            raise
+        finally:
+            if answered:
+                self.breaker(model_id).record_success()
+            else:
+                self.breaker(model_id).record_failure()
+
+    def _on_failure(self, error, model_id, attempt, has_fallback, deadline):
+        print(f"⚠️ {model_id} failed (attempt {attempt + 1}/{self.max_attempts}): {error}")
+        delay = self._plan_retry(error, model_id, attempt, has_fallback, deadline)
+        if delay is not None:
+            record_retry(model_id, "retry")
+        elif has_fallback:
+            record_retry(model_id, "failover")
+        return delay
+
+    def run(self, models, attempt_fn, deadline: Deadline = None):
+        deadline = deadline or Deadline()
+        models = list(models)
+        last_error = None
+        for index, model_id in enumerate(models):
+            has_fallback = index < len(models) - 1
+            if not self.breaker(model_id).allow():
+                print(f"⛔ Circuit open for {model_id}; skipping.")
+                last_error = CircuitOpenError(f"Circuit open for {model_id}", model_id)
+                continue
+            for attempt in range(self.max_attempts):
+                if deadline.expired():
+                    raise DeadlineExceeded(f"Deadline of {deadline.seconds}s exceeded", model_id)
+                try:
+                    with self._settle(model_id):
+                        result = attempt_fn(model_id, deadline.remaining())
+                except LLMCallError as e:
+                    last_error = e
+                    delay = self._on_failure(e, model_id, attempt, has_fallback, deadline)
+                    if delay is None:
+                        break
+                    self.sleep(delay)
+                    continue
+                return model_id, result
+        raise last_error or DeadlineExceeded(f"Deadline of {deadline.seconds}s exceeded", models[0])
+
+    async def arun(self, models, attempt_fn, deadline: Deadline = None):
+        """Async variant of run(); attempt_fn must be a coroutine function."""
+        deadline = deadline or Deadline()
+        models = list(models)
+        last_error = None
+        for index, model_id in enumerate(models):
+            has_fallback = index < len(models) - 1
+            if not self.breaker(model_id).allow():
+                print(f"⛔ Circuit open for {model_id}; skipping.")
+                last_error = CircuitOpenError(f"Circuit open for {model_id}", model_id)
+                continue
+            for attempt in range(self.max_attempts):
+                if deadline.expired():
+                    raise DeadlineExceeded(f"Deadline of {deadline.seconds}s exceeded", model_id)
+                try:
+                    with self._settle(model_id):
+                        result = await asyncio.wait_for(attempt_fn(model_id, deadline.remaining()), deadline.remaining())
+                except asyncio.TimeoutError:
+                    raise DeadlineExceeded(f"Deadline of {deadline.seconds}s exceeded", model_id)
+                except LLMCallError as e:
+                    last_error = e
+                    delay = self._on_failure(e, model_id, attempt, has_fallback, deadline)
+                    if delay is None:
+                        break
+                    await asyncio.sleep(delay)
+                    continue
+                return model_id, result
+        raise last_error or DeadlineExceeded(f"Deadline of {deadline.seconds}s exceeded", models[0])
+
+
+# Global singleton instance
+GLOBAL_CALL_POLICY = CallPolicy()
@@ -1,4 +1,5 @@
-from research_agent.clients import call_openrouter
+from research_agent.clients import call_openrouter, call_site_max_tokens
+from research_agent.resilience import LLMCallError
 
 def decide_complexity(query: str) -> int:
     """
@@ -21,13 +22,14 @@ def decide_complexity(query: str) -> int:
     """
     
     # Use a fast model for routing (e.g., Llama 3 8B or Mistral)
-    result = call_openrouter(router_prompt, "meta-llama/llama-3.2-3b-instruct:free")
-    
     try:
-        if "Error" in result:
-            print(f"Router Error: {result}")
-            return 3 # Default to intermediate
+        result = call_openrouter(router_prompt, "meta-llama/llama-3.2-3b-instruct:free",
+                                 max_tokens=call_site_max_tokens("router"))
+    except LLMCallError as e:
+        print(f"Router Error: {e}")
+        return 3 # Default to intermediate
 
+    try:
         level = int(result.strip())
         # Clamp between 1 and 5
         return max(1, min(5, level))
@@ -0,0 +1,87 @@
+"""Request Scheduling Context.
+
+Tags each LLM call with a priority class and the session (user) it serves, so
+the rate limiter can admit queued calls by priority first and fairly across
+sessions second. The priority follows the graph node the call runs under
+unless a caller sets one explicitly; apps set the session once per user.
+"""
+
+import contextlib
+import contextvars
+
+from research_agent.config import DEFAULT_PRIORITY, DEFAULT_SESSION, NODE_PRIORITIES, PRIORITY_CLASSES
+from research_agent.metrics import current_node
+
+_NO_SESSION = (DEFAULT_SESSION, 1.0)
+_priority = contextvars.ContextVar("llm_priority", default=None)
+_session = contextvars.ContextVar("llm_session", default=_NO_SESSION)
+
+
+def priority_rank(priority: str) -> int:
+    """Position of a class in PRIORITY_CLASSES (0 is served first); unknown classes rank last."""
+    try:
+        return PRIORITY_CLASSES.index(priority)
+    except ValueError:
+        return len(PRIORITY_CLASSES)
+
+
+def current_priority() -> str:
+    """The explicit priority if one is set, else the one mapped from the current graph node."""
+    return _priority.get() or NODE_PRIORITIES.get(current_node(), DEFAULT_PRIORITY)
+
+
+def current_session() -> tuple:
+    """(session_id, weight) of the user the current call serves."""
+    return _session.get()
+
+
+def _reset(var, token, default):
+    try:
+        var.reset(token)
+    except ValueError:
+        # A generator resumed from another thread's context; put the old value back instead
+        var.set(default if token.old_value is contextvars.Token.MISSING else token.old_value)
+
+
+@contextlib.contextmanager
+def priority_scope(priority: str):
+    """Runs the block's LLM calls in this priority class, whatever node they run under."""
+    if priority not in PRIORITY_CLASSES:
+        raise ValueError(f"Unknown priority class {priority!r}; expected one of {PRIORITY_CLASSES}")
+    token = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _reset(_priority, token, None)
+
+
+@contextlib.contextmanager
+def session_scope(session_id: str, weight: float = 1.0):
+    """Attributes the block's LLM calls to a session; a weight of 2 gets twice the share of a contended model."""
+    token = set_session(session_id, weight)
+    try:
+        yield
+    finally:
+        _reset(_session, token, _NO_SESSION)
+
+
+def set_session(session_id: str, weight: float = 1.0):
+    """Sets the session for the rest of the current context (e.g. a Streamlit script run)."""
+    if weight <= 0:
+        raise ValueError("Session weight must be positive")
+    return _session.set((str(session_id), float(weight)))
+
+
+def iterate_in_session(session_id: str, iterable, weight: float = 1.0):
+    """
+    Yields from iterable with every step running in the session. For generators that UI
+    frameworks advance from worker threads, where a scope around the loop would not apply.
+    """
+    iterator = iter(iterable)
+    while True:
+        with session_scope(session_id, weight):
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+        yield item
@@ -0,0 +1,220 @@
+"""Ensemble Scoreboard.
+
+Persistent per-model record of how ensemble members perform: call latency,
+error rate, and how often the meta-judge picked or used each member's answer
+per query class. ensemble_query asks it which members to call, so a model that
+is slow or keeps losing stops being paid for, while occasional exploration
+keeps the scores of the others current.
+"""
+
+import json
+import os
+import random
+import re
+import sqlite3
+import threading
+
+from research_agent.config import (
+    ENSEMBLE_COST_BUDGET,
+    ENSEMBLE_EXPLORE_RATE,
+    ENSEMBLE_LATENCY_BUDGET,
+    ENSEMBLE_MIN_SAMPLES,
+    ENSEMBLE_MODEL_COSTS,
+    ENSEMBLE_SCOREBOARD_PATH,
+    ENSEMBLE_SIZE,
+    HEDGE_LATENCY_WINDOW,
+)
+from research_agent.hedging import LatencyTracker
+from research_agent.text_utils import FINANCIAL_TERMS
+from research_agent.new_config import ENSEMBLE_CANDIDATES
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS member_health (
+    model TEXT PRIMARY KEY,
+    calls INTEGER NOT NULL,
+    errors INTEGER NOT NULL,
+    latencies TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS member_quality (
+    model TEXT NOT NULL,
+    query_class TEXT NOT NULL,
+    judged INTEGER NOT NULL,
+    picked INTEGER NOT NULL,
+    used INTEGER NOT NULL,
+    PRIMARY KEY (model, query_class)
+);
+"""
+
+_FIGURES = re.compile(r"\d|%")
+
+
+def query_class(query: str) -> str:
+    """"quantitative" for questions about figures and financial metrics, else "qualitative"."""
+    return "quantitative" if _FIGURES.search(query) or FINANCIAL_TERMS.search(query) else "qualitative"
+
+
+class EnsembleScoreboard:
+    """
+    Ranks ensemble candidates per query class. Quality is the Laplace-smoothed share of
+    judged queries where the member's answer was picked (1) or used (0.5); reliability is
+    the smoothed share of calls that succeeded. With a path, scores persist in SQLite.
+    """
+
+    def __init__(self, path: str = None, candidates=None, size: int = ENSEMBLE_SIZE,
+                 latency_budget: float = ENSEMBLE_LATENCY_BUDGET, cost_budget: float = ENSEMBLE_COST_BUDGET,
+                 costs: dict = None, explore_rate: float = ENSEMBLE_EXPLORE_RATE,
+                 min_samples: int = ENSEMBLE_MIN_SAMPLES, rng: random.Random = None):
+        self.path = path
+        self.candidates = list(candidates or ENSEMBLE_CANDIDATES)
+        self.size = size
+        self.latency_budget = latency_budget
+        self.cost_budget = cost_budget
+        self.costs = costs or ENSEMBLE_MODEL_COSTS
+        self.explore_rate = explore_rate
+        self.min_samples = min_samples
+        self.rng = rng or random.Random()
+        self.latency = LatencyTracker(HEDGE_LATENCY_WINDOW)
+        self._health = {}   # model -> {"calls", "errors"}
+        self._quality = {}  # (model, query_class) -> {"judged", "picked", "used"}
+        self._lock = threading.Lock()
+        self._conn = None
+        self._loaded = False
+
+    # --- persistence ---
+    def _connection(self):
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False, isolation_level=None)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript(_SCHEMA)
+        return self._conn
+
+    def _load(self):
+        """Called with the lock held: reads the persisted scores on first use."""
+        if self._loaded:
+            return
+        self._loaded = True
+        if not self.path:
+            return
+        conn = self._connection()
+        for model, calls, errors, latencies in conn.execute("SELECT * FROM member_health"):
+            self._health[model] = {"calls": calls, "errors": errors}
+            for seconds in json.loads(latencies):
+                self.latency.record(model, seconds)
+        for model, klass, judged, picked, used in conn.execute("SELECT * FROM member_quality"):
+            self._quality[(model, klass)] = {"judged": judged, "picked": picked, "used": used}
+
+    def _save_health(self, model_id: str):
+        if self.path:
+            health = self._health[model_id]
+            samples = self.latency.samples(model_id)
+            self._connection().execute(
+                "INSERT OR REPLACE INTO member_health VALUES (?, ?, ?, ?)",
+                (model_id, health["calls"], health["errors"], json.dumps(samples)),
+            )
+
+    def _save_quality(self, model_id: str, klass: str):
+        if self.path:
+            quality = self._quality[(model_id, klass)]
+            self._connection().execute(
+                "INSERT OR REPLACE INTO member_quality VALUES (?, ?, ?, ?, ?)",
+                (model_id, klass, quality["judged"], quality["picked"], quality["used"]),
+            )
+
+    # --- recording ---
+    def record_call(self, model_id: str, seconds: float, ok: bool):
+        """One worker call: its latency (timeouts included, as a lower bound) and whether it succeeded."""
+        with self._lock:
+            self._load()
+            health = self._health.setdefault(model_id, {"calls": 0, "errors": 0})
+            health["calls"] += 1
+            health["errors"] += 0 if ok else 1
+            self.latency.record(model_id, seconds)
+            self._save_health(model_id)
+
+    def record_outcome(self, klass: str, picked: str = None, used=(), unused=()):
+        """
+        One decided query: the member whose answer became the final one (None if the judge wrote
+        its own), the others the final answer drew on, and those it ignored.
+        """
+        with self._lock:
+            self._load()
+            for model_id in [picked, *used, *unused]:
+                if model_id is None:
+                    continue
+                quality = self._quality.setdefault((model_id, klass), {"judged": 0, "picked": 0, "used": 0})
+                quality["judged"] += 1
+                if model_id == picked:
+                    quality["picked"] += 1
+                elif model_id in used:
+                    quality["used"] += 1
+                self._save_quality(model_id, klass)
+
+    # --- selection ---
+    def score(self, model_id: str, klass: str) -> float:
+        with self._lock:
+            self._load()
+            return self._score(model_id, klass)
+
+    def _score(self, model_id: str, klass: str) -> float:
+        quality = self._quality.get((model_id, klass), {"judged": 0, "picked": 0, "used": 0})
+        health = self._health.get(model_id, {"calls": 0, "errors": 0})
+        won = quality["picked"] + 0.5 * quality["used"]
+        return (won + 1) / (quality["judged"] + 2) * (health["calls"] - health["errors"] + 1) / (health["calls"] + 2)
+
+    def _too_slow(self, model_id: str) -> bool:
+        if self.latency.count(model_id) < self.min_samples:
+            return False
+        return self.latency.percentile(model_id, 90) > self.latency_budget
+
+    def select(self, klass: str) -> list:
+        """
+        The members to ask for a query of this class, best first. Candidates over the latency
+        budget are skipped (unless too few would be left); the chosen members' costs must fit
+        the cost budget. With probability explore_rate the last slot goes to a random outsider.
+        """
+        with self._lock:
+            self._load()
+            ranked = sorted(self.candidates, key=lambda m: -self._score(m, klass))  # Stable: config order breaks ties
+        fast = [m for m in ranked if not self._too_slow(m)]
+        if len(fast) < min(2, len(ranked)):
+            fast = sorted(ranked, key=lambda m: self.latency.percentile(m, 90) or 0.0)[:2]
+
+        members, spent = [], 0.0
+        for model_id in fast:
+            cost = self.costs.get(model_id, self.costs.get("default", 1.0))
+            if len(members) < self.size and spent + cost <= self.cost_budget:
+                members.append(model_id)
+                spent += cost
+
+        outsiders = [m for m in self.candidates if m not in members]
+        if members and outsiders and self.rng.random() < self.explore_rate:
+            explored = self.rng.choice(outsiders)
+            print(f"   🔭 Exploring {explored} in place of {members[-1]}")
+            members[-1] = explored
+        return members
+
+    def snapshot(self) -> dict:
+        """Per-model health and per-class quality, for dashboards and debugging."""
+        with self._lock:
+            self._load()
+            models = set(self.candidates) | set(self._health) | {m for m, _ in self._quality}
+            return {
+                model_id: {
+                    "calls": self._health.get(model_id, {}).get("calls", 0),
+                    "errors": self._health.get(model_id, {}).get("errors", 0),
+                    "p50_seconds": self.latency.percentile(model_id, 50),
+                    "p90_seconds": self.latency.percentile(model_id, 90),
+                    "classes": {
+                        klass: dict(stats, score=round(self._score(model_id, klass), 3))
+                        for (m, klass), stats in self._quality.items() if m == model_id
+                    },
+                }
+                for model_id in sorted(models)
+            }
+
+
+# Global singleton instance
+GLOBAL_SCOREBOARD = EnsembleScoreboard(ENSEMBLE_SCOREBOARD_PATH)
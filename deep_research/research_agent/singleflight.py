@@ -0,0 +1,139 @@
+"""Single-Flight Coalescing.
+
+Concurrent identical requests (same function, same arguments) share one
+upstream call: the first caller does the work and everyone who arrives while
+it is in flight waits for, and receives, the same result or exception.
+Nothing is remembered once the call finishes; that is the response cache's job.
+"""
+
+import asyncio
+import functools
+import hashlib
+import inspect
+import json
+import threading
+import weakref
+
+from research_agent.config import SINGLE_FLIGHT_ENABLED
+
+
+class _Call:
+    __slots__ = ("event", "result", "error")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Registry of in-flight calls keyed by request identity.
+    Sync calls coalesce across threads; async calls coalesce within one event loop.
+    """
+
+    def __init__(self):
+        self.coalesced = 0
+        self._calls = {}
+        self._async_calls = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+
+    def do(self, key: str, fn):
+        """Runs fn() unless an identical call is already in flight, in which case waits for its result."""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.event.set()
+
+    async def ado(self, key: str, coro_fn):
+        """Async variant of do(); coro_fn() must return an awaitable."""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            calls = self._async_calls.setdefault(loop, {})
+            task = calls.get(key)
+            if task is None:
+                task = calls[key] = loop.create_task(coro_fn())
+                task.add_done_callback(lambda _: calls.pop(key, None))
+            else:
+                self.coalesced += 1
+        # Shielded so one impatient caller cancelling does not cancel everyone else's result
+        return await asyncio.shield(task)
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._calls) + sum(len(calls) for calls in self._async_calls.values())
+
+    def stats(self) -> dict:
+        return {"in_flight": self.in_flight(), "coalesced": self.coalesced}
+
+
+# Global singleton instance
+GLOBAL_SINGLE_FLIGHT = SingleFlight()
+
+
+def flight_key(namespace: str, arguments: dict):
+    """
+    Stable key for a call, or None when an argument is not plain JSON data
+    (callbacks, deadlines, ...), which opts that call out of coalescing.
+    """
+    try:
+        payload = json.dumps({"ns": namespace, "args": arguments}, sort_keys=True, ensure_ascii=False)
+    except (TypeError, ValueError):
+        return None
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def coalesce(namespace: str):
+    """
+    Decorator that routes a sync or async function through GLOBAL_SINGLE_FLIGHT.
+    Arguments are normalised through the signature, so positional and keyword
+    spellings of the same call share one flight.
+    """
+    def decorator(fn):
+        signature = inspect.signature(fn)
+
+        def key_for(args, kwargs):
+            if not SINGLE_FLIGHT_ENABLED:
+                return None
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            return flight_key(namespace, bound.arguments)
+
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                key = key_for(args, kwargs)
+                if key is None:
+                    return await fn(*args, **kwargs)
+                return await GLOBAL_SINGLE_FLIGHT.ado(key, lambda: fn(*args, **kwargs))
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            key = key_for(args, kwargs)
+            if key is None:
+                return fn(*args, **kwargs)
+            return GLOBAL_SINGLE_FLIGHT.do(key, lambda: fn(*args, **kwargs))
+        return wrapper
+
+    return decorator
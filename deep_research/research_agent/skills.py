@@ -9,6 +9,10 @@ domain knowledge.
 from langchain_core.tools import tool
 import json
 
+from research_agent.config import TOOL_LIMITS
+from research_agent.ensemble import ensemble_query
+from research_agent.tool_registry import register_function, register_tool
+
 # Skill definitions (stored as specialized prompts and knowledge)
 SKILL_LIBRARY = {
     "sec_filing_intelligence": {
@@ -521,6 +525,7 @@ Your task: Conduct pharma sector-specific analysis with regulatory quality empha
     }
 }
 
+@register_tool
 @tool
 def load_skill(skill_name: str) -> str:
     """
@@ -572,5 +577,25 @@ AVAILABLE TOOLS FOR THIS SKILL:
 You are now operating with this specialized skill context.
 """
 
+# Action names the planner is offered (see PLANNER_PROMPT) for skill-driven analysis steps
+SKILL_ALIASES = {
+    "analyze_sec_filing_structure": "sec_filing_intelligence",
+    "assess_competitive_forces": "competitive_positioning",
+    "evaluate_capital_allocation": "capital_allocation",
+    "perform_ratio_analysis": "financial_ratio_diagnostics",
+}
+
+def _skill_analysis(alias: str, skill_name: str):
+    def analyze(query: str, context: str = "") -> str:
+        """Ensemble analysis of the query, primed with the skill's framework."""
+        question = f"{alias.replace('_', ' ').capitalize()}: {query}"
+        return ensemble_query(question, f"{load_skill.invoke({'skill_name': skill_name})}\n\n{context}")
+    return analyze
+
+# Each alias is a tool of its own, with the ensemble's limits
+for _alias, _skill_name in SKILL_ALIASES.items():
+    register_function(_alias, _skill_analysis(_alias, _skill_name),
+                      f"{SKILL_LIBRARY[_skill_name]['description']} (ensemble analysis)", **TOOL_LIMITS["ensemble_query"])
+
 # Export
-__all__ = ['load_skill', 'SKILL_LIBRARY']
+__all__ = ['load_skill', 'SKILL_LIBRARY', 'SKILL_ALIASES']
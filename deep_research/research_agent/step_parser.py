@@ -0,0 +1,108 @@
+"""Step Parser.
+
+Reads a tool call straight out of a plan step. The planner already writes most
+steps as "<tool> <arguments>" ("get_company_fundamentals TCS.NS", "tavily_search
+TCS deal wins 2024", "assess_competitive_forces TCS vs Infosys"), so asking the
+executor LLM to restate them as TOOL/ARGS costs a full round trip for nothing.
+parse_step resolves such steps locally and returns None for anything it cannot
+read unambiguously, which is left to the LLM. Registered tools without a parser
+of their own here take the text after their name as their one required argument.
+"""
+
+import json
+import re
+from typing import Optional, Tuple
+
+from research_agent.skills import SKILL_ALIASES, SKILL_LIBRARY
+from research_agent.tool_registry import GLOBAL_TOOL_REGISTRY
+
+_HEAD = re.compile(r"^(?:TOOL:\s*)?([A-Za-z_]+)(?=[\s:(]|$)([\s:(]*)(.*)$", re.DOTALL)
+_LIST_MARKER = re.compile(r"^\s*(?:\d+[.)]|[-*•])\s+")
+_TICKER = re.compile(r"^\^?[A-Z0-9][A-Z0-9&\-]*(?:\.[A-Z]{1,4})?(?:=[A-Z])?$")
+_PERIOD = re.compile(r"^(?:\d+(?:d|wk|mo|y)|ytd|max)$", re.IGNORECASE)
+_CONNECTORS = {"vs", "vs.", "versus", "and", "&", "with"}
+
+
+def _is_ticker(token: str) -> bool:
+    return bool(_TICKER.match(token)) and any(c.isalpha() for c in token)
+
+
+def _text(rest: str) -> Optional[dict]:
+    query = rest.strip().strip("\"'`")
+    return {"query": query} if query else None
+
+
+def _fundamentals(rest: str) -> Optional[dict]:
+    tokens = rest.replace(",", " ").split()
+    if len(tokens) == 1 and _is_ticker(tokens[0]):
+        return {"ticker": tokens[0]}
+    return None
+
+
+def _performance(rest: str) -> Optional[dict]:
+    rest = re.sub(r"\bperiod\s*[=:]\s*", "", rest, flags=re.IGNORECASE)
+    tickers, periods = [], []
+    for token in rest.replace(",", " ").split():
+        if token.lower() in _CONNECTORS:
+            continue
+        if _PERIOD.match(token):
+            periods.append(token.lower())
+        elif _is_ticker(token):
+            tickers.append(token)
+        else:
+            return None  # Prose ("last five years", "IT majors"): let the LLM interpret it
+    if not tickers or len(periods) > 1:
+        return None
+    return {"tickers": " ".join(tickers), **({"period": periods[0]} if periods else {})}
+
+
+def _skill(rest: str) -> Optional[dict]:
+    name = rest.strip().strip("\"'`")
+    name = SKILL_ALIASES.get(name, name)
+    return {"skill_name": name} if name in SKILL_LIBRARY else None
+
+
+# Tool name -> parser of the free-text arguments that follow it (None when ambiguous)
+STEP_TOOLS = {
+    "tavily_search": _text,
+    "get_company_fundamentals": _fundamentals,
+    "get_historical_performance": _performance,
+    "ensemble_query": _text,
+    "load_skill": _skill,
+}
+
+
+def _generic(tool_name: str, rest: str) -> Optional[dict]:
+    """Any other registered tool with exactly one required argument gets the rest of the step."""
+    spec = GLOBAL_TOOL_REGISTRY.get(tool_name)
+    if spec is None or len(spec.required) != 1:
+        return None
+    value = rest.strip().strip("\"'`")
+    return {spec.required[0]: value} if value else None
+
+
+def parse_step(step: str) -> Optional[Tuple[str, dict]]:
+    """
+    (tool_name, args) for a step of the form "<tool> <arguments>", "<tool>(<arguments>)",
+    "<tool> {json args}" or "TOOL: <tool> ARGS: <json>"; None if the step is prose or its
+    arguments are ambiguous. Skill aliases such as assess_competitive_forces are registered tools too.
+    """
+    match = _HEAD.match(_LIST_MARKER.sub("", step.strip()))
+    if not match:
+        return None
+    tool_name, separator, rest = match.group(1).lower(), match.group(2), match.group(3).strip()
+    if tool_name not in STEP_TOOLS and tool_name not in GLOBAL_TOOL_REGISTRY:
+        return None
+    if "(" in separator and rest.endswith(")"):
+        rest = rest[:-1].strip()
+    rest = re.sub(r"^ARGS:\s*", "", rest)
+
+    if rest.startswith("{"):
+        try:
+            args = json.loads(rest)
+        except json.JSONDecodeError:
+            return None
+        return (tool_name, args) if isinstance(args, dict) and args else None
+
+    args = STEP_TOOLS[tool_name](rest) if tool_name in STEP_TOOLS else _generic(tool_name, rest)
+    return (tool_name, args) if args else None
@@ -0,0 +1,199 @@
+"""OpenRouter Stand-in Server.
+
+A small local HTTP server speaking the OpenRouter chat-completions protocol
+(plain JSON and SSE streaming, with `usage`), for offline benchmarks and
+integration tests. Point the clients at it with
+OPENROUTER_BASE_URL=http://127.0.0.1:8765/api/v1.
+
+    python -m research_agent.stub_server --latency 0.5 --token-delay 0.01
+    python -m research_agent.stub_server --cassette .cache/cassette.jsonl
+
+Without a cassette every completion is a deterministic echo of the prompt;
+with one, recorded OpenRouter responses are served back for matching requests.
+"""
+
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from research_agent.cassette import Cassette, CassetteMiss
+from research_agent.config import STUB_SERVER_HOST, STUB_SERVER_PORT
+
+API_PREFIX = "/api/v1"
+
+
+def echo_responder(payload: dict) -> str:
+    """Default answer: names the model and echoes the start of the last user message."""
+    messages = payload.get("messages") or [{}]
+    prompt = " ".join(str(messages[-1].get("content", "")).split())
+    return f"[stub:{payload.get('model', 'unknown')}] {prompt[:200]}"
+
+
+def _usage(payload: dict, text: str) -> dict:
+    prompt_tokens = sum(len(str(m.get("content", "")).split()) for m in payload.get("messages", []))
+    completion_tokens = len(text.split())
+    return {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "total_tokens": prompt_tokens + completion_tokens,
+    }
+
+
+def _sse_tokens(text: str) -> list:
+    """Splits an answer into word-sized stream deltas that join back to the exact text."""
+    words = text.split(" ")
+    return [word + (" " if i < len(words) - 1 else "") for i, word in enumerate(words)]
+
+
+class StubOpenRouter:
+    """
+    Threaded stand-in for OpenRouter. Use as a context manager, or start()/stop().
+
+    latency: seconds before the first byte of every completion
+    token_delay: seconds between streamed tokens
+    responder: payload -> answer text (defaults to echo_responder)
+    cassette: replay-mode Cassette whose recorded OpenRouter exchanges take precedence
+    """
+
+    def __init__(self, host: str = STUB_SERVER_HOST, port: int = 0, latency: float = 0.0,
+                 token_delay: float = 0.0, responder=None, cassette: Cassette = None):
+        self.latency = latency
+        self.token_delay = token_delay
+        self.responder = responder or echo_responder
+        self.cassette = cassette
+        self.requests = []
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}{API_PREFIX}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name="stub-openrouter", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _handler_class(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # keep-alive, so pooled clients behave as they do in production
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_HEAD(self):
+                self.send_response(200)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                if not self.path.endswith("/chat/completions"):
+                    return self._send_json(404, {"error": {"code": 404, "message": f"No route for {self.path}"}})
+                try:
+                    payload = json.loads(body)
+                except json.JSONDecodeError:
+                    return self._send_json(400, {"error": {"code": 400, "message": "Body is not JSON"}})
+                stub.requests.append(payload)
+                time.sleep(stub.latency)
+
+                recorded = stub._recorded(self.path, payload)
+                if recorded is not None:
+                    return self._send_raw(recorded)
+                text = stub.responder(payload)
+                if payload.get("stream"):
+                    return self._send_stream(payload, text)
+                return self._send_json(200, {
+                    "id": "stub-completion",
+                    "model": payload.get("model"),
+                    "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+                    "usage": _usage(payload, text),
+                })
+
+            def _send_json(self, status: int, data: dict):
+                encoded = json.dumps(data).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(encoded)))
+                self.end_headers()
+                self.wfile.write(encoded)
+
+            def _send_raw(self, response: dict):
+                encoded = response["body"].encode("utf-8")
+                self.send_response(response["status_code"])
+                for key, value in response["headers"].items():
+                    self.send_header(key, value)
+                self.send_header("Content-Length", str(len(encoded)))
+                self.end_headers()
+                self.wfile.write(encoded)
+
+            def _send_stream(self, payload: dict, text: str):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                self._chunk(": OPENROUTER PROCESSING\n\n")
+                for token in _sse_tokens(text):
+                    delta = {"choices": [{"index": 0, "delta": {"content": token}}]}
+                    self._chunk(f"data: {json.dumps(delta)}\n\n")
+                    time.sleep(stub.token_delay)
+                final = {"choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}], "usage": _usage(payload, text)}
+                self._chunk(f"data: {json.dumps(final)}\n\n")
+                self._chunk("data: [DONE]\n\n")
+                self.wfile.write(b"0\r\n\r\n")
+
+            def _chunk(self, data: str):
+                encoded = data.encode("utf-8")
+                self.wfile.write(f"{len(encoded):x}\r\n".encode("ascii") + encoded + b"\r\n")
+                self.wfile.flush()
+
+        return Handler
+
+    def _recorded(self, path: str, payload: dict):
+        if self.cassette is None:
+            return None
+        try:
+            entry = self.cassette.next("http", {"method": "POST", "path": path, "body": payload})
+        except CassetteMiss:
+            return None
+        return entry.get("response")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stand-in for the OpenRouter chat-completions API.")
+    parser.add_argument("--host", default=STUB_SERVER_HOST)
+    parser.add_argument("--port", type=int, default=STUB_SERVER_PORT)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds before each completion starts")
+    parser.add_argument("--token-delay", type=float, default=0.0, help="Seconds between streamed tokens")
+    parser.add_argument("--cassette", help="Serve recorded OpenRouter responses from this cassette")
+    args = parser.parse_args()
+
+    cassette = Cassette(args.cassette, mode="replay") if args.cassette else None
+    stub = StubOpenRouter(args.host, args.port, args.latency, args.token_delay, cassette=cassette)
+    print(f"🧪 Stub OpenRouter listening on {stub.base_url}")
+    try:
+        stub._server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stub._server.server_close()
+
+
+if __name__ == "__main__":
+    main()
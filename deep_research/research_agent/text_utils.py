@@ -0,0 +1,101 @@
+"""Text Utilities.
+
+Plain text helpers shared by the clients, the ensemble and the executor's
+context index: token counting and truncation, word and sentence splitting,
+stripping chat boilerplate from model answers, and the financial vocabulary
+that marks a question or a sentence as being about figures. Nothing here
+calls a model, so any module can import it without the client stack.
+"""
+
+import math
+import re
+import threading
+
+# --- TOKENS ---
+# tiktoken's BPE files are fetched on first use; offline we fall back to a
+# conservative characters-per-token estimate rather than failing the call.
+CHARS_PER_TOKEN = 3.5
+TRUNCATION_MARKER = "...(truncated)"
+
+_encoder = None
+_encoder_loaded = False
+_encoder_lock = threading.Lock()
+
+
+def _get_encoder():
+    """Returns a tiktoken encoding, or None when tiktoken or its BPE files are unavailable."""
+    global _encoder, _encoder_loaded
+    if not _encoder_loaded:
+        with _encoder_lock:
+            if not _encoder_loaded:
+                try:
+                    import tiktoken
+                    _encoder = tiktoken.get_encoding("cl100k_base")
+                except Exception as e:
+                    print(f"⚠️ tiktoken unavailable ({type(e).__name__}); estimating tokens from characters.")
+                    _encoder = None
+                _encoder_loaded = True
+    return _encoder
+
+
+def count_tokens(text: str) -> int:
+    """Approximate prompt size in tokens (cl100k is close enough across our open models)."""
+    if not text:
+        return 0
+    encoder = _get_encoder()
+    if encoder is None:
+        return math.ceil(len(text) / CHARS_PER_TOKEN)
+    return len(encoder.encode(text, disallowed_special=()))
+
+
+def truncate_to_tokens(text: str, limit: int, marker: str = TRUNCATION_MARKER) -> str:
+    """Cuts text to at most `limit` tokens, marker included."""
+    if count_tokens(text) <= limit:
+        return text
+    keep = max(0, limit - count_tokens(marker))
+    encoder = _get_encoder()
+    if encoder is None:
+        return text[:int(keep * CHARS_PER_TOKEN)] + marker
+    return encoder.decode(encoder.encode(text, disallowed_special=())[:keep]) + marker
+
+
+# --- WORDS AND SENTENCES ---
+_WORD = re.compile(r"[a-z0-9]+")
+_OPENING = re.compile(
+    r"(?:(?:sure|certainly|of course|absolutely|great question)\b[^.!?\n]*[.!?:]|here(?:'s| is| are)\b[^\n]*:)\s*",
+    re.IGNORECASE,
+)
+_CLOSING = re.compile(r"\s*(?:i hope (?:this|that) helps|let me know if|feel free to|as an ai\b)[^\n]*$", re.IGNORECASE)
+_SENTENCE = re.compile(r"(?:[^.!?\n]|[.!?](?![\s*_)\]]|$))+[.!?]*")
+
+# Financial metrics; a question or sentence naming one is about figures
+FINANCIAL_TERMS = re.compile(
+    r"\b(revenue|profit|margin|ratio|growth|valuation|eps|p/e|cagr|debt|cash ?flow|earnings|price|returns?|"
+    r"guidance|dividend|market cap|ebitda|roe|roce|headcount|attrition)\b",
+    re.IGNORECASE,
+)
+
+
+def words(text: str) -> list:
+    """Lower-cased alphanumeric words, in order; "TCS.NS" gives "tcs" and "ns"."""
+    return _WORD.findall(text.lower())
+
+
+def strip_boilerplate(text: str) -> str:
+    """Drops conversational openers ("Sure! Here is...:") and sign-offs ("I hope this helps")."""
+    text = text.strip()
+    match = _OPENING.match(text)
+    while match and match.end():
+        text = text[match.end():]
+        match = _OPENING.match(text)
+    match = _CLOSING.search(text)
+    while match:
+        text = text[:match.start()]
+        match = _CLOSING.search(text)
+    return text.strip()
+
+
+def split_sentences(text: str) -> list:
+    """The sentences of an answer, without list markers, as they appear in the text."""
+    sentences = (m.group().strip().lstrip("-*• ").strip() for m in _SENTENCE.finditer(text))
+    return [sentence for sentence in sentences if sentence]
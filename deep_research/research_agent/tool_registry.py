@@ -0,0 +1,174 @@
+"""Tool Registry.
+
+Every tool in research_agent registers here with an argument schema, a timeout,
+a concurrency cap and a cost class (limits come from TOOL_LIMITS in config).
+Registration wraps the tool's function, so every call is bounded and timed
+however it is made: through ToolRegistry.call (the executor's dispatch), a
+direct .invoke(), or an agent that had the tool bound. New tools plug into plan
+execution by registering; the orchestrator looks them up by name.
+"""
+
+import contextvars
+import functools
+import inspect
+import threading
+import time
+
+from research_agent.config import TOOL_LIMITS
+from research_agent.metrics import is_error_result, record_tool_call
+
+
+class ToolTimeoutError(TimeoutError):
+    """A tool call exceeded its timeout, or found no free concurrency slot in time."""
+
+
+class ToolSpec:
+    """One registered tool: its argument schema and the bounds every call runs under."""
+
+    def __init__(self, name: str, schema: dict, required: list, timeout: float, max_concurrency: int,
+                 cost_class: str, description: str = "", takes_context: bool = False):
+        self.name = name
+        self.schema = schema          # argument -> JSON-schema property
+        self.required = required
+        self.timeout = timeout
+        self.max_concurrency = max_concurrency
+        self.cost_class = cost_class
+        self.description = description
+        self.takes_context = takes_context  # Gets the step's context as a `context` argument
+        self.slots = threading.BoundedSemaphore(max_concurrency)
+        self.invoke = None            # args dict (+ context) -> result, set on registration
+
+    def signature(self) -> str:
+        return f"{self.name}({', '.join(a if a in self.required else a + '?' for a in self.schema)})"
+
+
+class ToolRegistry:
+    """
+    Name -> ToolSpec. register_tool() takes LangChain tools (schema from the tool itself);
+    register_function() takes plain functions (schema from their signature).
+    """
+
+    def __init__(self, limits: dict = None):
+        self.limits = limits if limits is not None else TOOL_LIMITS
+        self._tools = {}
+        self._lock = threading.Lock()
+
+    def _spec(self, name: str, schema: dict, required: list, description: str, takes_context: bool, overrides: dict):
+        limits = {**self.limits.get("default", {}), **self.limits.get(name, {}), **overrides}
+        return ToolSpec(name, schema, required, limits["timeout"], limits["max_concurrency"],
+                        limits["cost_class"], description, takes_context)
+
+    def _add(self, spec: ToolSpec):
+        with self._lock:
+            self._tools[spec.name] = spec
+
+    def register_tool(self, lc_tool, **overrides):
+        """Registers a LangChain tool and bounds its underlying function in place."""
+        schema = lc_tool.tool_call_schema.model_json_schema()
+        spec = self._spec(lc_tool.name, schema.get("properties", {}), schema.get("required", []),
+                          lc_tool.description, False, overrides)
+        lc_tool.func = self._bounded(spec, lc_tool.func)
+        spec.invoke = lambda args, context="": lc_tool.invoke(args)
+        self._add(spec)
+        return lc_tool
+
+    def register_function(self, name: str, fn, description: str = None, **overrides):
+        """Registers a plain function as a tool; a `context` parameter receives the step's context."""
+        params = inspect.signature(fn).parameters
+        takes_context = "context" in params
+        schema = {
+            arg: {"type": getattr(p.annotation, "__name__", "string")}
+            for arg, p in params.items() if arg != "context"
+        }
+        required = [arg for arg, p in params.items() if arg != "context" and p.default is inspect.Parameter.empty]
+        spec = self._spec(name, schema, required, description or inspect.getdoc(fn) or "", takes_context, overrides)
+        bounded = self._bounded(spec, fn)
+        spec.invoke = lambda args, context="": bounded(**args, **({"context": context} if takes_context else {}))
+        self._add(spec)
+        return fn
+
+    def _bounded(self, spec: ToolSpec, fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            return self._run(spec, fn, args, kwargs)
+        return wrapper
+
+    def _run(self, spec: ToolSpec, fn, args, kwargs):
+        started = time.monotonic()
+        deadline = started + spec.timeout  # Shared by the wait for a slot and the call itself
+        outcome = "busy"
+        try:
+            if not spec.slots.acquire(timeout=spec.timeout):
+                raise ToolTimeoutError(
+                    f"{spec.name}: no free slot within {spec.timeout:.0f}s ({spec.max_concurrency} calls running)")
+            outcome = "timeout"
+            box = {}
+            done = threading.Event()
+
+            def target():
+                try:
+                    box["result"] = fn(*args, **kwargs)
+                except BaseException as e:
+                    box["error"] = e
+                finally:
+                    spec.slots.release()  # Only once the call really ends, however long after its timeout
+                    done.set()
+
+            # A daemon thread, so a call that never returns cannot hold up the caller or process exit
+            thread = threading.Thread(target=contextvars.copy_context().run, args=(target,), daemon=True,
+                                      name=f"tool-{spec.name}")
+            thread.start()
+            if not done.wait(max(0.0, deadline - time.monotonic())):
+                raise ToolTimeoutError(f"{spec.name} timed out after {spec.timeout:.0f}s")
+            if "error" in box:
+                outcome = "error"
+                raise box["error"]
+            result = box["result"]
+            outcome = "error" if is_error_result(result) else "ok"
+            return result
+        finally:
+            record_tool_call(spec.name, spec.cost_class, time.monotonic() - started, outcome)
+
+    # --- lookup and dispatch ---
+    def get(self, name: str) -> ToolSpec:
+        with self._lock:
+            return self._tools.get(name)
+
+    def __contains__(self, name: str) -> bool:
+        return self.get(name) is not None
+
+    def names(self) -> list:
+        with self._lock:
+            return sorted(self._tools)
+
+    def describe(self) -> str:
+        """One line per tool, for prompts that let an LLM pick a tool."""
+        with self._lock:
+            specs = sorted(self._tools.values(), key=lambda s: s.name)
+        return "\n".join(f"- {s.signature()}: {s.description.splitlines()[0] if s.description else ''}" for s in specs)
+
+    def call(self, name: str, args: dict, context: str = ""):
+        """Validates args against the tool's schema and runs it within its bounds."""
+        spec = self.get(name)
+        if spec is None:
+            raise KeyError(f"Unknown tool: {name}")
+        unknown = [a for a in args if a not in spec.schema]
+        missing = [a for a in spec.required if a not in args]
+        if unknown or missing:
+            raise ValueError(f"Bad arguments for {spec.signature()}: unknown {unknown}, missing {missing}")
+        return spec.invoke(args, context)
+
+
+# Global singleton instance
+GLOBAL_TOOL_REGISTRY = ToolRegistry()
+
+
+def register_tool(lc_tool=None, **overrides):
+    """Decorator for LangChain tools, placed above @tool: `@register_tool` or `@register_tool(timeout=30)`."""
+    if lc_tool is None:
+        return lambda t: GLOBAL_TOOL_REGISTRY.register_tool(t, **overrides)
+    return GLOBAL_TOOL_REGISTRY.register_tool(lc_tool, **overrides)
+
+
+def register_function(name: str, fn, description: str = None, **overrides):
+    return GLOBAL_TOOL_REGISTRY.register_function(name, fn, description, **overrides)
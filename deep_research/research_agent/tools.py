@@ -10,6 +10,10 @@ from markdownify import markdownify
 from tavily import TavilyClient
 from typing_extensions import Annotated, Literal
 
+from research_agent.cassette import recorded
+from research_agent.singleflight import coalesce
+from research_agent.tool_registry import register_tool
+
 tavily_client = TavilyClient()
 
 
@@ -35,7 +39,10 @@ def fetch_webpage_content(url: str, timeout: float = 10.0) -> str:
         return f"Error fetching content from {url}: {str(e)}"
 
 
+@register_tool
 @tool(parse_docstring=True)
+@coalesce("tavily_search")
+@recorded("tavily_search")
 def tavily_search(
     query: str,
     max_results: Annotated[int, InjectedToolArg] = 1,
@@ -88,6 +95,7 @@ def tavily_search(
     return response
 
 
+@register_tool
 @tool(parse_docstring=True)
 def think_tool(reflection: str) -> str:
     """Tool for strategic reflection on research progress and decision-making.
@@ -1,5 +1,9 @@
 """
 Test script to verify the orchestrator workflow step by step
+
+Run once with DEEP_RESEARCH_CASSETTE_MODE=record to capture every upstream call,
+then with DEEP_RESEARCH_CASSETTE_MODE=replay (and DEEP_RESEARCH_NO_CACHE=1) to
+repeat the run offline; DEEP_RESEARCH_REPLAY_LATENCY=recorded keeps real timings.
 """
 
 from dotenv import load_dotenv
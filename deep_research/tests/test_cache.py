@@ -0,0 +1,101 @@
+import unittest
+import tempfile
+from unittest.mock import patch
+
+# Adjust import path to ensuring research_agent can be imported
+import sys
+import os
+os.environ['TAVILY_API_KEY'] = 'test_key' # Mock key to prevent Import Error
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from research_agent import cache, gemini_cli_tool
+from research_agent.cache import ResponseCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestResponseCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.clock = FakeClock()
+        self.cache = ResponseCache(
+            os.path.join(self.tmp.name, "cache.sqlite"),
+            max_bytes=100,
+            ttls={"fast/model": 10, "off/model": 0, "default": 60},
+            clock=self.clock,
+        )
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_key_depends_on_model_prompt_and_params(self):
+        key = ResponseCache.make_key("m", "p", {"max_tokens": 10})
+        self.assertEqual(key, ResponseCache.make_key("m", "p", {"max_tokens": 10}))
+        self.assertNotEqual(key, ResponseCache.make_key("m2", "p", {"max_tokens": 10}))
+        self.assertNotEqual(key, ResponseCache.make_key("m", "p2", {"max_tokens": 10}))
+        self.assertNotEqual(key, ResponseCache.make_key("m", "p", {"max_tokens": 20}))
+
+    def test_hit_and_miss_counters(self):
+        self.assertIsNone(self.cache.get("k"))
+        self.cache.set("k", "some/model", "answer")
+        self.assertEqual(self.cache.get("k"), "answer")
+        stats = self.cache.stats()
+        self.assertEqual((stats["hits"], stats["misses"], stats["entries"]), (1, 1, 1))
+
+    def test_per_model_ttl(self):
+        self.cache.set("fast", "fast/model", "a")
+        self.cache.set("slow", "other/model", "b")
+        self.clock.now += 30
+        self.assertIsNone(self.cache.get("fast"))
+        self.assertEqual(self.cache.get("slow"), "b")
+
+    def test_zero_ttl_disables_caching(self):
+        self.cache.set("k", "off/model", "a")
+        self.assertIsNone(self.cache.get("k"))
+
+    def test_lru_eviction_respects_size_cap(self):
+        self.cache.set("a", "m", "x" * 40)
+        self.clock.now += 1
+        self.cache.set("b", "m", "x" * 40)
+        self.clock.now += 1
+        self.cache.get("a")  # "a" becomes most recently used
+        self.clock.now += 1
+        self.cache.set("c", "m", "x" * 40)  # 120 bytes > 100: evict "b"
+        self.assertIsNotNone(self.cache.get("a"))
+        self.assertIsNone(self.cache.get("b"))
+        self.assertIsNotNone(self.cache.get("c"))
+        self.assertLessEqual(self.cache.stats()["bytes"], 100)
+
+
+
+class TestGeminiCliToolCaching(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.cache = ResponseCache(os.path.join(self.tmp.name, "cache.sqlite"))
+        patcher = patch.object(cache, "get_response_cache", return_value=self.cache)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_tool_shares_the_client_cache_lookup(self):
+        answers = ["Error: Gemini CLI timed out after 60s.", "answer", "unused"]
+        with patch.object(gemini_cli_tool, "_run_gemini_cli", lambda query: answers.pop(0)):
+            run = lambda: gemini_cli_tool.ask_gemini_cli_tool.invoke({"query": "TCS margins"})
+            self.assertTrue(run().startswith("Error"))  # Errors are not cached
+            self.assertEqual(run(), "answer")
+            self.assertEqual(run(), "answer")
+
+        self.assertEqual(answers, ["unused"])
+        self.assertEqual(self.cache.stats()["hits"], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,221 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+import zlib
+from typing import TypedDict
+from unittest.mock import patch
+
+# Adjust import path to ensuring research_agent can be imported
+import sys
+os.environ['TAVILY_API_KEY'] = 'test_key' # Mock key to prevent Import Error
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from langgraph.graph import StateGraph, END
+
+import orchestrator
+from orchestrator import StepFailure, execute_plan, load_run, parse_plan, record_progress, run_config
+from research_agent.checkpoints import SQLiteCheckpointer
+from research_agent.resilience import RetryableError
+from research_agent.tool_registry import ToolRegistry
+
+
+class ThreeNodes(TypedDict):
+    first: str
+    second: str
+    third: str
+
+
+class FlakyGraph:
+    """first -> second -> third, where `second` dies on its first attempt."""
+
+    def __init__(self, checkpointer):
+        self.calls = []
+        self.fail = True
+        builder = StateGraph(ThreeNodes)
+        for name in ("first", "second", "third"):
+            builder.add_node(name, self._node(name))
+        builder.set_entry_point("first")
+        builder.add_edge("first", "second")
+        builder.add_edge("second", "third")
+        builder.add_edge("third", END)
+        self.app = builder.compile(checkpointer=checkpointer)
+
+    def _node(self, name):
+        def node(state):
+            self.calls.append(name)
+            if name == "second" and self.fail:
+                self.fail = False
+                raise RuntimeError("process died")
+            return {name: f"{name} done " + "x" * 2000}
+        return node
+
+
+class TestSQLiteCheckpointer(unittest.TestCase):
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.path = os.path.join(tmp.name, "checkpoints.sqlite")
+
+    def test_resume_skips_completed_nodes_after_restart(self):
+        graph = FlakyGraph(SQLiteCheckpointer(self.path))
+        config = run_config("run-1")
+        with self.assertRaises(RuntimeError):
+            graph.app.invoke({"first": "", "second": "", "third": ""}, config)
+
+        # A new process: fresh checkpointer on the same file
+        resumed = FlakyGraph(SQLiteCheckpointer(self.path))
+        resumed.fail = False
+        final = resumed.app.invoke(None, config)
+        self.assertEqual(resumed.calls, ["second", "third"])
+        self.assertTrue(final["first"].startswith("first done"))
+        self.assertTrue(final["third"].startswith("third done"))
+        self.assertEqual([run_id for run_id, _ in resumed.app.checkpointer.runs()], ["run-1"])
+
+    def test_state_is_stored_compressed(self):
+        graph = FlakyGraph(SQLiteCheckpointer(self.path))
+        graph.fail = False
+        graph.app.invoke({"first": "", "second": "", "third": ""}, run_config("run-2"))
+        blob, = sqlite3.connect(self.path).execute(
+            "SELECT checkpoint FROM checkpoints ORDER BY checkpoint_id DESC LIMIT 1").fetchone()
+        self.assertLess(len(blob), len(zlib.decompress(blob)) / 5)
+        history = list(graph.app.get_state_history(run_config("run-2")))
+        self.assertEqual(history[0].values["third"][:10], "third done")
+        self.assertEqual(history[0].next, ())
+
+    def test_delete_thread(self):
+        checkpointer = SQLiteCheckpointer(self.path)
+        graph = FlakyGraph(checkpointer)
+        graph.fail = False
+        graph.app.invoke({"first": "", "second": "", "third": ""}, run_config("run-3"))
+        checkpointer.record_step("run-3", "step", "result")
+        checkpointer.delete_thread("run-3")
+        self.assertIsNone(checkpointer.get_tuple(run_config("run-3")))
+        self.assertEqual(checkpointer.completed_steps("run-3"), {})
+
+
+class TestPlanResume(unittest.TestCase):
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.checkpointer = SQLiteCheckpointer(os.path.join(tmp.name, "checkpoints.sqlite"))
+        patcher = patch.object(orchestrator, "GLOBAL_CHECKPOINTER", self.checkpointer)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        plan, dependencies = parse_plan([f"step {n}" for n in range(1, 11)])
+        self.state = {"run_id": "run-10", "task": "Ten step task", "plan": plan,
+                      "plan_dependencies": dependencies, "current_step_index": 0, "step_results": {}}
+
+    def test_crashed_plan_resumes_at_the_failed_step(self):
+        ran, crashed = [], []
+
+        def dies_at_step_7(task, context_str):
+            if task == "step 7" and not crashed:
+                crashed.append(task)
+                raise RuntimeError("process died")
+            ran.append(task)
+            return f"result of {task}"
+
+        with patch.object(orchestrator, "run_step", dies_at_step_7):
+            with self.assertRaises(RuntimeError):
+                execute_plan(self.state)
+            self.assertEqual(ran, [f"step {n}" for n in range(1, 7)])
+            ran.clear()
+            results = execute_plan(self.state)
+
+        self.assertEqual(ran, ["step 7", "step 8", "step 9", "step 10"])
+        self.assertEqual(list(results), self.state["plan"])
+        self.assertEqual(results["step 3"], "result of step 3")
+
+    def test_failed_step_is_retried_on_resume(self):
+        outage = [True]
+
+        def executor_llm(prompt, model_id, **kwargs):
+            if outage[0] and "CURRENT STEP: step 4" in prompt:
+                raise RetryableError("HTTP 503 from executor", model_id)
+            return "done"
+
+        with patch.object(orchestrator, "call_openrouter", executor_llm):
+            self.assertEqual(orchestrator.run_step("step 4", ""), "Step Failed: HTTP 503 from executor")
+            results = execute_plan(self.state)
+            self.assertIsInstance(orchestrator.run_step("step 4", ""), StepFailure)
+        self.assertTrue(results["step 4"].startswith("Step Failed"))
+        self.assertNotIn("step 4", self.checkpointer.completed_steps("run-10"))
+
+        outage[0] = False
+        ran = []
+        with patch.object(orchestrator, "run_step", lambda task, context_str: ran.append(task) or "recovered"):
+            results = execute_plan(self.state)
+        self.assertEqual(ran, ["step 4"])
+        self.assertEqual(results["step 4"], "recovered")
+
+    def test_tool_error_result_is_retried_on_resume(self):
+        plan, dependencies = parse_plan(["tavily_search TCS deal wins"])
+        self.state.update(plan=plan, plan_dependencies=dependencies)
+        registry = ToolRegistry({"default": {"timeout": 5, "max_concurrency": 1, "cost_class": "free"}})
+        answers = ["Error fetching data: HTTP 429", "news"]
+        registry.register_function("tavily_search", lambda query: answers.pop(0))
+
+        with patch.object(orchestrator, "GLOBAL_TOOL_REGISTRY", registry):
+            results = execute_plan(self.state)
+            self.assertEqual(results["tavily_search TCS deal wins"],
+                             "Tool Execution Failed: Error fetching data: HTTP 429")
+            self.assertNotIn("tavily_search TCS deal wins", self.checkpointer.completed_steps("run-10"))
+            results = execute_plan(self.state)
+
+        self.assertEqual(answers, [])
+        self.assertEqual(results["tavily_search TCS deal wins"], "Tool Output:\nnews")
+
+    def test_failed_report_resumes_failed_steps_then_the_reporter(self):
+        app = orchestrator.builder.compile(checkpointer=self.checkpointer)
+        config = run_config("run-10")
+        ran, failed = [], []
+
+        def steps(task, context_str):
+            ran.append(task)
+            if task == "step 4" and not failed:
+                failed.append(task)
+                return StepFailure("Step Failed: HTTP 503")
+            return "ok"
+
+        def reporter_llm(prompt, model_id, **kwargs):
+            if "Step Failed" in prompt:
+                raise RetryableError("HTTP 503 from writer", model_id)
+            return "report"
+
+        with patch.object(orchestrator, "orchestrator_app", app), \
+             patch.object(orchestrator, "run_step", steps), \
+             patch.object(orchestrator, "call_openrouter", reporter_llm):
+            record_progress({**self.state, "background_research": "notes"}, "approval")
+            with self.assertRaises(RetryableError):
+                app.invoke(None, config)
+            self.assertEqual(app.get_state(config).next, ("reporter",))
+
+            state, remaining = load_run("run-10")
+            self.assertEqual(remaining, ("executor",))
+            self.assertNotIn("step 4", state["step_results"])
+            ran.clear()
+            final = app.invoke(None, config)
+
+        self.assertEqual(ran, ["step 4"])
+        self.assertEqual(final["final_report"], "report")
+
+    def test_ui_progress_resumes_from_the_graph(self):
+        app = orchestrator.builder.compile(checkpointer=self.checkpointer)
+        with patch.object(orchestrator, "orchestrator_app", app):
+            record_progress({**self.state, "background_research": "notes", "logs": ["ui only"]}, "approval")
+            self.checkpointer.record_step("run-10", "step 1", "result of step 1")
+            self.checkpointer.record_step("run-10", "an edited-away step", "stale")
+            state, remaining = load_run("run-10")
+            self.assertEqual(load_run("unknown"), (None, ()))
+
+        self.assertEqual(remaining, ("executor",))
+        self.assertEqual(state["background_research"], "notes")
+        self.assertEqual(state["step_results"], {"step 1": "result of step 1"})
+        self.assertNotIn("logs", state)
+
+
+if __name__ == '__main__':
+    unittest.main()
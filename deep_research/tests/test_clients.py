@@ -0,0 +1,403 @@
+import asyncio
+import json
+import unittest
+from unittest.mock import patch
+
+import httpx
+
+# Adjust import path to ensuring research_agent can be imported
+import sys
+import os
+os.environ['TAVILY_API_KEY'] = 'test_key' # Mock key to prevent Import Error
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import tempfile
+
+from research_agent import cache
+from research_agent import clients
+from research_agent import http_transport
+from research_agent import text_utils
+from research_agent.cache import ResponseCache
+from research_agent.rate_limiter import AdaptiveLimits, ModelLimits, RateLimiter
+from research_agent.resilience import CallPolicy, FatalError, RetryableError
+
+
+def completion_handler(request):
+    """Minimal OpenRouter chat-completions responder."""
+    return httpx.Response(200, json={
+        "choices": [{"message": {"content": "pong"}}],
+    })
+
+
+class TestHttpTransport(unittest.TestCase):
+
+    def tearDown(self):
+        http_transport.close_http_clients()
+
+    def test_client_is_shared(self):
+        first = http_transport.get_http_client()
+        second = http_transport.get_http_client()
+        self.assertIs(first, second)
+
+    def test_client_recreated_after_close(self):
+        first = http_transport.get_http_client()
+        http_transport.close_http_clients()
+        second = http_transport.get_http_client()
+        self.assertIsNot(first, second)
+        self.assertFalse(second.is_closed)
+
+    def test_prewarm_swallows_connection_errors(self):
+        # Nothing listens on port 9; pre-warming must never raise.
+        http_transport.prewarm_connections(["http://127.0.0.1:9"], background=False)
+
+
+class TestCallOpenRouter(unittest.TestCase):
+
+    def setUp(self):
+        self.env = patch.dict(os.environ, {"OPENROUTER_API_KEY": "test", "DEEP_RESEARCH_NO_CACHE": "1"})
+        self.env.start()
+        # Fresh limiter so request history never leaks between tests
+        self.limiter = patch.object(clients, "GLOBAL_RATE_LIMITER", RateLimiter())
+        self.limiter.start()
+        # Fresh policy so breaker state never leaks between tests, and no real backoff sleeps
+        self.policy = patch.object(clients, "GLOBAL_CALL_POLICY", CallPolicy(sleep=lambda s: None))
+        self.policy.start()
+
+    def tearDown(self):
+        self.policy.stop()
+        self.limiter.stop()
+        self.env.stop()
+
+    def test_uses_pooled_client(self):
+        seen = []
+
+        def handler(request):
+            seen.append(request)
+            return completion_handler(request)
+
+        client = httpx.Client(transport=httpx.MockTransport(handler))
+        with patch.object(clients, "get_http_client", return_value=client):
+            self.assertEqual(clients.call_openrouter("ping", "test/model"), "pong")
+            self.assertEqual(clients.call_openrouter("ping", "test/model"), "pong")
+
+        self.assertEqual(len(seen), 2)
+        self.assertEqual(seen[0].headers["Authorization"], "Bearer test")
+        self.assertTrue(str(seen[0].url).endswith("/chat/completions"))
+
+    def test_retries_transient_errors(self):
+        statuses = [503, 200]
+
+        def handler(request):
+            status = statuses.pop(0)
+            return completion_handler(request) if status == 200 else httpx.Response(status, text="busy")
+
+        client = httpx.Client(transport=httpx.MockTransport(handler))
+        with patch.object(clients, "get_http_client", return_value=client):
+            self.assertEqual(clients.call_openrouter("ping", "test/model", fallback=False), "pong")
+        self.assertEqual(statuses, [])
+
+    def test_throttling_lowers_learned_limit(self):
+        limiter = RateLimiter(adaptive=AdaptiveLimits())
+        responses = iter([
+            httpx.Response(429, json={"error": {"message": "slow down"}}, headers={"X-RateLimit-Limit": "20"}),
+            httpx.Response(200, json={"choices": [{"message": {"content": "pong"}}]}),
+        ])
+        client = httpx.Client(transport=httpx.MockTransport(lambda request: next(responses)))
+        with patch.object(clients, "GLOBAL_RATE_LIMITER", limiter), \
+                patch.object(clients, "get_http_client", return_value=client):
+            self.assertEqual(clients.call_openrouter("ping", "test/model", fallback=False), "pong")
+        # Seeded at the advertised 20 RPM and halved by the 429; the success never waited, so no growth
+        self.assertEqual(limiter.adaptive.snapshot()["test/model"]["rpm"], 10)
+
+    def test_long_retry_after_fails_over(self):
+        models = []
+
+        def handler(request):
+            model = json.loads(request.content)["model"]
+            models.append(model)
+            if model == "test/primary":
+                return httpx.Response(429, text="slow down", headers={"Retry-After": "120"})
+            return completion_handler(request)
+
+        client = httpx.Client(transport=httpx.MockTransport(handler))
+        with patch.object(clients, "get_http_client", return_value=client), \
+                patch.object(clients, "fallback_chain", return_value=["test/primary", "test/backup"]):
+            self.assertEqual(clients.call_openrouter("ping", "test/primary"), "pong")
+        self.assertEqual(models, ["test/primary", "test/backup"])
+
+    def test_missing_key_is_fatal(self):
+        with patch.dict(os.environ, {"OPENROUTER_API_KEY": ""}):
+            with self.assertRaises(FatalError):
+                clients.call_openrouter("ping", "test/model")
+
+
+def sse_handler(request):
+    """Streams three tokens the way OpenRouter does, including a keep-alive comment."""
+    body = (
+        ": OPENROUTER PROCESSING\n\n"
+        'data: {"choices": [{"delta": {"content": "Hel"}}]}\n\n'
+        'data: {"choices": [{"delta": {"content": "lo"}}]}\n\n'
+        'data: {"choices": [{"delta": {"content": "!"}}]}\n\n'
+        "data: [DONE]\n\n"
+    )
+    return httpx.Response(200, text=body, headers={"Content-Type": "text/event-stream"})
+
+
+class TestResponseCaching(unittest.TestCase):
+
+    def setUp(self):
+        self.env = patch.dict(os.environ, {"OPENROUTER_API_KEY": "test", "DEEP_RESEARCH_NO_CACHE": "0"})
+        self.env.start()
+        self.limiter = patch.object(clients, "GLOBAL_RATE_LIMITER", RateLimiter())
+        self.limiter.start()
+        # Fresh policy so breaker state never leaks between tests, and no real backoff sleeps
+        self.policy = patch.object(clients, "GLOBAL_CALL_POLICY", CallPolicy(sleep=lambda s: None))
+        self.policy.start()
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cache = ResponseCache(os.path.join(self.tmp.name, "cache.sqlite"))
+        self.cache_patch = patch.object(cache, "get_response_cache", return_value=self.cache)
+        self.cache_patch.start()
+
+    def tearDown(self):
+        self.cache_patch.stop()
+        self.tmp.cleanup()
+        self.policy.stop()
+        self.limiter.stop()
+        self.env.stop()
+
+    def test_repeat_call_served_from_cache(self):
+        seen = []
+
+        def handler(request):
+            seen.append(request)
+            return completion_handler(request)
+
+        client = httpx.Client(transport=httpx.MockTransport(handler))
+        with patch.object(clients, "get_http_client", return_value=client):
+            self.assertEqual(clients.call_openrouter("ping", "test/model"), "pong")
+            self.assertEqual(clients.call_openrouter("ping", "test/model"), "pong")
+            self.assertEqual(clients.call_openrouter("ping", "test/model", use_cache=False), "pong")
+
+        self.assertEqual(len(seen), 2)
+        self.assertEqual(self.cache.stats()["hits"], 1)
+
+    def test_errors_are_not_cached(self):
+        client = httpx.Client(transport=httpx.MockTransport(lambda r: httpx.Response(503, text="down")))
+        with patch.object(clients, "get_http_client", return_value=client):
+            with self.assertRaises(RetryableError):
+                clients.call_openrouter("ping", "test/model", fallback=False)
+        self.assertEqual(self.cache.stats()["entries"], 0)
+
+    def test_fallback_answers_are_not_cached(self):
+        def handler(request):
+            if json.loads(request.content)["model"] == "test/primary":
+                return httpx.Response(400, text="bad model")
+            return completion_handler(request)
+
+        client = httpx.Client(transport=httpx.MockTransport(handler))
+        with patch.object(clients, "get_http_client", return_value=client), \
+                patch.object(clients, "fallback_chain", return_value=["test/primary", "test/backup"]):
+            self.assertEqual(clients.call_openrouter("ping", "test/primary"), "pong")
+        self.assertEqual(self.cache.stats()["entries"], 0)
+
+    def test_streamed_completion_is_cached(self):
+        client = httpx.Client(transport=httpx.MockTransport(sse_handler))
+        with patch.object(clients, "get_http_client", return_value=client):
+            list(clients.stream_openrouter("hi", "test/model"))
+        with patch.object(clients, "get_http_client", side_effect=AssertionError("network used")):
+            self.assertEqual(list(clients.stream_openrouter("hi", "test/model")), ["Hello!"])
+
+
+class TestStreaming(unittest.TestCase):
+
+    def setUp(self):
+        self.env = patch.dict(os.environ, {"OPENROUTER_API_KEY": "test", "DEEP_RESEARCH_NO_CACHE": "1"})
+        self.env.start()
+        self.limiter = patch.object(clients, "GLOBAL_RATE_LIMITER", RateLimiter())
+        self.limiter.start()
+        # Fresh policy so breaker state never leaks between tests, and no real backoff sleeps
+        self.policy = patch.object(clients, "GLOBAL_CALL_POLICY", CallPolicy(sleep=lambda s: None))
+        self.policy.start()
+
+    def tearDown(self):
+        self.policy.stop()
+        self.limiter.stop()
+        self.env.stop()
+
+    def test_sse_event_parsing(self):
+        self.assertEqual(clients._sse_event(": keep-alive"), (None, None))
+        self.assertEqual(clients._sse_event("data: [DONE]"), ("done", None))
+        self.assertEqual(
+            clients._sse_event('data: {"choices": [{"delta": {"content": "x"}}]}'),
+            ("token", "x"),
+        )
+        kind, message = clients._sse_event('data: {"error": {"message": "overloaded"}}')
+        self.assertEqual(kind, "error")
+        self.assertIn("overloaded", message)
+
+    def test_stream_openrouter_yields_tokens(self):
+        client = httpx.Client(transport=httpx.MockTransport(sse_handler))
+        with patch.object(clients, "get_http_client", return_value=client):
+            tokens = list(clients.stream_openrouter("hi", "test/model"))
+        self.assertEqual(tokens, ["Hel", "lo", "!"])
+
+    def test_call_openrouter_on_token_callback(self):
+        seen = []
+        client = httpx.Client(transport=httpx.MockTransport(sse_handler))
+        with patch.object(clients, "get_http_client", return_value=client):
+            result = clients.call_openrouter("hi", "test/model", on_token=seen.append)
+        self.assertEqual(result, "Hello!")
+        self.assertEqual(seen, ["Hel", "lo", "!"])
+
+    def test_astream_openrouter_yields_tokens(self):
+        async def run():
+            client = httpx.AsyncClient(transport=httpx.MockTransport(sse_handler))
+            with patch.object(clients, "get_async_http_client", return_value=client):
+                return [token async for token in clients.astream_openrouter("hi", "test/model")]
+
+        self.assertEqual(asyncio.run(run()), ["Hel", "lo", "!"])
+
+    def test_stream_holds_in_flight_slot_until_it_ends(self):
+        limits = ModelLimits(max_in_flight=1)
+        client = httpx.Client(transport=httpx.MockTransport(sse_handler))
+        with patch.object(clients, "get_http_client", return_value=client), \
+                patch.object(clients, "limits_for", return_value=limits):
+            stream = clients.stream_openrouter("hi", "test/model")
+            next(stream)
+            self.assertIsNone(clients.GLOBAL_RATE_LIMITER.try_acquire("test/model", limits))
+            stream.close()  # consumer stops early
+        self.assertIsNotNone(clients.GLOBAL_RATE_LIMITER.try_acquire("test/model", limits))
+
+    def test_usage_corrects_token_charge(self):
+        limits = ModelLimits(tpm=1000)
+
+        def handler(request):
+            return httpx.Response(200, json={
+                "choices": [{"message": {"content": "pong"}}],
+                "usage": {"prompt_tokens": 5, "completion_tokens": 995, "total_tokens": 1000},
+            })
+
+        client = httpx.Client(transport=httpx.MockTransport(handler))
+        with patch.object(clients, "get_http_client", return_value=client), \
+                patch.object(clients, "limits_for", return_value=limits):
+            clients.call_openrouter("hi", "test/model")
+        # The estimate was a handful of tokens; usage says the whole minute's budget went
+        self.assertIsNone(clients.GLOBAL_RATE_LIMITER.try_acquire("test/model", limits, tokens=1))
+
+
+class TestAsyncClients(unittest.TestCase):
+
+    def setUp(self):
+        self.env = patch.dict(os.environ, {"OPENROUTER_API_KEY": "test", "DEEP_RESEARCH_NO_CACHE": "1"})
+        self.env.start()
+        # Fresh limiter so request history never leaks between tests
+        self.limiter = patch.object(clients, "GLOBAL_RATE_LIMITER", RateLimiter())
+        self.limiter.start()
+        # Fresh policy so breaker state never leaks between tests, and no real backoff sleeps
+        self.policy = patch.object(clients, "GLOBAL_CALL_POLICY", CallPolicy(sleep=lambda s: None))
+        self.policy.start()
+
+    def tearDown(self):
+        self.policy.stop()
+        self.limiter.stop()
+        self.env.stop()
+
+    def test_acall_openrouter_fans_out(self):
+        async def handler(request):
+            await asyncio.sleep(0.05)
+            return completion_handler(request)
+
+        async def run():
+            client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+            with patch.object(clients, "get_async_http_client", return_value=client):
+                return await asyncio.gather(*[
+                    clients.acall_openrouter("ping", "test/model") for _ in range(3)
+                ])
+
+        self.assertEqual(asyncio.run(run()), ["pong"] * 3)
+
+    def test_acall_openrouter_raises_http_errors(self):
+        def handler(request):
+            return httpx.Response(503, text="unavailable")
+
+        async def run():
+            client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+            with patch.object(clients, "get_async_http_client", return_value=client):
+                return await clients.acall_openrouter("ping", "test/model", fallback=False)
+
+        with self.assertRaises(RetryableError) as raised:
+            asyncio.run(run())
+        self.assertIn("unavailable", str(raised.exception))
+
+    def test_aask_gemini_cli_falls_back_to_local_script(self):
+        calls = []
+
+        async def fake_run_cli(*command):
+            calls.append(command)
+            if command[0] == "gemini":
+                raise FileNotFoundError("gemini")
+            return "fallback answer"
+
+        with patch.object(clients, "_run_cli", fake_run_cli):
+            result = asyncio.run(clients.aask_gemini_cli("hello"))
+
+        self.assertEqual(result, "fallback answer")
+        self.assertEqual(calls[1][-2:], ("-p", "hello"))
+
+
+class TestTokenBudget(unittest.TestCase):
+
+    def setUp(self):
+        # Pin the offline character estimate so counts don't depend on tiktoken's BPE download
+        self.encoder = patch.multiple(text_utils, _encoder=None, _encoder_loaded=True)
+        self.encoder.start()
+
+    def tearDown(self):
+        self.encoder.stop()
+
+    def test_truncate_respects_limit(self):
+        text = "x" * 700  # ~200 tokens
+        cut = clients.truncate_to_tokens(text, 50)
+        self.assertLessEqual(clients.count_tokens(cut), 50)
+        self.assertTrue(cut.endswith(text_utils.TRUNCATION_MARKER))
+        self.assertEqual(clients.truncate_to_tokens("short", 50), "short")
+
+    def test_pack_sections_drops_low_priority_first(self):
+        sections = [(1, "a" * 350), (0, "b" * 350), (2, "c" * 350)]
+        packed = clients.pack_sections(sections, budget=210)
+        self.assertIn("a", packed)
+        self.assertIn("b", packed)
+        self.assertNotIn("c", packed)
+        self.assertLess(packed.index("a"), packed.index("b"))  # original order kept
+
+    def test_pack_sections_shares_tier_fairly(self):
+        sections = [(0, "a" * 35), (0, "b" * 3500), (0, "c" * 3500)]
+        packed = clients.pack_sections(sections, budget=400).split("\n\n")
+        self.assertEqual(packed[0], "a" * 35)  # small section kept whole
+        self.assertAlmostEqual(len(packed[1]), len(packed[2]), delta=5)
+        self.assertLessEqual(clients.count_tokens("\n\n".join(packed)), 400)
+
+    def test_max_tokens_clamped_to_context(self):
+        with patch.dict(clients.MODEL_CONTEXT_WINDOWS, {"tiny/model": 1000}):
+            self.assertEqual(clients.resolve_max_tokens("hi", "tiny/model", 500), 500)
+            self.assertLess(clients.resolve_max_tokens("x" * 2100, "tiny/model", 500), 500)
+            with self.assertRaises(FatalError):
+                clients.resolve_max_tokens("x" * 4000, "tiny/model", 500)
+
+    def test_call_site_max_tokens_reaches_payload(self):
+        payloads = []
+
+        def handler(request):
+            payloads.append(json.loads(request.content))
+            return completion_handler(request)
+
+        client = httpx.Client(transport=httpx.MockTransport(handler))
+        with patch.dict(os.environ, {"OPENROUTER_API_KEY": "test", "DEEP_RESEARCH_NO_CACHE": "1"}), \
+                patch.object(clients, "GLOBAL_RATE_LIMITER", RateLimiter()), \
+                patch.object(clients, "get_http_client", return_value=client):
+            clients.call_openrouter("ping", "test/model", max_tokens=clients.call_site_max_tokens("router"))
+        self.assertEqual(payloads[0]["max_tokens"], clients.MAX_TOKENS_BY_CALL_SITE["router"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+import unittest
+from unittest.mock import patch
+
+# Adjust import path to ensuring research_agent can be imported
+import sys
+import os
+os.environ['TAVILY_API_KEY'] = 'test_key' # Mock key to prevent Import Error
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import orchestrator
+from orchestrator import execute_plan, parse_plan
+from research_agent import context_index
+from research_agent.text_utils import count_tokens
+from research_agent.context_index import ContextIndex, extract_facts
+
+TCS = """Tool Output:
+Sure! Here is the data you asked for:
+TCS reported revenue of Rs 2,40,893 crore in FY24, up 6.8% year on year.
+Read more at https://example.com/tcs-results for the full story.
+Operating margin stood at 24.6%, the highest among Indian IT peers.
+Headcount fell by 13,249 over the year, and attrition eased to 12.5%.
+The weather in Mumbai was pleasant during the analyst meet.
+I hope this helps!"""
+
+INFY = """Infosys revenue grew 4.7% to Rs 1,53,670 crore in FY24. Operating margin was 20.7%.
+Large deal TCV hit a record $17.7 billion. Infosys cut its FY25 guidance to 1-3% growth."""
+
+
+class TestExtractFacts(unittest.TestCase):
+
+    def test_keeps_figures_and_drops_filler(self):
+        facts = extract_facts(TCS)
+        self.assertEqual(facts, [
+            "TCS reported revenue of Rs 2,40,893 crore in FY24, up 6.8% year on year.",
+            "Operating margin stood at 24.6%, the highest among Indian IT peers.",
+            "Headcount fell by 13,249 over the year, and attrition eased to 12.5%.",
+        ])
+        self.assertEqual(len(extract_facts(TCS, limit=1)), 1)
+
+    def test_plain_results_keep_their_opening(self):
+        self.assertEqual(extract_facts("result of step one"), ["result of step one"])
+        self.assertEqual(extract_facts(""), [])
+
+
+class TestContextIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.index = ContextIndex()
+        self.index.add("get_company_fundamentals TCS.NS", TCS)
+        self.index.add("get_company_fundamentals INFY.NS", INFY)
+
+    def test_most_relevant_facts_win_a_tight_budget(self):
+        context = self.index.context("perform_ratio_analysis operating margin TCS vs INFY", 60)
+        self.assertIn("Operating margin stood at 24.6%", context)
+        self.assertIn("Operating margin was 20.7%", context)
+        self.assertNotIn("Headcount", context)
+        self.assertLessEqual(count_tokens(context), 60)
+
+    def test_every_step_gets_its_best_fact_before_seconds(self):
+        context = self.index.context("tavily_search Infosys large deal wins", 80)
+        lines = context.splitlines()
+        self.assertEqual(len(lines), 2)  # TCS is off-topic but still represented
+        self.assertIn("Large deal TCV", lines[1])
+
+    def test_restricted_to_given_steps_in_given_order(self):
+        context = self.index.context("operating margin", 500, steps=["get_company_fundamentals INFY.NS", "unknown"])
+        self.assertTrue(context.startswith("Step 'get_company_fundamentals INFY.NS': "))
+        self.assertNotIn("24.6%", context)
+
+    def test_plan_digests_each_result_once(self):
+        plan, dependencies = parse_plan([f"step {n}" for n in range(1, 9)])
+        state = {"task": "t", "plan": plan, "plan_dependencies": dependencies, "step_results": {}}
+        digested = []
+
+        def counting(result, *args, **kwargs):
+            digested.append(result)
+            return extract_facts(result, *args, **kwargs)
+
+        with patch.object(context_index, "extract_facts", counting), \
+             patch.object(orchestrator, "run_step", lambda task, context_str: f"Revenue for {task} was 10% higher."):
+            execute_plan(state)
+        self.assertEqual(len(digested), 7)  # Every result but the last is read by a later step, once
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,263 @@
+import json
+import random
+import tempfile
+import time
+import unittest
+from unittest.mock import patch
+
+# Adjust import path to ensuring research_agent can be imported
+import sys
+import os
+os.environ['TAVILY_API_KEY'] = 'test_key' # Mock key to prevent Import Error
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from research_agent import ensemble
+from research_agent.clients import count_tokens
+from research_agent.new_config import ENSEMBLE_CANDIDATES, ENSEMBLE_MODELS, PLANNER_MODEL_ID
+from research_agent.resilience import FatalError, LLMCallError, RetryableError
+from research_agent.scoreboard import EnsembleScoreboard, query_class
+
+
+class FakeModels:
+    """Stands in for call_openrouter: each worker model sleeps its delay, then answers or raises."""
+
+    def __init__(self, delays, errors=(), answers=None):
+        self.delays = delays
+        self.errors = set(errors)
+        self.answers = answers or {}
+        self.asked = []
+        self.judge_prompts = []
+
+    def __call__(self, prompt, model_id, **kwargs):
+        if model_id == PLANNER_MODEL_ID:
+            self.judge_prompts.append(prompt)
+            return "final"
+        self.asked.append(model_id)
+        time.sleep(self.delays.get(model_id, 0))
+        if model_id in self.errors:
+            raise FatalError("HTTP 400", model_id)
+        return self.answers.get(model_id, f"answer from {model_id}")
+
+
+def run_ensemble(fake, mode="parallel", scoreboard=None, query="question", **settings):
+    gather = ensemble.gather_responses
+    configured = lambda prompt, **kwargs: gather(prompt, **kwargs, **settings)
+    # A fresh in-memory scoreboard with no exploration picks ENSEMBLE_MODELS, in order
+    scoreboard = scoreboard or EnsembleScoreboard(explore_rate=0)
+    with patch.object(ensemble, "call_openrouter", fake), \
+            patch.object(ensemble, "gather_responses", configured), \
+            patch.object(ensemble, "GLOBAL_SCOREBOARD", scoreboard):
+        return ensemble.ensemble_query(query, mode=mode)
+
+
+class TestEnsemble(unittest.TestCase):
+
+    def test_workers_run_concurrently(self):
+        fake = FakeModels({m: 0.2 for m in ENSEMBLE_MODELS})
+        started = time.monotonic()
+        self.assertEqual(run_ensemble(fake), "final")
+        self.assertLess(time.monotonic() - started, 0.5)  # not the 0.6s of running them in turn
+        for model_id in ENSEMBLE_MODELS:
+            self.assertIn(f"answer from {model_id}", fake.judge_prompts[0])
+        self.assertNotIn("Did Not Answer", fake.judge_prompts[0])
+
+    def test_straggler_is_dropped_once_quorum_answers(self):
+        straggler = ENSEMBLE_MODELS[-1]
+        fake = FakeModels({straggler: 2.0})
+        started = time.monotonic()
+        run_ensemble(fake, quorum=2, grace=0.1)
+        self.assertLess(time.monotonic() - started, 1.0)
+        self.assertNotIn(f"answer from {straggler}", fake.judge_prompts[0])
+        self.assertIn(f"- {straggler}: timed out", fake.judge_prompts[0])
+
+    def test_deadline_bounds_the_wait_below_quorum(self):
+        fake = FakeModels({m: 2.0 for m in ENSEMBLE_MODELS[1:]})
+        with patch.object(ensemble, "call_openrouter", fake):
+            started = time.monotonic()
+            responses, timed_out, failed = ensemble.gather_responses("p", deadline=0.2, quorum=3)
+        self.assertLess(time.monotonic() - started, 1.0)
+        self.assertEqual([r["model"] for r in responses], ENSEMBLE_MODELS[:1])
+        self.assertEqual(timed_out, ENSEMBLE_MODELS[1:])
+        self.assertEqual(failed, {})
+
+    def test_error_after_the_deadline_counts_as_timed_out(self):
+        slow = ENSEMBLE_MODELS[-1]
+
+        def read_timeout(prompt, model_id, deadline, **kwargs):
+            if model_id == slow:
+                deadline.expires_at = time.monotonic()  # The request used up its whole deadline...
+                raise RetryableError("ReadTimeout", model_id)  # ...and httpx gave up mid-response
+            return f"answer from {model_id}"
+
+        for gather in (ensemble.gather_responses, ensemble.sequential_responses):
+            with self.subTest(gather=gather.__name__), patch.object(ensemble, "call_openrouter", read_timeout):
+                responses, timed_out, failed = gather("p", deadline=5)
+                self.assertEqual([r["model"] for r in responses], ENSEMBLE_MODELS[:-1])
+                self.assertEqual(timed_out, [slow])
+                self.assertEqual(failed, {})
+
+    def test_failures_are_reported_and_all_failing_raises(self):
+        broken = ENSEMBLE_MODELS[0]
+        fake = FakeModels({}, errors=[broken])
+        run_ensemble(fake)
+        self.assertIn(f"- {broken}: failed", fake.judge_prompts[0])
+
+        with self.assertRaises(LLMCallError):
+            run_ensemble(FakeModels({}, errors=ENSEMBLE_MODELS))
+
+
+
+AGREEING = {
+    ENSEMBLE_MODELS[0]: "TCS reported revenue of Rs 2,40,893 crore in FY24, up 6.8% year on year.",
+    ENSEMBLE_MODELS[1]: "In FY24 TCS reported revenue of Rs 2,40,893 crore, up 6.8% year on year.",
+    ENSEMBLE_MODELS[2]: "TCS revenue for FY24 was Rs 2,40,893 crore, growth of 6.8% year on year.",
+}
+
+
+class TestAgreement(unittest.TestCase):
+
+    def test_similarity_and_figures(self):
+        a, b = AGREEING[ENSEMBLE_MODELS[0]], AGREEING[ENSEMBLE_MODELS[1]]
+        self.assertGreater(ensemble.text_similarity(a, b), 0.6)
+        self.assertLess(ensemble.text_similarity(a, "Infosys is a software company."), 0.2)
+        self.assertEqual(ensemble.extract_figures("Rs 2,40,893 crore, up -6.8% in 2024."), [240893, -6.8, 2024])
+        self.assertEqual(ensemble.numeric_consistency(a, b), 1.0)
+        self.assertTrue(ensemble.answers_agree(a, b))
+        # Same wording, different figure: the numbers disagree, so the answers do too
+        self.assertFalse(ensemble.answers_agree(a, a.replace("6.8%", "9.1%")))
+
+    def test_consensus_skips_the_judge(self):
+        fake = FakeModels({}, answers=AGREEING)
+        self.assertEqual(run_ensemble(fake), AGREEING[ENSEMBLE_MODELS[0]])
+        self.assertEqual(fake.judge_prompts, [])
+
+    def test_disagreement_goes_to_the_judge(self):
+        answers = dict(AGREEING)
+        answers[ENSEMBLE_MODELS[1]] = "TCS revenue fell to Rs 1,90,000 crore after weak demand."
+        answers[ENSEMBLE_MODELS[2]] = "Infosys guided FY25 growth of 1-3% in constant currency."
+        fake = FakeModels({}, answers=answers)
+        self.assertEqual(run_ensemble(fake), "final")
+        self.assertEqual(len(fake.judge_prompts), 1)
+
+    def test_an_outlier_does_not_block_consensus(self):
+        answers = dict(AGREEING)
+        answers[ENSEMBLE_MODELS[0]] = "TCS revenue fell to Rs 1,90,000 crore after weak demand."
+        agreed = ensemble.consensus([{"model": m, "response": answers[m]} for m in ENSEMBLE_MODELS])
+        self.assertEqual(agreed["model"], ENSEMBLE_MODELS[1])
+
+        fake = FakeModels({}, answers=answers)
+        self.assertEqual(run_ensemble(fake, mode="sequential"), AGREEING[ENSEMBLE_MODELS[1]])
+        self.assertEqual(fake.asked, ENSEMBLE_MODELS[:3])
+        self.assertEqual(fake.judge_prompts, [])
+
+    def test_sequential_stops_after_two_agreeing_models(self):
+        fake = FakeModels({}, answers=AGREEING)
+        run_ensemble(fake, mode="sequential")
+        self.assertEqual(fake.asked, ENSEMBLE_MODELS[:2])
+        self.assertEqual(fake.judge_prompts, [])
+
+    def test_parallel_stops_waiting_once_two_agree(self):
+        fake = FakeModels({ENSEMBLE_MODELS[2]: 2.0}, answers=AGREEING)
+        started = time.monotonic()
+        run_ensemble(fake, grace=5.0)
+        self.assertLess(time.monotonic() - started, 1.0)
+
+
+
+class TestJudgePayload(unittest.TestCase):
+
+    SHARED = "TCS reported revenue of Rs 2,40,893 crore in FY24, up 6.8% year on year."
+    RESPONSES = [
+        {"model": ENSEMBLE_MODELS[0], "response": f"Sure! Here is the analysis:\n\n{SHARED}\n- Margin: \"24.6%\" (EBIT)\n\nI hope this helps!"},
+        {"model": ENSEMBLE_MODELS[1], "response": f"Certainly.\n{SHARED} Deal wins reached $42.7 billion.\nLet me know if you need more."},
+        {"model": ENSEMBLE_MODELS[2], "response": f"- {SHARED}\n- Attrition fell to 12.5%."},
+    ]
+
+    def test_boilerplate_is_stripped(self):
+        self.assertEqual(ensemble.strip_boilerplate("Sure! Here's what I found:\nRevenue grew.\nI hope this helps!"),
+                         "Revenue grew.")
+        self.assertEqual(ensemble.strip_boilerplate("Revenue grew 6.8%. Feel free to ask more."), "Revenue grew 6.8%.")
+
+    def test_shared_passages_are_sent_once(self):
+        payload = ensemble.compact_candidates(self.RESPONSES, 10000)
+        self.assertEqual(payload.count(self.SHARED), 1)
+        self.assertEqual(payload.count("[S1]"), 4)  # the definition plus one citation per answer
+        for fact in ('Margin: "24.6%" (EBIT)', "Deal wins reached $42.7 billion.", "Attrition fell to 12.5%."):
+            self.assertIn(fact, payload)
+        self.assertIn("Answer 3:\n- [S1]", payload)
+        self.assertNotIn("hope this helps", payload)
+        self.assertNotIn(ENSEMBLE_MODELS[0], payload)
+
+        verbose = json.dumps(self.RESPONSES, indent=2)
+        self.assertLess(len(payload), 0.6 * len(verbose))
+
+    def test_candidates_are_capped(self):
+        long = [{"model": m, "response": f"Point {i} about {m}. " * 400} for i, m in enumerate(ENSEMBLE_MODELS)]
+        with patch.object(ensemble, "JUDGE_CANDIDATE_TOKENS", 100):
+            payload = ensemble.compact_candidates(long, 10000)
+        self.assertLess(count_tokens(payload), 3 * 100 + 50)
+        self.assertLess(count_tokens(ensemble.compact_candidates(long, 200)), 200)
+
+
+class TestScoreboard(unittest.TestCase):
+
+    def test_query_class(self):
+        self.assertEqual(query_class("What was TCS revenue growth in FY24?"), "quantitative")
+        self.assertEqual(query_class("Describe Infosys leadership strategy"), "qualitative")
+
+    def test_judge_outcomes_move_membership(self):
+        scoreboard = EnsembleScoreboard(explore_rate=0)
+        loser = ENSEMBLE_MODELS[2]
+        answers = {
+            ENSEMBLE_MODELS[0]: "Margins expanded on pricing power and offshore mix.",
+            ENSEMBLE_MODELS[1]: "Attrition fell while deal wins rose sharply.",
+            loser: "zzz unrelated filler text",
+        }
+        fake = FakeModels({}, answers=answers)
+        fake_judge = lambda prompt, model_id, **kwargs: answers[ENSEMBLE_MODELS[0]] if model_id == PLANNER_MODEL_ID \
+            else fake(prompt, model_id, **kwargs)
+        for _ in range(5):
+            run_ensemble(fake_judge, scoreboard=scoreboard, query="Explain the strategy")
+
+        snapshot = scoreboard.snapshot()
+        self.assertEqual(snapshot[ENSEMBLE_MODELS[0]]["classes"]["qualitative"]["picked"], 5)
+        self.assertEqual(snapshot[loser]["classes"]["qualitative"]["picked"], 0)
+        self.assertLess(snapshot[loser]["calls"], 5)  # dropped as soon as it fell behind
+        members = scoreboard.select("qualitative")
+        self.assertNotIn(loser, members)  # an untried candidate now outranks the model that keeps losing
+        self.assertEqual(scoreboard.select("quantitative"), ENSEMBLE_MODELS)  # scores are per class
+
+    def test_slow_and_failing_members_are_skipped(self):
+        slow, broken = ENSEMBLE_MODELS[0], ENSEMBLE_MODELS[1]
+        scoreboard = EnsembleScoreboard(latency_budget=10, min_samples=3, explore_rate=0)
+        for _ in range(3):
+            scoreboard.record_call(slow, 30.0, ok=True)
+            scoreboard.record_call(broken, 1.0, ok=False)
+        members = scoreboard.select("qualitative")
+        self.assertNotIn(slow, members)
+        self.assertNotIn(broken, members)  # ranked below the untried candidates
+        self.assertEqual(members, [ENSEMBLE_MODELS[2], *ENSEMBLE_CANDIDATES[3:]])
+
+    def test_cost_budget_and_exploration(self):
+        pricey = ENSEMBLE_MODELS[0]
+        scoreboard = EnsembleScoreboard(costs={pricey: 2.5, "default": 1.0}, cost_budget=3.0, explore_rate=0)
+        self.assertEqual(scoreboard.select("qualitative"), ENSEMBLE_MODELS[:1])  # nothing else fits beside it
+
+        scoreboard = EnsembleScoreboard(explore_rate=1.0, rng=random.Random(0))
+        members = scoreboard.select("qualitative")
+        self.assertEqual(members[:2], ENSEMBLE_MODELS[:2])
+        self.assertNotIn(members[2], ENSEMBLE_MODELS)
+
+    def test_scores_persist(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "scoreboard.sqlite")
+            first = EnsembleScoreboard(path)
+            first.record_call("m", 2.0, ok=False)
+            first.record_outcome("qualitative", picked="m")
+            restored = EnsembleScoreboard(path).snapshot()["m"]
+            self.assertEqual((restored["calls"], restored["errors"], restored["p50_seconds"]), (1, 1, 2.0))
+            self.assertEqual(restored["classes"]["qualitative"]["picked"], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
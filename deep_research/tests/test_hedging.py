@@ -0,0 +1,117 @@
+import asyncio
+import threading
+import time
+import unittest
+from unittest.mock import patch
+
+# Adjust import path to ensuring research_agent can be imported
+import sys
+import os
+os.environ['TAVILY_API_KEY'] = 'test_key' # Mock key to prevent Import Error
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from research_agent import hedging
+from research_agent.hedging import LatencyTracker, arun_hedged, hedge_delay, run_hedged
+from research_agent.rate_limiter import RateLimiter
+from research_agent.resilience import RetryableError
+
+
+class TestLatencyTracker(unittest.TestCase):
+
+    def test_percentile(self):
+        tracker = LatencyTracker(window=100)
+        for seconds in range(1, 21):
+            tracker.record("m", float(seconds))
+        self.assertEqual(tracker.percentile("m", 95), 19.0)
+        self.assertEqual(tracker.percentile("m", 50), 10.0)
+        self.assertIsNone(tracker.percentile("other", 95))
+
+    def test_window_drops_old_samples(self):
+        tracker = LatencyTracker(window=3)
+        for seconds in (100.0, 1.0, 2.0, 3.0):
+            tracker.record("m", seconds)
+        self.assertEqual(tracker.percentile("m", 100), 3.0)
+
+    def test_delay_needs_enough_samples(self):
+        tracker = LatencyTracker()
+        tracker.record("m", 50.0)
+        self.assertEqual(hedge_delay("m", tracker), hedging.HEDGE_DEFAULT_DELAY)
+        for _ in range(10):
+            tracker.record("m", 0.01)
+        self.assertEqual(hedge_delay("m", tracker), hedging.HEDGE_MIN_DELAY)
+
+
+class TestRunHedged(unittest.TestCase):
+
+    def test_slow_primary_is_hedged(self):
+        release = threading.Event()
+
+        def attempt(target, reserved):
+            if not reserved:
+                release.wait(2)
+                return "slow"
+            return "fast"
+
+        try:
+            self.assertEqual(run_hedged("m", attempt, lambda t: True, delay=0.05), ("m", "fast"))
+        finally:
+            release.set()
+
+    def test_fast_primary_sends_no_hedge(self):
+        reserved = []
+        result = run_hedged("m", lambda t, r: "ok", lambda t: reserved.append(t) or True, delay=1)
+        self.assertEqual(result, ("m", "ok"))
+        self.assertEqual(reserved, [])
+
+    def test_no_budget_means_no_hedge(self):
+        calls = []
+
+        def attempt(target, reserved):
+            calls.append(reserved)
+            time.sleep(0.1)
+            return "only"
+
+        limiter = RateLimiter()
+        limiter.wait_for_slot("m", 1)  # budget for this minute is used up
+        result = run_hedged("m", attempt, lambda t: limiter.try_acquire(t, 1), delay=0.01)
+        self.assertEqual(result, ("m", "only"))
+        self.assertEqual(calls, [False])
+
+    def test_error_waits_for_hedge(self):
+        def attempt(target, reserved):
+            if not reserved:
+                time.sleep(0.1)
+                raise RetryableError("boom", target)
+            time.sleep(0.2)
+            return "rescued"
+
+        self.assertEqual(run_hedged("m", attempt, lambda t: True, delay=0.05), ("m", "rescued"))
+
+    def test_hedge_goes_to_equivalent_model(self):
+        def attempt(target, reserved):
+            if target == "m":
+                time.sleep(0.5)
+            return target
+
+        with patch.dict(hedging.HEDGE_EQUIVALENTS, {"m": ["twin"]}):
+            self.assertEqual(run_hedged("m", attempt, lambda t: True, delay=0.05), ("twin", "twin"))
+
+    def test_async_losers_are_cancelled(self):
+        cancelled = []
+
+        async def attempt(target, reserved):
+            if not reserved:
+                try:
+                    await asyncio.sleep(5)
+                except asyncio.CancelledError:
+                    cancelled.append(target)
+                    raise
+            return "hedge"
+
+        result = asyncio.run(arun_hedged("m", attempt, lambda t: True, delay=0.05))
+        self.assertEqual(result, ("m", "hedge"))
+        self.assertEqual(cancelled, ["m"])
+
+
+if __name__ == '__main__':
+    unittest.main()
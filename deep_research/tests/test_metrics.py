@@ -0,0 +1,131 @@
+import json
+import unittest
+import urllib.request
+from unittest.mock import patch
+
+import httpx
+
+# Adjust import path to ensuring research_agent can be imported
+import sys
+import os
+os.environ['TAVILY_API_KEY'] = 'test_key' # Mock key to prevent Import Error
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from research_agent import clients
+from research_agent import metrics
+from research_agent.metrics import MetricsRegistry, instrument_tool, node_scope, start_metrics_server
+from research_agent.rate_limiter import RateLimiter
+from research_agent.resilience import CallPolicy
+
+
+class TestRegistry(unittest.TestCase):
+
+    def test_prometheus_text(self):
+        registry = MetricsRegistry()
+        calls = registry.counter("calls_total", "Calls.", ("model",))
+        latency = registry.histogram("latency_seconds", "Latency.", ("model",), buckets=(0.5, 1))
+        calls.inc(model="m")
+        calls.inc(2, model="m")
+        latency.observe(0.7, model="m")
+
+        text = registry.to_prometheus()
+        self.assertIn("# TYPE calls_total counter", text)
+        self.assertIn('calls_total{model="m"} 3', text)
+        self.assertIn('latency_seconds_bucket{model="m",le="0.5"} 0', text)
+        self.assertIn('latency_seconds_bucket{model="m",le="1"} 1', text)
+        self.assertIn('latency_seconds_bucket{model="m",le="+Inf"} 1', text)
+        self.assertIn('latency_seconds_count{model="m"} 1', text)
+
+    def test_snapshot_and_reregistration(self):
+        registry = MetricsRegistry()
+        registry.counter("calls_total", "Calls.", ("model",)).inc(model="m")
+        self.assertIs(registry.counter("calls_total", "Calls.", ("model",)), registry.counter("calls_total", "x"))
+        with self.assertRaises(ValueError):
+            registry.histogram("calls_total", "Calls.")
+
+        snapshot = json.loads(json.dumps(registry.snapshot()))
+        self.assertEqual(snapshot["metrics"]["calls_total"]["samples"], [{"labels": {"model": "m"}, "value": 1}])
+
+    def test_http_export(self):
+        registry = MetricsRegistry()
+        registry.counter("calls_total", "Calls.").inc()
+        server = start_metrics_server(0, host="127.0.0.1", registry=registry)
+        try:
+            base = f"http://127.0.0.1:{server.server_address[1]}"
+            with urllib.request.urlopen(f"{base}/metrics") as response:
+                self.assertIn("calls_total 1", response.read().decode())
+            with urllib.request.urlopen(f"{base}/metrics.json") as response:
+                self.assertIn("calls_total", json.loads(response.read())["metrics"])
+        finally:
+            server.shutdown()
+            server.server_close()
+
+
+class TestInstrumentation(unittest.TestCase):
+
+    def setUp(self):
+        metrics.REGISTRY.reset()
+        self.env = patch.dict(os.environ, {"OPENROUTER_API_KEY": "test", "DEEP_RESEARCH_NO_CACHE": "1"})
+        self.env.start()
+        self.limiter = patch.object(clients, "GLOBAL_RATE_LIMITER", RateLimiter())
+        self.limiter.start()
+        self.policy = patch.object(clients, "GLOBAL_CALL_POLICY", CallPolicy(sleep=lambda s: None))
+        self.policy.start()
+
+    def tearDown(self):
+        self.policy.stop()
+        self.limiter.stop()
+        self.env.stop()
+        metrics.REGISTRY.reset()
+
+    def use_transport(self, handler):
+        client = httpx.Client(transport=httpx.MockTransport(handler))
+        self.addCleanup(client.close)
+        return patch.object(clients, "get_http_client", return_value=client)
+
+    def test_tool_errors_are_labeled_with_node(self):
+        @instrument_tool("probe")
+        def probe(fail):
+            return "Error: upstream down" if fail else "fine"
+
+        with node_scope("executor"):
+            probe(False)
+            probe(True)
+        self.assertEqual(metrics.TOOL_LATENCY.count(tool="probe", node="executor", outcome="ok"), 1)
+        self.assertEqual(metrics.TOOL_LATENCY.count(tool="probe", node="executor", outcome="error"), 1)
+
+    def test_usage_latency_and_retries(self):
+        responses = iter([
+            httpx.Response(503, json={"error": {"message": "overloaded"}}),
+            httpx.Response(200, json={
+                "choices": [{"message": {"content": "pong"}}],
+                "usage": {"prompt_tokens": 12, "completion_tokens": 3},
+            }),
+        ])
+        with self.use_transport(lambda request: next(responses)), node_scope("planner"):
+            self.assertEqual(clients.call_openrouter("ping", "test/model", fallback=False), "pong")
+
+        self.assertEqual(metrics.LLM_PROMPT_TOKENS.value(model="test/model", node="planner"), 12)
+        self.assertEqual(metrics.LLM_COMPLETION_TOKENS.value(model="test/model", node="planner"), 3)
+        self.assertEqual(metrics.LLM_RETRIES.value(model="test/model", node="planner", action="retry"), 1)
+        self.assertEqual(metrics.LLM_LATENCY.count(model="test/model", node="planner", outcome="ok"), 1)
+        self.assertEqual(metrics.LLM_LATENCY.count(model="test/model", node="planner", outcome="RetryableError"), 1)
+
+    def test_stream_records_ttft(self):
+        body = (
+            'data: {"choices": [{"delta": {"content": "po"}}]}\n\n'
+            'data: {"choices": [{"delta": {"content": "ng"}}]}\n\n'
+            'data: {"choices": [{"delta": {}}], "usage": {"prompt_tokens": 4, "completion_tokens": 2}}\n\n'
+            'data: [DONE]\n\n'
+        )
+        handler = lambda request: httpx.Response(200, headers={"Content-Type": "text/event-stream"}, content=body)
+        with self.use_transport(handler), node_scope("reporter"):
+            self.assertEqual("".join(clients.stream_openrouter("ping", "test/model")), "pong")
+
+        self.assertEqual(metrics.LLM_TTFT.count(model="test/model", node="reporter"), 1)
+        self.assertEqual(metrics.LLM_COMPLETION_TOKENS.value(model="test/model", node="reporter"), 2)
+        self.assertEqual(metrics.LLM_LATENCY.count(model="test/model", node="reporter", outcome="ok"), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
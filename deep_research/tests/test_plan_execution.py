@@ -0,0 +1,169 @@
+import threading
+import time
+import unittest
+from unittest.mock import patch
+
+# Adjust import path to ensuring research_agent can be imported
+import sys
+import os
+os.environ['TAVILY_API_KEY'] = 'test_key' # Mock key to prevent Import Error
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import orchestrator
+from orchestrator import execute_plan, iter_plan, parse_plan, plan_dependencies, research_background_node
+
+# A typical 8-step plan: five independent lookups, two comparisons, one synthesis (critical path 3)
+RAW_PLAN = [
+    {"id": 1, "step": "get_company_fundamentals TCS.NS", "depends_on": []},
+    {"id": 2, "step": "get_company_fundamentals INFY.NS", "depends_on": []},
+    {"id": 3, "step": "get_historical_performance TCS.NS INFY.NS", "depends_on": []},
+    {"id": 4, "step": "tavily_search TCS deal wins", "depends_on": []},
+    {"id": 5, "step": "tavily_search Infosys deal wins", "depends_on": []},
+    {"id": 6, "step": "perform_ratio_analysis TCS.NS vs INFY.NS", "depends_on": [1, 2]},
+    {"id": 7, "step": "assess_competitive_forces TCS vs Infosys", "depends_on": [4, 5]},
+    {"id": 8, "step": "Synthesize report", "depends_on": [3, 6, 7]},
+]
+
+
+class FakeSteps:
+    """Stands in for run_step: sleeps, records the context each step saw and peak concurrency."""
+
+    def __init__(self, delay=0.2):
+        self.delay = delay
+        self.contexts = {}
+        self.active = 0
+        self.peak = 0
+        self.lock = threading.Lock()
+
+    def __call__(self, task, context_str):
+        with self.lock:
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+            self.contexts[task] = context_str
+        time.sleep(self.delay)
+        with self.lock:
+            self.active -= 1
+        return f"result of {task}"
+
+
+def plan_state(raw=RAW_PLAN, **extra):
+    plan, dependencies = parse_plan(raw)
+    return {"task": "Compare TCS and Infosys", "plan": plan, "plan_dependencies": dependencies,
+            "current_step_index": 0, "step_results": {}, **extra}
+
+
+class TestPlanGraph(unittest.TestCase):
+
+    def test_parse_plan(self):
+        plan, dependencies = parse_plan([
+            {"id": "a", "step": "first", "depends_on": []},
+            {"id": "b", "step": "second", "depends_on": ["a", "zzz", "c"]},  # unknown and later ids dropped
+            {"id": "c", "step": "third", "depends_on": "b"},
+            "bare string step",
+        ])
+        self.assertEqual(plan, ["first", "second", "third", "bare string step"])
+        self.assertEqual(dependencies, {"first": [], "second": ["first"], "third": ["second"]})
+
+    def test_undeclared_and_edited_steps_run_in_sequence(self):
+        state = plan_state()
+        self.assertEqual(plan_dependencies(state)[5], [0, 1])
+        state["plan"] = ["new first step"] + state["plan"][:5] + ["perform ratio analysis (edited)"] + state["plan"][6:]
+        graph = plan_dependencies(state)
+        self.assertEqual(graph[0], [])
+        self.assertEqual(graph[1], [])               # still independent
+        self.assertEqual(graph[6], [5])              # edited: waits for the step before it
+        self.assertEqual(plan_dependencies({"plan": ["a", "b", "c"]}), [[], [0], [1]])
+
+
+class TestExecutePlan(unittest.TestCase):
+
+    def test_runs_in_critical_path_time(self):
+        fake = FakeSteps()
+        started = time.monotonic()
+        with patch.object(orchestrator, "run_step", fake):
+            results = execute_plan(plan_state(), width=8)
+        elapsed = time.monotonic() - started
+
+        self.assertLess(elapsed, 0.2 * 3 + 0.35)  # sequentially it would take 8 x 0.2s
+        self.assertEqual(list(results), plan_state()["plan"])  # merged in plan order, not finish order
+        synthesis = fake.contexts["Synthesize report"]
+        for step in plan_state()["plan"][:7]:
+            self.assertIn(f"result of {step}", synthesis)  # transitive dependencies are in context
+        self.assertNotIn("INFY.NS", fake.contexts["assess_competitive_forces TCS vs Infosys"])
+
+    def test_width_caps_concurrency(self):
+        fake = FakeSteps(delay=0.05)
+        with patch.object(orchestrator, "run_step", fake):
+            execute_plan(plan_state(), width=2)
+        self.assertEqual(fake.peak, 2)
+
+    def test_finished_steps_are_not_rerun(self):
+        fake = FakeSteps(delay=0)
+        done = {"get_company_fundamentals TCS.NS": "cached fundamentals"}
+        with patch.object(orchestrator, "run_step", fake):
+            results = execute_plan(plan_state(step_results=done))
+        self.assertNotIn("get_company_fundamentals TCS.NS", fake.contexts)
+        self.assertEqual(results["get_company_fundamentals TCS.NS"], "cached fundamentals")
+        self.assertIn("cached fundamentals", fake.contexts["perform_ratio_analysis TCS.NS vs INFY.NS"])
+
+    def test_iter_plan_reports_each_step(self):
+        state = plan_state()
+        with patch.object(orchestrator, "run_step", FakeSteps(delay=0.01)):
+            events = list(iter_plan(state))
+        self.assertEqual(sorted(index for index, _, _ in events), list(range(8)))
+        self.assertEqual(events[-1][1], "Synthesize report")
+        self.assertEqual(list(state["step_results"]), state["plan"])
+        self.assertEqual(state["current_step_index"], 8)
+
+
+class FakeTool:
+    """Stands in for a LangChain tool: .invoke sleeps `delay(query)` seconds and echoes the query."""
+
+    def __init__(self, delay, reply=None):
+        self.delay = delay
+        self.reply = reply
+        self.queries = []
+
+    def invoke(self, args):
+        self.queries.append(args["query"])
+        time.sleep(self.delay(args["query"]))
+        return self.reply or f"results for {args['query']}"
+
+
+class TestBackgroundResearch(unittest.TestCase):
+
+    def run_node(self, search_delay, timeout=5):
+        gemini = FakeTool(lambda q: 0.2, reply='{"core_entity": "Indian IT", "generic_search": "Indian IT services outlook"}')
+        search = FakeTool(search_delay)
+        with patch.object(orchestrator, "ask_gemini_cli_tool", gemini), \
+             patch.object(orchestrator, "tavily_search", search), \
+             patch.object(orchestrator, "BACKGROUND_BRANCH_TIMEOUT", timeout):
+            started = time.monotonic()
+            result = research_background_node({"task": "Compare TCS, Infosys and Wipro margins"})
+        return result, search, time.monotonic() - started
+
+    def test_branches_run_concurrently_for_every_company(self):
+        result, search, elapsed = self.run_node(lambda q: 0.2)
+        self.assertLess(elapsed, 0.4 + 0.25)  # Slowest branch is analysis + search; sequentially 1.0s
+        self.assertEqual(len(search.queries), 4)
+        background = result["background_research"]
+        self.assertTrue(background.startswith("## CORE ENTITY RESEARCH: Indian IT"))
+        for company in ("TCS.NS", "INFY.NS", "WIPRO.NS"):
+            self.assertIn(f"## {company} NEWS", background)
+
+    def test_slow_and_failed_branches_are_left_out(self):
+        def delay(query):
+            if "WIPRO" in query:
+                raise RuntimeError("search down")
+            return 2 if "INFY" in query else 0
+        result, _, elapsed = self.run_node(delay, timeout=0.5)
+        self.assertLess(elapsed, 1)
+        background = result["background_research"]
+        self.assertIn("## TCS.NS NEWS", background)
+        self.assertIn("## CORE ENTITY RESEARCH", background)
+        self.assertNotIn("INFY.NS", background)
+        self.assertNotIn("WIPRO.NS", background)
+
+
+if __name__ == '__main__':
+    unittest.main()
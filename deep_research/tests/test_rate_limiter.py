@@ -0,0 +1,402 @@
+import asyncio
+import subprocess
+import tempfile
+import threading
+import time
+import unittest
+import unittest.mock
+
+# Adjust import path to ensuring research_agent can be imported
+import sys
+import os
+os.environ['TAVILY_API_KEY'] = 'test_key' # Mock key to prevent Import Error
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from research_agent.config import LEVEL_5_MODEL, MODEL_LIMITS, MODEL_MAX_IN_FLIGHT, MODEL_TPM_LIMITS
+from research_agent import metrics
+from research_agent.metrics import node_scope
+from research_agent.rate_limiter import AdaptiveLimits, ModelLimits, RateLimiter, SQLiteBackend, limits_for
+from research_agent.scheduling import current_priority, current_session, priority_scope, session_scope
+
+
+class TestRateLimiter(unittest.TestCase):
+
+    def test_waiters_are_served_in_arrival_order(self):
+        limiter = RateLimiter(window=0.2)
+        limiter.wait_for_slot("m", 1)
+        order = []
+
+        def worker(i):
+            limiter.wait_for_slot("m", 1)
+            order.append(i)
+
+        threads = []
+        for i in range(4):
+            thread = threading.Thread(target=worker, args=(i,))
+            thread.start()
+            threads.append(thread)
+            while limiter.queue_depth("m") < i + 1:  # enqueue strictly one after another
+                time.sleep(0.001)
+        for thread in threads:
+            thread.join(5)
+
+        self.assertEqual(order, [0, 1, 2, 3])
+        self.assertEqual(limiter.queue_depth("m"), 0)
+
+    def test_waiting_on_one_model_does_not_block_another(self):
+        limiter = RateLimiter(window=0.5)
+        limiter.wait_for_slot("busy", 1)
+        blocked = threading.Thread(target=limiter.wait_for_slot, args=("busy", 1))
+        blocked.start()
+
+        started = time.monotonic()
+        limiter.wait_for_slot("idle", 1)
+        self.assertLess(time.monotonic() - started, 0.1)
+        blocked.join(5)
+
+    def test_try_acquire_does_not_jump_the_queue(self):
+        limiter = RateLimiter(window=0.2)
+        limiter.wait_for_slot("m", 1)
+        waiter = threading.Thread(target=limiter.wait_for_slot, args=("m", 1))
+        waiter.start()
+        while not limiter.queue_depth("m"):
+            time.sleep(0.001)
+        self.assertFalse(limiter.try_acquire("m", 1))
+        waiter.join(5)
+        self.assertFalse(limiter.try_acquire("m", 1))  # the waiter took the slot that freed up
+
+    def test_async_acquire_yields_to_the_event_loop(self):
+        limiter = RateLimiter(window=0.2)
+        ticks = []
+
+        async def ticker():
+            for _ in range(5):
+                ticks.append(time.monotonic())
+                await asyncio.sleep(0.02)
+
+        async def run():
+            await limiter.async_wait_for_slot("m", 1)
+            await asyncio.gather(limiter.async_wait_for_slot("m", 1), ticker())
+
+        started = time.monotonic()
+        asyncio.run(run())
+        self.assertGreaterEqual(time.monotonic() - started, 0.15)
+        self.assertEqual(len(ticks), 5)
+
+    def test_cancelled_waiter_hands_over_its_place(self):
+        limiter = RateLimiter(window=0.2)
+
+        async def run():
+            await limiter.async_wait_for_slot("m", 1)
+            first = asyncio.create_task(limiter.async_wait_for_slot("m", 1))
+            second = asyncio.create_task(limiter.async_wait_for_slot("m", 1))
+            await asyncio.sleep(0.01)
+            first.cancel()
+            await asyncio.wait_for(second, 1)
+            return first.cancelled()
+
+        self.assertTrue(asyncio.run(run()))
+        self.assertEqual(limiter.queue_depth("m"), 0)
+
+    def test_threads_and_coroutines_share_one_queue(self):
+        limiter = RateLimiter(window=0.2)
+        limiter.wait_for_slot("m", 1)
+        order = []
+
+        def sync_worker():
+            limiter.wait_for_slot("m", 1)
+            order.append("thread")
+
+        thread = threading.Thread(target=sync_worker)
+        thread.start()
+        while not limiter.queue_depth("m"):
+            time.sleep(0.001)
+
+        async def async_worker():
+            await limiter.async_wait_for_slot("m", 1)
+            order.append("coroutine")
+
+        asyncio.run(async_worker())
+        thread.join(5)
+        self.assertEqual(order, ["thread", "coroutine"])
+
+
+
+class TestScheduling(unittest.TestCase):
+    """A single in-flight slot makes admissions strictly sequential, so the order is observable."""
+
+    limits = ModelLimits(max_in_flight=1)
+
+    def queue(self, limiter, callers):
+        """Queues (label, priority, session) callers one after another behind a held slot; returns admission order."""
+        order = []
+        lease = limiter.acquire("m", self.limits)
+
+        def worker(label, priority, session):
+            with limiter.acquire("m", self.limits, priority=priority, session=session):
+                order.append(label)
+
+        threads = []
+        for i, caller in enumerate(callers):
+            thread = threading.Thread(target=worker, args=caller)
+            thread.start()
+            threads.append(thread)
+            while limiter.queue_depth("m") < i + 1:
+                time.sleep(0.001)
+        lease.release()
+        for thread in threads:
+            thread.join(5)
+        return order
+
+    def test_higher_priority_is_admitted_first(self):
+        order = self.queue(RateLimiter(), [
+            ("bg1", "background", "a"), ("bg2", "background", "a"),
+            ("exec", "executor", "a"), ("plan", "interactive", "b"),
+        ])
+        self.assertEqual(order, ["plan", "exec", "bg1", "bg2"])
+
+    def test_sessions_share_fairly(self):
+        burst = [(f"a{i}", "executor", "a") for i in range(6)]
+        order = self.queue(RateLimiter(), burst + [("b0", "executor", "b"), ("b1", "executor", "b")])
+        # b arrived behind a's whole burst but alternates with it instead of waiting for all six
+        self.assertEqual(order[:4], ["a0", "b0", "a1", "b1"])
+        self.assertEqual(order[4:], ["a2", "a3", "a4", "a5"])
+
+    def test_queue_snapshot_and_gauge(self):
+        metrics.REGISTRY.reset()
+        limiter = RateLimiter()
+        lease = limiter.acquire("m", self.limits)
+        thread = threading.Thread(target=lambda: limiter.acquire("m", self.limits, priority="background", session="s").release())
+        thread.start()
+        while not limiter.queue_depth("m"):
+            time.sleep(0.001)
+
+        snapshot = limiter.queue_snapshot()["m"]
+        self.assertEqual(snapshot["depth"], 1)
+        self.assertEqual(snapshot["by_priority"], {"background": 1})
+        self.assertEqual(snapshot["by_session"], {"s": 1})
+        self.assertEqual(metrics.RATE_LIMIT_QUEUE_DEPTH.value(model="m", priority="background"), 1)
+
+        lease.release()
+        thread.join(5)
+        self.assertEqual(limiter.queue_snapshot(), {})
+        self.assertEqual(metrics.RATE_LIMIT_QUEUE_DEPTH.value(model="m", priority="background"), 0)
+        self.assertEqual(metrics.RATE_LIMIT_WAIT.count(model="m", priority="background"), 1)
+        metrics.REGISTRY.reset()
+
+    def test_priority_and_session_come_from_context(self):
+        self.assertEqual(current_priority(), "executor")
+        with node_scope("planner"):
+            self.assertEqual(current_priority(), "interactive")
+            with priority_scope("background"):
+                self.assertEqual(current_priority(), "background")
+        with session_scope("alice", weight=2):
+            self.assertEqual(current_session(), ("alice", 2.0))
+        self.assertEqual(current_session(), ("default", 1.0))
+        with self.assertRaises(ValueError):
+            with priority_scope("urgent"):
+                pass
+
+
+
+class TestTokenAndConcurrencyLimits(unittest.TestCase):
+
+    def test_limits_come_from_config(self):
+        self.assertEqual(limits_for(LEVEL_5_MODEL), ModelLimits(
+            MODEL_LIMITS[LEVEL_5_MODEL], MODEL_TPM_LIMITS[LEVEL_5_MODEL], MODEL_MAX_IN_FLIGHT[LEVEL_5_MODEL]))
+        self.assertEqual(limits_for("unknown/model").rpm, MODEL_LIMITS["default"])
+
+    def test_tpm_blocks_until_tokens_leave_the_window(self):
+        limiter = RateLimiter(window=0.2)
+        limits = ModelLimits(tpm=1000)
+        limiter.acquire("m", limits, tokens=800)
+        self.assertIsNone(limiter.try_acquire("m", limits, tokens=300))
+        self.assertIsNotNone(limiter.try_acquire("m", limits, tokens=200))
+
+        started = time.monotonic()
+        limiter.acquire("m", limits, tokens=300)
+        self.assertGreaterEqual(time.monotonic() - started, 0.15)
+
+    def test_usage_corrects_the_estimate(self):
+        limiter = RateLimiter(window=60)
+        limits = ModelLimits(tpm=1000)
+        lease = limiter.acquire("m", limits, tokens=100)
+        self.assertIsNotNone(limiter.try_acquire("m", limits, tokens=800))
+        limiter.try_acquire("m", limits, tokens=0)
+
+        lease.settle(900)  # the answer was far longer than the prompt estimate
+        self.assertIsNone(limiter.try_acquire("m", limits, tokens=1))
+        lease.settle(50)
+        self.assertIsNotNone(limiter.try_acquire("m", limits, tokens=100))
+
+    def test_late_settle_after_the_window_is_ignored(self):
+        limiter = RateLimiter(window=0.1)
+        limits = ModelLimits(tpm=1000)
+        lease = limiter.acquire("m", limits, tokens=100)
+        time.sleep(0.15)
+        self.assertIsNotNone(limiter.try_acquire("m", limits, tokens=0))  # prunes the expired ticket
+        lease.settle(1200)  # a long stream that finished after its admission left the window
+        self.assertIsNotNone(limiter.try_acquire("m", limits, tokens=900))
+
+    def test_oversized_request_waits_for_an_empty_window(self):
+        limiter = RateLimiter(window=0.1)
+        limits = ModelLimits(tpm=100)
+        limiter.acquire("m", limits, tokens=10)
+        started = time.monotonic()
+        limiter.acquire("m", limits, tokens=5000)
+        self.assertGreaterEqual(time.monotonic() - started, 0.05)
+
+    def test_in_flight_slot_is_held_until_release(self):
+        limiter = RateLimiter()
+        limits = ModelLimits(max_in_flight=1)
+        lease = limiter.acquire("m", limits)
+        admitted = threading.Event()
+
+        def second():
+            with limiter.acquire("m", limits):
+                admitted.set()
+
+        thread = threading.Thread(target=second)
+        thread.start()
+        self.assertFalse(admitted.wait(0.1))
+        lease.release()
+        lease.release()  # idempotent
+        self.assertTrue(admitted.wait(1))
+        thread.join(1)
+        self.assertIsNotNone(limiter.try_acquire("m", limits))
+
+
+
+class TestSQLiteBackend(unittest.TestCase):
+    """Separate limiters on one file stand in for separate worker processes."""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "limits.sqlite")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def limiter(self, window=60.0):
+        return RateLimiter(window=window, backend=SQLiteBackend(self.path, poll_interval=0.02))
+
+    def test_workers_share_one_quota(self):
+        first, second = self.limiter(), self.limiter()
+        first.acquire("m", ModelLimits(rpm=2))
+        self.assertIsNotNone(second.try_acquire("m", ModelLimits(rpm=2)))
+        self.assertIsNone(first.try_acquire("m", ModelLimits(rpm=2)))
+        self.assertIsNotNone(second.try_acquire("other", ModelLimits(rpm=2)))
+
+    def test_history_survives_restart(self):
+        self.limiter().acquire("m", ModelLimits(tpm=1000), tokens=900)
+        restarted = self.limiter()
+        self.assertIsNone(restarted.try_acquire("m", ModelLimits(tpm=1000), tokens=200))
+
+    def test_release_in_another_worker_admits_waiter(self):
+        first, second = self.limiter(), self.limiter()
+        limits = ModelLimits(max_in_flight=1)
+        lease = first.acquire("m", limits)
+        admitted = threading.Event()
+        thread = threading.Thread(target=lambda: second.acquire("m", limits) and admitted.set())
+        thread.start()
+        self.assertFalse(admitted.wait(0.1))
+        lease.release()
+        self.assertTrue(admitted.wait(1))
+        thread.join(1)
+
+    def test_slot_of_crashed_process_is_reclaimed(self):
+        script = (
+            "import sys; sys.path.insert(0, sys.argv[1])\n"
+            "from research_agent.rate_limiter import ModelLimits, RateLimiter, SQLiteBackend\n"
+            "RateLimiter(backend=SQLiteBackend(sys.argv[2])).acquire('m', ModelLimits(max_in_flight=1))\n"
+        )
+        root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+        subprocess.run([sys.executable, "-c", script, root, self.path], check=True, timeout=60)
+        # The child exited holding the only slot without releasing it
+        self.assertIsNotNone(self.limiter().try_acquire("m", ModelLimits(max_in_flight=1)))
+
+
+
+class TestAdaptiveLimits(unittest.TestCase):
+
+    def setUp(self):
+        self.now = 1000.0
+        self.configured = ModelLimits(rpm=10, tpm=5000)
+
+    def adaptive(self, path=None):
+        return AdaptiveLimits(path, cooldown=5, persist_interval=0, clock=lambda: self.now)
+
+    def test_additive_increase_multiplicative_decrease(self):
+        adaptive = self.adaptive()
+        for _ in range(10):
+            adaptive.on_success("m", self.configured, pressed=True)
+        self.assertEqual(adaptive.limits("m", self.configured).rpm, 10)
+        self.assertAlmostEqual(adaptive.snapshot()["m"]["rpm"], 11, delta=0.1)
+
+        adaptive.on_throttled("m", self.configured)
+        adaptive.on_throttled("m", self.configured)  # same burst, inside the cooldown
+        self.assertEqual(adaptive.limits("m", self.configured).rpm, 5)
+        self.now += 6
+        adaptive.on_throttled("m", self.configured)
+        self.assertEqual(adaptive.limits("m", self.configured).rpm, 2)
+
+    def test_growth_is_capped(self):
+        adaptive = AdaptiveLimits(increase=100, max_factor=2)
+        for _ in range(50):
+            adaptive.on_success("m", self.configured, pressed=True)
+        self.assertEqual(adaptive.limits("m", self.configured).rpm, 20)
+
+    def test_headers_seed_and_cap(self):
+        adaptive = self.adaptive()
+        headers = {"X-RateLimit-Limit": "20", "x-ratelimit-limit-tokens": "40000"}
+        adaptive.on_success("m", self.configured, headers)
+        for _ in range(100):
+            adaptive.on_success("m", self.configured, headers, pressed=True)
+        self.assertEqual(adaptive.limits("m", self.configured), ModelLimits(rpm=20, tpm=40000))
+
+    def test_learned_limits_persist(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "limits.sqlite")
+            self.adaptive(path).on_throttled("m", self.configured)
+            self.assertEqual(self.adaptive(path).limits("m", self.configured).rpm, 5)
+
+    def test_no_growth_without_pressure(self):
+        adaptive = self.adaptive()
+        for _ in range(100):
+            adaptive.on_success("m", self.configured)
+        self.assertEqual(adaptive.snapshot()["m"]["rpm"], 10)
+
+    def test_limiter_grows_only_once_requests_press_the_limit(self):
+        limiter = RateLimiter(adaptive=self.adaptive())
+        configured = ModelLimits(rpm=10)
+        with unittest.mock.patch("research_agent.rate_limiter.limits_for", return_value=configured):
+            for _ in range(7):  # Well under the limit
+                limiter.try_acquire("m", configured)
+                limiter.observe("m", 200)
+            self.assertEqual(limiter.adaptive.snapshot()["m"]["rpm"], 10)
+            limiter.try_acquire("m", configured)  # 8 of 10 in the window: near the limit
+            limiter.observe("m", 200)
+        self.assertGreater(limiter.adaptive.snapshot()["m"]["rpm"], 10)
+
+    def test_config_change_reseeds_learned_limits(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "limits.sqlite")
+            self.adaptive(path).on_throttled("m", self.configured)
+            self.assertEqual(self.adaptive(path).limits("m", self.configured).rpm, 5)
+            raised = ModelLimits(rpm=30, tpm=5000)
+            self.assertEqual(self.adaptive(path).limits("m", raised).rpm, 30)
+
+            adaptive = self.adaptive()
+            adaptive.on_throttled("m", self.configured)
+            self.assertEqual(adaptive.limits("m", raised).rpm, 30)
+
+    def test_limiter_enforces_learned_rpm(self):
+        limiter = RateLimiter(adaptive=self.adaptive())
+        with unittest.mock.patch("research_agent.rate_limiter.limits_for", return_value=ModelLimits(rpm=2)):
+            limiter.observe("m", 429)
+        self.assertIsNotNone(limiter.try_acquire("m", ModelLimits(rpm=2)))
+        self.assertIsNone(limiter.try_acquire("m", ModelLimits(rpm=2)))
+
+
+if __name__ == '__main__':
+    unittest.main()
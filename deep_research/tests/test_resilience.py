@@ -0,0 +1,190 @@
+import asyncio
+import unittest
+
+# Adjust import path to ensuring research_agent can be imported
+import sys
+import os
+os.environ['TAVILY_API_KEY'] = 'test_key' # Mock key to prevent Import Error
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from research_agent.resilience import (
+    CallPolicy,
+    CircuitBreaker,
+    Deadline,
+    DeadlineExceeded,
+    FatalError,
+    RetryableError,
+    backoff_delay,
+    error_for_status,
+    retry_after_seconds,
+)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestRetryAfter(unittest.TestCase):
+
+    def test_retry_after_seconds(self):
+        self.assertEqual(retry_after_seconds({"Retry-After": "7"}), 7.0)
+
+    def test_retry_after_http_date(self):
+        headers = {"Retry-After": "Thu, 01 Jan 1970 00:00:30 GMT"}
+        self.assertAlmostEqual(retry_after_seconds(headers, now=10), 20.0)
+
+    def test_ratelimit_reset_epoch_millis(self):
+        self.assertAlmostEqual(retry_after_seconds({"X-RateLimit-Reset": "1700000005000"}, now=1700000000), 5.0)
+
+    def test_ratelimit_reset_duration(self):
+        self.assertEqual(retry_after_seconds({"x-ratelimit-reset-requests": "1m30s"}), 90.0)
+        self.assertAlmostEqual(retry_after_seconds({"x-ratelimit-reset-tokens": "250ms"}), 0.25)
+
+    def test_no_hint(self):
+        self.assertIsNone(retry_after_seconds({}))
+
+    def test_backoff_respects_hint_and_cap(self):
+        self.assertEqual(backoff_delay(0, retry_after=3), 3)
+        self.assertEqual(backoff_delay(0, retry_after=999, cap=30), 30)
+        self.assertLessEqual(backoff_delay(10, cap=5), 5)
+
+    def test_status_mapping(self):
+        self.assertIsInstance(error_for_status(429, "", "m"), RetryableError)
+        self.assertIsInstance(error_for_status(503, "", "m"), RetryableError)
+        self.assertIsInstance(error_for_status(401, "", "m"), FatalError)
+
+
+class TestCircuitBreaker(unittest.TestCase):
+
+    def test_opens_then_half_opens_with_single_probe(self):
+        clock = FakeClock()
+        breaker = CircuitBreaker(failure_threshold=2, reset_seconds=10, clock=clock)
+        breaker.record_failure()
+        self.assertEqual(breaker.state, "closed")
+        breaker.record_failure()
+        self.assertFalse(breaker.allow())
+
+        clock.now = 10
+        self.assertTrue(breaker.allow())
+        self.assertFalse(breaker.allow())  # only one probe at a time
+
+        breaker.record_success()
+        self.assertEqual(breaker.state, "closed")
+
+    def test_failed_probe_reopens(self):
+        clock = FakeClock()
+        breaker = CircuitBreaker(failure_threshold=1, reset_seconds=10, clock=clock)
+        breaker.record_failure()
+        clock.now = 10
+        self.assertTrue(breaker.allow())
+        breaker.record_failure()
+        self.assertEqual(breaker.state, "open")
+
+
+class TestCallPolicy(unittest.TestCase):
+
+    def setUp(self):
+        self.sleeps = []
+        self.policy = CallPolicy(max_attempts=3, failover_after=2.0, sleep=self.sleeps.append)
+
+    def test_retries_then_succeeds(self):
+        calls = []
+
+        def attempt(model_id, timeout):
+            calls.append(model_id)
+            if len(calls) < 3:
+                raise RetryableError("busy", model_id, retry_after=0.5)
+            return "ok"
+
+        self.assertEqual(self.policy.run(["a", "b"], attempt), ("a", "ok"))
+        self.assertEqual(calls, ["a", "a", "a"])
+        self.assertEqual(self.sleeps, [0.5, 0.5])
+
+    def test_fatal_error_fails_over_immediately(self):
+        calls = []
+
+        def attempt(model_id, timeout):
+            calls.append(model_id)
+            if model_id == "a":
+                raise FatalError("bad request", model_id)
+            return "ok"
+
+        self.assertEqual(self.policy.run(["a", "b"], attempt), ("b", "ok"))
+        self.assertEqual(calls, ["a", "b"])
+        self.assertEqual(self.sleeps, [])
+
+    def test_raises_last_error_when_chain_exhausted(self):
+        def attempt(model_id, timeout):
+            raise FatalError(f"{model_id} down", model_id)
+
+        with self.assertRaises(FatalError) as raised:
+            self.policy.run(["a", "b"], attempt)
+        self.assertIn("b down", str(raised.exception))
+
+    def test_open_circuit_is_skipped(self):
+        for _ in range(5):
+            self.policy.breaker("a").record_failure()
+        self.assertEqual(self.policy.run(["a", "b"], lambda m, t: m), ("b", "b"))
+
+    def test_expired_deadline(self):
+        with self.assertRaises(DeadlineExceeded):
+            self.policy.run(["a"], lambda m, t: "ok", Deadline(0))
+
+    def test_arun_times_out_slow_attempt(self):
+        async def attempt(model_id, timeout):
+            await asyncio.sleep(1)
+            return "late"
+
+        with self.assertRaises(DeadlineExceeded):
+            asyncio.run(self.policy.arun(["a"], attempt, Deadline(0.05)))
+
+
+
+class TestProbeRelease(unittest.TestCase):
+    """However a half-open probe ends, the breaker must not stay stuck waiting for it."""
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.policy = CallPolicy(max_attempts=1, sleep=lambda s: None)
+        self.breaker = CircuitBreaker(failure_threshold=1, reset_seconds=10, clock=self.clock)
+        self.policy._breakers["a"] = self.breaker
+        self.breaker.record_failure()
+        self.clock.now = 10
+        self.assertEqual(self.breaker.state, "half_open")
+
+    def test_fatal_error_closes_the_circuit(self):
+        def attempt(model_id, timeout):
+            raise FatalError("prompt does not fit", model_id)
+
+        with self.assertRaises(FatalError):
+            self.policy.run(["a"], attempt)
+        self.assertEqual(self.breaker.state, "closed")
+        self.assertTrue(self.breaker.allow())
+
+    def test_unexpected_exception_reopens_the_circuit(self):
+        def attempt(model_id, timeout):
+            raise KeyError("choices")
+
+        with self.assertRaises(KeyError):
+            self.policy.run(["a"], attempt)
+        self.assertEqual(self.breaker.state, "open")
+        self.clock.now = 20
+        self.assertTrue(self.breaker.allow())
+
+    def test_arun_deadline_reopens_the_circuit(self):
+        async def attempt(model_id, timeout):
+            await asyncio.sleep(1)
+
+        with self.assertRaises(DeadlineExceeded):
+            asyncio.run(self.policy.arun(["a"], attempt, Deadline(0.05)))
+        self.assertEqual(self.breaker.state, "open")
+        self.clock.now = 20
+        self.assertTrue(self.breaker.allow())
+
+
+if __name__ == '__main__':
+    unittest.main()
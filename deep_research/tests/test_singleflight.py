@@ -0,0 +1,95 @@
+import asyncio
+import threading
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+
+# Adjust import path to ensuring research_agent can be imported
+import sys
+import os
+os.environ['TAVILY_API_KEY'] = 'test_key' # Mock key to prevent Import Error
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from research_agent import tools
+from research_agent.singleflight import GLOBAL_SINGLE_FLIGHT, SingleFlight, coalesce, flight_key
+
+
+class TestSingleFlight(unittest.TestCase):
+
+    def test_concurrent_calls_share_one_execution(self):
+        flight = SingleFlight()
+        calls = []
+        started = threading.Event()
+
+        def work():
+            calls.append(1)
+            started.set()
+            time.sleep(0.1)
+            return "shared"
+
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            leader = pool.submit(flight.do, "k", work)
+            started.wait(1)
+            followers = [pool.submit(flight.do, "k", work) for _ in range(3)]
+            results = [leader.result()] + [f.result() for f in followers]
+
+        self.assertEqual(results, ["shared"] * 4)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(flight.stats(), {"in_flight": 0, "coalesced": 3})
+
+    def test_errors_are_shared_and_not_remembered(self):
+        flight = SingleFlight()
+        with self.assertRaises(ValueError):
+            flight.do("k", lambda: (_ for _ in ()).throw(ValueError("boom")))
+        self.assertEqual(flight.do("k", lambda: "fresh"), "fresh")
+
+    def test_async_calls_share_one_execution(self):
+        flight = SingleFlight()
+        calls = []
+
+        async def work():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            return "shared"
+
+        async def run():
+            return await asyncio.gather(*[flight.ado("k", work) for _ in range(3)])
+
+        self.assertEqual(asyncio.run(run()), ["shared"] * 3)
+        self.assertEqual(len(calls), 1)
+
+    def test_key_ignores_argument_spelling_and_skips_callables(self):
+        seen = []
+
+        @coalesce("probe")
+        def probe(prompt, model_id, on_token=None):
+            seen.append((prompt, model_id))
+            return prompt
+
+        with patch.object(GLOBAL_SINGLE_FLIGHT, "do", wraps=GLOBAL_SINGLE_FLIGHT.do) as do:
+            probe("p", "m")
+            probe(prompt="p", model_id="m")
+            probe("p", "m", on_token=print)
+        self.assertEqual(do.call_count, 2)
+        self.assertEqual(do.call_args_list[0].args[0], do.call_args_list[1].args[0])
+        self.assertIsNone(flight_key("probe", {"on_token": print}))
+
+    def test_tool_calls_coalesce(self):
+        calls = []
+
+        def fake_search(query, **kwargs):
+            calls.append(query)
+            time.sleep(0.1)
+            return {"results": []}
+
+        with patch.object(tools.tavily_client, "search", side_effect=fake_search):
+            with ThreadPoolExecutor(max_workers=3) as pool:
+                results = list(pool.map(lambda _: tools.tavily_search.invoke({"query": "TCS"}), range(3)))
+
+        self.assertEqual(len(set(results)), 1)
+        self.assertEqual(calls, ["TCS"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,108 @@
+import unittest
+from unittest.mock import MagicMock, patch
+
+# Adjust import path to ensuring research_agent can be imported
+import sys
+import os
+os.environ['TAVILY_API_KEY'] = 'test_key' # Mock key to prevent Import Error
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import orchestrator
+from research_agent import skills
+from research_agent.step_parser import parse_step
+from research_agent.tool_registry import ToolRegistry
+
+
+class TestParseStep(unittest.TestCase):
+
+    def test_well_formed_steps(self):
+        cases = {
+            "get_company_fundamentals TCS.NS": ("get_company_fundamentals", {"ticker": "TCS.NS"}),
+            "2. get_company_fundamentals(INFY.NS)": ("get_company_fundamentals", {"ticker": "INFY.NS"}),
+            "tavily_search TCS deal wins (FY24)": ("tavily_search", {"query": "TCS deal wins (FY24)"}),
+            "get_historical_performance TCS.NS, INFY.NS vs WIPRO.NS period=3y":
+                ("get_historical_performance", {"tickers": "TCS.NS INFY.NS WIPRO.NS", "period": "3y"}),
+            "get_historical_performance ^NSEI": ("get_historical_performance", {"tickers": "^NSEI"}),
+            "assess_competitive_forces TCS vs Infosys": ("assess_competitive_forces", {"query": "TCS vs Infosys"}),
+            "load_skill perform_ratio_analysis": ("load_skill", {"skill_name": "financial_ratio_diagnostics"}),
+            'TOOL: get_company_fundamentals ARGS: {"ticker": "HCLTECH.NS"}':
+                ("get_company_fundamentals", {"ticker": "HCLTECH.NS"}),
+        }
+        for step, expected in cases.items():
+            with self.subTest(step=step):
+                self.assertEqual(parse_step(step), expected)
+
+    def test_ambiguous_steps_are_left_to_the_llm(self):
+        for step in [
+            "Synthesize report",
+            "Compare operating margins of TCS and Infosys",
+            "get_company_fundamentals for TCS and Infosys",            # Prose, two companies
+            "get_historical_performance TCS.NS over the last decade",  # Period in words
+            "tavily_search",                                           # No query
+            "load_skill porter_analysis",                              # Unknown skill
+            "get_company_fundamentals {not json}",
+            "tavily_searching for deal wins",                          # Not a tool name
+        ]:
+            with self.subTest(step=step):
+                self.assertIsNone(parse_step(step))
+
+
+class TestRunStepDispatch(unittest.TestCase):
+
+    def fake_registry(self):
+        """A registry whose fundamentals and search tools record their calls instead of going out."""
+        self.calls = []
+        registry = ToolRegistry(limits={"default": {"timeout": 5, "max_concurrency": 2, "cost_class": "free"}})
+
+        def get_company_fundamentals(ticker: str) -> str:
+            self.calls.append(("get_company_fundamentals", ticker))
+            return "Revenue: 2.4T"
+
+        def tavily_search(query: str) -> str:
+            self.calls.append(("tavily_search", query))
+            return "news"
+
+        registry.register_function("get_company_fundamentals", get_company_fundamentals)
+        registry.register_function("tavily_search", tavily_search)
+        return patch.object(orchestrator, "GLOBAL_TOOL_REGISTRY", registry)
+
+    def test_parsed_steps_skip_the_executor_llm(self):
+        llm = MagicMock(side_effect=AssertionError("executor LLM should not be called"))
+        with self.fake_registry(), patch.object(orchestrator, "call_openrouter", llm):
+            result = orchestrator.run_step("get_company_fundamentals TCS.NS", "")
+        self.assertEqual(result, "Tool Output:\nRevenue: 2.4T")
+        self.assertEqual(self.calls, [("get_company_fundamentals", "TCS.NS")])
+
+    def test_skill_alias_runs_a_primed_ensemble_analysis(self):
+        ensemble = MagicMock(return_value="Rivalry is intense")
+        with patch.object(skills, "ensemble_query", ensemble), \
+             patch.object(orchestrator, "call_openrouter", MagicMock(side_effect=AssertionError)):
+            result = orchestrator.run_step("assess_competitive_forces TCS vs Infosys", "Step 'x': y")
+        self.assertEqual(result, "Tool Output:\nRivalry is intense")
+        question, context = ensemble.call_args.args
+        self.assertEqual(question, "Assess competitive forces: TCS vs Infosys")
+        self.assertIn("Porter's Five Forces", context)
+        self.assertIn("Step 'x': y", context)
+
+    def test_prose_steps_still_go_to_the_llm(self):
+        llm = MagicMock(return_value='TOOL: tavily_search ARGS: {"query": "TCS Infosys margins"}')
+        with self.fake_registry(), patch.object(orchestrator, "call_openrouter", llm):
+            result = orchestrator.run_step("Look into how TCS and Infosys margins moved", "")
+        llm.assert_called_once()
+        self.assertIn("- tavily_search(query)", llm.call_args.args[0])  # Tools listed from the registry
+        self.assertEqual(self.calls, [("tavily_search", "TCS Infosys margins")])
+        self.assertEqual(result, "Tool Output:\nnews")
+
+    def test_unknown_tools_and_bad_arguments_are_reported(self):
+        llm = MagicMock(return_value='TOOL: get_company_fundamentals ARGS: {"symbol": "TCS.NS"}')
+        with self.fake_registry(), patch.object(orchestrator, "call_openrouter", llm):
+            self.assertIn("Bad arguments for get_company_fundamentals(ticker)",
+                          orchestrator.run_step("Fetch numbers for TCS", ""))
+            llm.return_value = 'TOOL: get_stock_tips ARGS: {}'
+            result = orchestrator.run_step("Fetch numbers for TCS", "")
+        self.assertEqual(result, "Tool Execution Failed: Unknown tool: get_stock_tips")
+        self.assertIsInstance(result, orchestrator.StepFailure)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,139 @@
+import threading
+import time
+import unittest
+
+# Adjust import path to ensuring research_agent can be imported
+import sys
+import os
+os.environ['TAVILY_API_KEY'] = 'test_key' # Mock key to prevent Import Error
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from langchain_core.tools import tool
+
+from research_agent.metrics import TOOL_LATENCY
+from research_agent.tool_registry import GLOBAL_TOOL_REGISTRY, ToolRegistry, ToolTimeoutError
+import orchestrator  # Registers every research_agent tool
+
+LIMITS = {
+    "slow_lookup": {"timeout": 0.2, "max_concurrency": 2, "cost_class": "api"},
+    "default": {"timeout": 5, "max_concurrency": 4, "cost_class": "free"},
+}
+
+
+def call_count(tool_name, outcome):
+    return sum(s["count"] for s in TOOL_LATENCY.snapshot()
+               if s["labels"].get("tool") == tool_name and s["labels"].get("outcome") == outcome)
+
+
+class TestToolRegistry(unittest.TestCase):
+
+    def test_every_tool_registers_with_its_limits(self):
+        for name in ["tavily_search", "think_tool", "get_company_fundamentals", "get_historical_performance",
+                     "ask_gemini_cli_tool", "load_skill", "ensemble_query", "assess_competitive_forces"]:
+            with self.subTest(tool=name):
+                self.assertIn(name, GLOBAL_TOOL_REGISTRY)
+        spec = GLOBAL_TOOL_REGISTRY.get("get_historical_performance")
+        self.assertEqual(spec.required, ["tickers"])
+        self.assertIn("period", spec.schema)
+        self.assertEqual((spec.timeout, spec.max_concurrency, spec.cost_class), (90, 2, "free"))
+        self.assertEqual(GLOBAL_TOOL_REGISTRY.get("tavily_search").cost_class, "api")
+        self.assertEqual(GLOBAL_TOOL_REGISTRY.get("assess_competitive_forces").cost_class, "llm")
+        ensemble = GLOBAL_TOOL_REGISTRY.get("ensemble_query")
+        self.assertEqual((list(ensemble.schema), ensemble.takes_context), (["query"], True))  # No internal knobs
+
+    def test_registered_tools_are_timed_once(self):
+        registry = ToolRegistry(LIMITS)
+        registry.register_function("timed_lookup", lambda query: "Error: not found")
+        registry.call("timed_lookup", {"query": "x"})
+        samples = [s for s in TOOL_LATENCY.snapshot() if s["labels"]["tool"] == "timed_lookup"]
+        self.assertEqual([(s["labels"]["cost_class"], s["labels"]["outcome"], s["count"]) for s in samples],
+                         [("free", "error", 1)])
+
+    def test_hung_call_times_out(self):
+        registry = ToolRegistry(LIMITS)
+        release = threading.Event()
+
+        def slow_lookup(query: str) -> str:
+            release.wait(5)
+            return "late"
+
+        registry.register_function("slow_lookup", slow_lookup)
+        before = call_count("slow_lookup", "timeout")
+        started = time.monotonic()
+        with self.assertRaises(ToolTimeoutError):
+            registry.call("slow_lookup", {"query": "x"})
+        self.assertLess(time.monotonic() - started, 1)
+        self.assertEqual(call_count("slow_lookup", "timeout"), before + 1)
+        release.set()
+
+    def test_slot_wait_counts_against_the_timeout(self):
+        registry = ToolRegistry({"default": {"timeout": 0.3, "max_concurrency": 1, "cost_class": "free"}})
+
+        def lookup(query: str) -> str:
+            time.sleep(0.25)
+            return query
+
+        registry.register_function("lookup", lookup)
+        holder = threading.Thread(target=registry.call, args=("lookup", {"query": "first"}))
+        holder.start()
+        time.sleep(0.05)
+        started = time.monotonic()
+        with self.assertRaises(ToolTimeoutError):
+            registry.call("lookup", {"query": "second"})  # ~0.2s for the slot, then 0.25s more to run
+        self.assertLess(time.monotonic() - started, 0.4)
+        holder.join()
+
+    def test_concurrency_is_capped(self):
+        registry = ToolRegistry({"default": {"timeout": 5, "max_concurrency": 2, "cost_class": "free"}})
+        active, peak, lock = [0], [0], threading.Lock()
+
+        def lookup(query: str) -> str:
+            with lock:
+                active[0] += 1
+                peak[0] = max(peak[0], active[0])
+            time.sleep(0.05)
+            with lock:
+                active[0] -= 1
+            return query
+
+        registry.register_function("lookup", lookup)
+        threads = [threading.Thread(target=registry.call, args=("lookup", {"query": str(i)})) for i in range(6)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(peak[0], 2)
+
+    def test_langchain_tools_are_bounded_however_they_are_called(self):
+        registry = ToolRegistry(LIMITS)
+
+        @tool
+        def slow_lookup(query: str) -> str:
+            """Looks something up slowly."""
+            time.sleep(1)
+            return "late"
+
+        registry.register_tool(slow_lookup)
+        with self.assertRaises(ToolTimeoutError):
+            slow_lookup.invoke({"query": "x"})  # Direct invoke, not through the registry
+        self.assertEqual(registry.get("slow_lookup").signature(), "slow_lookup(query)")
+
+    def test_arguments_are_checked_against_the_schema(self):
+        registry = ToolRegistry(LIMITS)
+
+        def annotate(text: str, context: str = "", style: str = "short") -> str:
+            return f"{style}: {text} [{context}]"
+
+        registry.register_function("annotate", annotate)
+        self.assertEqual(registry.call("annotate", {"text": "hi"}, context="ctx"), "short: hi [ctx]")
+        with self.assertRaises(ValueError):
+            registry.call("annotate", {"style": "long"})
+        with self.assertRaises(ValueError):
+            registry.call("annotate", {"text": "hi", "context": "smuggled"})
+        with self.assertRaises(KeyError):
+            registry.call("missing", {})
+        self.assertIn("- annotate(text, style?)", registry.describe())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -5,12 +5,16 @@ from dotenv import load_dotenv
 load_dotenv(".env", override=True)
 
 from src.graph import app
+from src.http_transport import prewarm_connections
 from termcolor import colored
 
 def main():
     print(colored("🚀 Initializing Hierarchical Financial Agent...", "cyan"))
     print(colored("   - Level 1-4: OpenRouter (Llama/Mistral/Claude)", "blue"))
     print(colored("   - Level 5:   Google Gemini (Deep Think)", "green"))
+
+    # Open pooled connections while the user types the first query
+    prewarm_connections()
     
     # Check for CLI arguments or run interactive mode
     if len(sys.argv) > 1:
@@ -1,10 +1,11 @@
 import os
-import json
-import requests
 from google import genai
 from google.genai import types
 from dotenv import load_dotenv
 
+from src.config import OPENROUTER_BASE_URL
+from src.http_transport import get_http_client
+
 load_dotenv(override=True)
 
 # --- GOOGLE GENAI CLIENT (Level 5) ---
@@ -95,17 +96,17 @@ def call_openrouter(prompt: str, model_id: str):
         return "Error: OPENROUTER_API_KEY not found in environment variables."
 
     try:
-        response = requests.post(
-            url="https://openrouter.ai/api/v1/chat/completions",
+        response = get_http_client().post(
+            f"{OPENROUTER_BASE_URL}/chat/completions",
             headers={
                 "Authorization": f"Bearer {api_key}",
                 "Content-Type": "application/json",
                 "HTTP-Referer": "https://localhost:3000", 
             },
-            data=json.dumps({
+            json={
                 "model": model_id,
                 "messages": [{"role": "user", "content": prompt}]
-            })
+            }
         )
         
         if response.status_code == 200:
@@ -19,3 +19,17 @@ LEVEL_4_MODEL = "anthropic/claude-3.5-sonnet"
 # LEVEL 5: Expert/Deep Thought (Novel Research, Massive Context, Reasoning)
 # Provider: Google Native
 LEVEL_5_MODEL = "gemini-3-pro-preview"
+
+# --- HTTP TRANSPORT ---
+# A single pooled client is shared by every OpenRouter call in the process.
+OPENROUTER_BASE_URL = "https://openrouter.ai/api/v1"
+
+HTTP_MAX_CONNECTIONS = 20           # Upper bound on open sockets across all hosts
+HTTP_MAX_KEEPALIVE_CONNECTIONS = 10 # Idle sockets kept warm for reuse
+HTTP_KEEPALIVE_EXPIRY = 120         # Seconds an idle socket stays in the pool
+HTTP_CONNECT_TIMEOUT = 10           # Seconds
+HTTP_READ_TIMEOUT = 300             # Seconds (long completions from large models)
+HTTP_ENABLE_HTTP2 = True            # Only honoured when the optional `h2` package is installed
+
+# Hosts to open connections to at startup so the first LLM call skips the handshake.
+PREWARM_URLS = [OPENROUTER_BASE_URL]
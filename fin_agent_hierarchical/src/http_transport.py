@@ -0,0 +1,102 @@
+"""HTTP Transport.
+
+Process-wide pooled HTTP client shared by the LLM clients. Every call reuses
+keep-alive connections from one pool instead of paying a fresh TCP+TLS
+handshake per request.
+"""
+
+import atexit
+import threading
+
+import httpx
+
+from src.config import (
+    HTTP_CONNECT_TIMEOUT,
+    HTTP_ENABLE_HTTP2,
+    HTTP_KEEPALIVE_EXPIRY,
+    HTTP_MAX_CONNECTIONS,
+    HTTP_MAX_KEEPALIVE_CONNECTIONS,
+    HTTP_READ_TIMEOUT,
+    PREWARM_URLS,
+)
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def http2_available() -> bool:
+    """Return True if HTTP/2 is enabled in config and the `h2` package is installed."""
+    if not HTTP_ENABLE_HTTP2:
+        return False
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def _build_limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+    )
+
+
+def _build_timeout() -> httpx.Timeout:
+    return httpx.Timeout(HTTP_READ_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT)
+
+
+def get_http_client() -> httpx.Client:
+    """Return the shared, lazily created pooled HTTP client."""
+    global _client
+    if _client is None or _client.is_closed:
+        with _client_lock:
+            if _client is None or _client.is_closed:
+                _client = httpx.Client(
+                    http2=http2_available(),
+                    limits=_build_limits(),
+                    timeout=_build_timeout(),
+                )
+    return _client
+
+
+def prewarm_connections(urls=None, background: bool = True):
+    """Open pooled connections ahead of the first LLM call.
+
+    Args:
+        urls: URLs to touch (defaults to PREWARM_URLS from config)
+        background: Run in a daemon thread so startup is never delayed
+
+    Returns:
+        The warming thread when background is True, otherwise None
+    """
+    targets = list(urls if urls is not None else PREWARM_URLS)
+
+    def _warm():
+        client = get_http_client()
+        for url in targets:
+            try:
+                # Any response (even 404) leaves a negotiated connection in the pool.
+                client.head(url, timeout=HTTP_CONNECT_TIMEOUT)
+            except httpx.HTTPError as e:
+                print(f"⚠️ Connection pre-warm failed for {url}: {e}")
+
+    if background:
+        thread = threading.Thread(target=_warm, name="http-prewarm", daemon=True)
+        thread.start()
+        return thread
+    _warm()
+    return None
+
+
+def close_http_clients():
+    """Close the shared client and release its pooled connections."""
+    global _client
+    with _client_lock:
+        if _client is not None:
+            _client.close()
+            _client = None
+
+
+atexit.register(close_http_clients)